@@ -0,0 +1,78 @@
+# batch_controller.py - latency-SLO driven batch sizing for the streaming scorer
+from collections import deque
+
+import numpy as np
+
+
+class BatchSizeController:
+    """Grows the batch while p99 scoring latency has headroom, shrinks it when over target"""
+
+    def __init__(self, target_p99_ms=25.0, initial_size=100, min_size=10, max_size=10000,
+                 samples_per_decision=20, grow_factor=1.25, headroom=0.8):
+        self.target_p99_ms = target_p99_ms
+        self.min_size = min_size
+        self.max_size = max_size
+        self.samples_per_decision = samples_per_decision
+        self.grow_factor = grow_factor
+        self.headroom = headroom  # Only grow while p99 < headroom * target
+        self.batch_size = int(min(max(initial_size, min_size), max_size))
+
+        # Samples since the last size change (latency at a different size isn't comparable)
+        self.latencies_ms = deque(maxlen=max(samples_per_decision, 100))
+        self.rows = 0
+        self.last_latency_ms = 0.0
+        self.last_p99_ms = 0.0
+        self.throughput = 0.0
+        self.adjustments = 0
+
+    def record(self, batch_size, latency_seconds):
+        """Feed one batch's scoring latency; returns the batch size to use next"""
+        latency_ms = latency_seconds * 1000
+        self.last_latency_ms = latency_ms
+
+        # A short batch (end of demo data) says little about the current size
+        if batch_size < self.batch_size:
+            return self.batch_size
+
+        self.latencies_ms.append(latency_ms)
+        self.rows += batch_size
+        if len(self.latencies_ms) < self.samples_per_decision:
+            return self.batch_size
+
+        latencies = np.fromiter(self.latencies_ms, dtype=float)
+        p99 = float(np.percentile(latencies, 99))
+        self.last_p99_ms = p99
+        busy_seconds = float(latencies.sum()) / 1000
+        self.throughput = self.rows / busy_seconds if busy_seconds > 0 else 0.0
+
+        if p99 > self.target_p99_ms:
+            # Over the SLO: shrink in proportion to the overshoot (latency ~ linear in size)
+            new_size = self.batch_size * min(self.target_p99_ms * self.headroom / p99, 1 / self.grow_factor)
+        elif p99 < self.target_p99_ms * self.headroom:
+            # Headroom left: bigger batches amortise per-call overhead -> more tx/sec
+            new_size = self.batch_size * self.grow_factor
+        else:
+            new_size = self.batch_size
+
+        new_size = int(min(max(new_size, self.min_size), self.max_size))
+        if new_size != self.batch_size:
+            self.batch_size = new_size
+            self.adjustments += 1
+        self.latencies_ms.clear()
+        self.rows = 0
+        return self.batch_size
+
+    def reset_samples(self):
+        """Drop collected latencies (e.g. after a model swap) and keep the current size"""
+        self.latencies_ms.clear()
+        self.rows = 0
+
+    def snapshot(self):
+        """Fields merged into the engine's stats payload"""
+        return {
+            "batch_size": self.batch_size,
+            "batch_latency_ms": round(self.last_latency_ms, 3),
+            "batch_latency_p99_ms": round(self.last_p99_ms, 3),
+            "latency_target_ms": self.target_p99_ms,
+            "scoring_throughput": round(self.throughput, 1)
+        }
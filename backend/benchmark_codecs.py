@@ -0,0 +1,98 @@
+# benchmark_codecs.py - bytes per transaction and encode time for each WebSocket codec
+import asyncio
+import time
+from main import (FraudEngine, SIMULATION_BATCH_SIZE,
+                  make_simulation_producer, make_real_model_producer)
+from real_model import RealFraudEngine
+from frame_codecs import CODECS, EncodedFrame
+from event_stream import negotiate_subscription, plain_frame
+
+
+def collect_frames(produce_frame, count):
+    """Produce a list of real batch frames to encode"""
+    async def run():
+        return [await produce_frame() for _ in range(count)]
+    return asyncio.run(run())
+
+
+def benchmark(frames, label, repeats=5):
+    """Encode every frame with every codec and print a comparison table"""
+    transactions = sum(len(f["transactions"]) for f in frames)
+
+    print(f"\n{'='*72}")
+    print(f"📦 {label}: {len(frames)} frames, {transactions:,} transactions")
+    print(f"{'='*72}")
+    print(f"{'Codec':<10} {'Bytes/frame':>12} {'Bytes/tx':>10} {'Encode µs/frame':>16} {'Encode µs/tx':>13} {'Size':>7}")
+    print("-" * 72)
+
+    baseline_bytes = None
+    for name, codec in CODECS.items():
+        # Round-trip check so a codec can't win by dropping data
+        decoded = codec.decode(codec.encode(frames[0]))
+        assert decoded["transactions"] == plain_frame(frames[0])["transactions"], f"{name} round-trip mismatch"
+
+        payload_bytes = sum(
+            len(p.encode("utf-8")) if isinstance(p, str) else len(p)
+            for p in (codec.encode(f) for f in frames)
+        )
+
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for frame in frames:
+                codec.encode(frame)
+            best = min(best, time.perf_counter() - start)
+
+        if baseline_bytes is None:
+            baseline_bytes = payload_bytes
+
+        print(f"{name:<10} {payload_bytes / len(frames):>12,.0f} {payload_bytes / transactions:>10.1f} "
+              f"{best / len(frames) * 1e6:>16.1f} {best / transactions * 1e6:>13.2f} "
+              f"{payload_bytes / baseline_bytes:>6.0%}")
+
+
+def benchmark_streams(frames, label, codecs=("json", "columnar"), repeats=3):
+    """Bytes and server time per frame for each subscription stream (view + encode, fresh frames)"""
+    subscriptions = [negotiate_subscription("all"), negotiate_subscription("sampled", 0.01),
+                     negotiate_subscription("interesting")]
+    transactions = sum(len(f["transactions"]) for f in frames)
+    print(f"\n📡 {label}: stream modes ({transactions:,} transactions)")
+    print(f"{'Stream':<16} {'Codec':<10} {'Rows/frame':>11} {'Bytes/frame':>12} {'µs/frame':>10} {'Size':>7}")
+    print("-" * 72)
+    for codec_name in codecs:
+        codec = CODECS[codec_name]
+        baseline = None
+        for subscription in subscriptions:
+            best = float("inf")
+            for _ in range(repeats):
+                # Fresh batches and EncodedFrames: no event dicts or views memoized by an earlier run
+                encoded = [EncodedFrame({**f, "transactions": f["transactions"].select(slice(None))})
+                           for f in frames]
+                start = time.perf_counter()
+                payloads = [e.encode(codec, subscription) for e in encoded]
+                best = min(best, time.perf_counter() - start)
+            rows = sum(len(e.view(subscription)["transactions"]) for e in encoded)
+            size = sum(len(p.encode("utf-8")) if isinstance(p, str) else len(p) for p in payloads)
+            baseline = baseline or size
+            name = subscription.stream + (f" {subscription.sample_rate:g}" if subscription.sample_rate else "")
+            print(f"{name:<16} {codec_name:<10} {rows / len(frames):>11.1f} {size / len(frames):>12,.0f} "
+                  f"{best / len(frames) * 1e6:>10.1f} {size / baseline:>6.0%}")
+
+
+def main():
+    print("🧪 WEBSOCKET CODEC BENCHMARK")
+    print(f"Available codecs: {', '.join(CODECS)}")
+
+    real_engine = RealFraudEngine()
+    real_frames = collect_frames(make_real_model_producer(real_engine), 100)
+    benchmark(real_frames, f"Real model (adaptive batch size, ended at {real_engine.stats['batch_size']})")
+    benchmark_streams(real_frames, "Real model")
+    real_engine.close()
+
+    simulation_engine = FraudEngine()
+    simulation_frames = collect_frames(make_simulation_producer(simulation_engine), 100)
+    benchmark(simulation_frames, f"Simulation (batch size {SIMULATION_BATCH_SIZE})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# benchmark_loop_lag.py - event loop lag with inference inline vs in an executor
+import asyncio
+import time
+from real_model import RealFraudEngine
+from loop_lag import EventLoopLagMonitor
+
+
+async def measure(engine, batch_size, duration):
+    """Score continuously for `duration` seconds while sampling event loop lag"""
+    monitor = EventLoopLagMonitor(interval=0.01, window=100000)
+    monitor.start()
+
+    processed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        events = await engine.process_batch(batch_size=batch_size)
+        processed += len(events)
+        await asyncio.sleep(0)  # Same hand-off the broadcaster makes between batches
+
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    return monitor.snapshot(), processed / elapsed
+
+
+def main(batch_sizes=(100, 1000, 5000), duration=3.0):
+    print("⏱️  EVENT LOOP LAG: INLINE vs EXECUTOR INFERENCE")
+    print(f"{'Executor':<10} {'Batch':>6} {'Mean lag ms':>12} {'p99 lag ms':>11} {'Max lag ms':>11} {'tx/sec':>10}")
+    print("-" * 65)
+
+    for executor in ("inline", "thread"):
+        engine = RealFraudEngine(executor=executor)
+        for batch_size in batch_sizes:
+            lag, speed = asyncio.run(measure(engine, batch_size, duration))
+            print(f"{executor:<10} {batch_size:>6} {lag['mean_ms']:>12.2f} {lag['p99_ms']:>11.2f} "
+                  f"{lag['max_ms']:>11.2f} {speed:>10,.0f}")
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# broadcaster.py - one producer per engine, fanned out to every WebSocket subscriber
+import asyncio
+import time
+from client_queue import ClientQueue, DEFAULT_OVERFLOW, DEFAULT_QUEUE_SIZE
+from frame_codecs import EncodedFrame
+from rate_limiter import TokenBucket
+from telemetry import get_telemetry
+
+
+class BatchBroadcaster:
+    """Runs a single scoring loop for an engine and publishes each frame to all subscribers"""
+
+    def __init__(self, name, engine, produce_frame, queue_size=DEFAULT_QUEUE_SIZE, overflow=DEFAULT_OVERFLOW,
+                 target_rate=None):
+        self.name = name
+        self.engine = engine
+        self.produce_frame = produce_frame  # async callable(max_rows) returning one frame dict
+        self.default_producer = produce_frame
+        self.rate_limiter = TokenBucket(target_rate)
+        self.pacer = self.rate_limiter  # Anything with delay/max_batch/consume (e.g. a replay schedule)
+        self.wake = asyncio.Event()  # Set whenever running state, subscribers or the rate change
+        self.queue_size = queue_size
+        self.overflow = overflow  # Default policy for clients that don't ask for one
+        self.subscribers = set()
+        self.frames_published = 0
+        self.frames_dropped = 0
+        self.frames_degraded = 0
+        self.frames_coalesced = 0
+        self.interesting_lost = 0
+        self.clients_overflowed = 0
+        self.task = None
+        telemetry = get_telemetry()
+        self.produce_timer = telemetry.histogram("produce", mode=name)
+        self.publish_timer = telemetry.histogram("publish", mode=name)
+        self._encode_timers = {}
+        self._view_timers = {}
+
+    def subscribe(self, codec, subscription, overflow=None, peer=None):
+        """Register a new subscriber and return the ClientQueue its frames arrive on"""
+        client = ClientQueue(self.name, codec, subscription, overflow or self.overflow, self.queue_size, peer)
+        self.subscribers.add(client)
+        self.wake.set()
+        return client
+
+    def unsubscribe(self, client):
+        """Remove a subscriber (safe to call more than once)"""
+        self.subscribers.discard(client)
+
+    def set_running(self, running):
+        """Start or stop producing; an idle producer sleeps on an event, not a poll"""
+        self.engine.is_running = running
+        self.wake.set()
+
+    def set_rate(self, rate):
+        """Target rows/sec for the producer (None = as fast as it can go), effective immediately"""
+        self.rate_limiter.set_rate(rate)
+        self.wake.set()
+
+    def use_producer(self, produce_frame=None, pacer=None):
+        """Swap in another producer and its pacer between batches; no arguments restores the defaults"""
+        self.produce_frame = produce_frame or self.default_producer
+        self.pacer = pacer or self.rate_limiter
+        self.wake.set()
+
+    async def _sleep(self, seconds):
+        """Pacing sleep that ends early if stop/start/rate changes wake the producer"""
+        self.wake.clear()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.wake.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        self.pacer.record_wait(time.perf_counter() - started)
+
+    def _record_encode(self, codec_name, ns):
+        timer = self._encode_timers.get(codec_name)
+        if timer is None:
+            timer = self._encode_timers[codec_name] = get_telemetry().histogram(
+                "encode", mode=self.name, codec=codec_name)
+        timer.record_ns(ns)
+
+    def _record_view(self, stream, ns):
+        timer = self._view_timers.get(stream)
+        if timer is None:
+            timer = self._view_timers[stream] = get_telemetry().histogram("view", mode=self.name, stream=stream)
+        timer.record_ns(ns)
+
+    def publish(self, frame):
+        """Hand the same frame to every subscriber without waiting on any of them"""
+        frame = EncodedFrame(frame, on_encode=self._record_encode, on_view=self._record_view)
+        for client in list(self.subscribers):
+            # Never waits: a full queue applies the client's overflow policy instead
+            dropped, degraded, coalesced = client.frames_dropped, client.frames_degraded, client.frames_coalesced
+            lost = client.interesting_lost
+            overflowed = client.overflowed
+            if not client.offer(frame) and not overflowed:
+                self.clients_overflowed += 1  # Its sender task closes the connection
+            self.frames_dropped += client.frames_dropped - dropped
+            self.frames_degraded += client.frames_degraded - degraded
+            self.frames_coalesced += client.frames_coalesced - coalesced
+            self.interesting_lost += client.interesting_lost - lost
+        self.frames_published += 1
+
+    def queued_frames(self):
+        """Frames waiting across all subscriber queues"""
+        return sum(len(client) for client in self.subscribers)
+
+    def clients(self):
+        """Per-client queue, lag and drop counters"""
+        return [client.snapshot() for client in sorted(self.subscribers, key=lambda c: c.id)]
+
+    async def run(self):
+        """Producer loop - inference happens here once, regardless of viewer count"""
+        while True:
+            try:
+                # Only score while the engine is running and someone is watching;
+                # otherwise block until set_running()/subscribe() says that changed
+                if not self.engine.is_running or not self.subscribers:
+                    self.wake.clear()
+                    await self.wake.wait()
+                    continue
+
+                delay = self.pacer.delay()
+                if delay > 0:
+                    await self._sleep(delay)
+                    continue
+
+                with self.produce_timer.time():
+                    frame = await self.produce_frame(self.pacer.max_batch())
+                if frame is not None:
+                    self.pacer.consume(frame.get("batch_size", 0))
+                    with self.publish_timer.time():
+                        self.publish(frame)
+
+                # Yield so subscriber sender tasks get a chance to run
+                await asyncio.sleep(0)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in {self.name} producer: {e}")
+                await asyncio.sleep(0.1)
+
+    def start(self):
+        """Start the background producer task"""
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def stop(self):
+        """Cancel the producer task and wait for it to finish"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
@@ -0,0 +1,208 @@
+# client_queue.py - bounded per-client outbound queues with an overflow policy, plus lag/drop counters
+import asyncio
+import itertools
+import time
+from collections import deque
+
+from event_stream import negotiate_subscription, plain_frame
+
+OVERFLOW_POLICIES = ("drop_oldest_legit", "coalesce", "disconnect")
+DEFAULT_OVERFLOW = "drop_oldest_legit"
+DEFAULT_QUEUE_SIZE = 8
+
+INTERESTING = negotiate_subscription("interesting")
+
+_client_ids = itertools.count(1)
+
+
+def negotiate_overflow(requested, default=DEFAULT_OVERFLOW):
+    """The overflow policy a client asked for, or the server default if unknown"""
+    requested = (requested or "").lower()
+    return requested if requested in OVERFLOW_POLICIES else default
+
+
+class ClientOverflow(Exception):
+    """A client under the "disconnect" policy fell a full queue behind"""
+
+
+class _Entry:
+    """One queued frame: shared (EncodedFrame + subscription) or this client's own merged dict"""
+    __slots__ = ("frame", "subscription", "merged", "published")
+
+    def __init__(self, frame, subscription, published, merged=None):
+        self.frame = frame
+        self.subscription = subscription
+        self.merged = merged
+        self.published = published
+
+    def encode(self, codec):
+        if self.merged is not None:
+            return codec.encode(self.merged)
+        return self.frame.encode(codec, self.subscription)
+
+
+MAX_MERGED_EVENTS = 20_000  # Interesting events one merged frame may carry before the oldest are cut
+
+
+def _interesting_view(queued):
+    return queued.merged if queued.merged is not None else plain_frame(queued.frame.view(INTERESTING))
+
+
+def _merge(entries):
+    """One frame from several: their interesting events in order, summed counts (and losses), the newest stats"""
+    transactions = []
+    batch_size = legitimate = frames = lost = 0
+    for queued in entries:
+        view = _interesting_view(queued)
+        transactions.extend(view["transactions"])
+        batch_size += view.get("batch_size", 0)
+        legitimate += view["legitimate_count"]
+        frames += view.get("coalesced_frames", 1)
+        lost += view.get("interesting_lost", 0)
+    merged = {**view, "transactions": transactions, "batch_size": batch_size,
+              "legitimate_count": legitimate, "legitimate_sent": 0, "coalesced_frames": frames}
+    if lost:
+        merged["interesting_lost"] = lost
+    return merged
+
+
+class ClientQueue:
+    """Frames waiting for one WebSocket client, drained by that client's own sender task
+
+    The producer never waits on a client: offer() is synchronous and, when the
+    queue is full, applies the client's overflow policy:
+      drop_oldest_legit - the oldest frame with no interesting events is dropped;
+                          if every queued frame has some, the oldest is folded
+                          into the next one (or the incoming frame) keeping only
+                          interesting events (counts kept) - legitimate events go,
+                          oldest first, and fraud rows are never discarded
+      coalesce          - everything queued collapses into one frame: all their
+                          interesting events, summed counts, the newest stats
+      disconnect        - the client is closed (it can reconnect and catch up)
+
+    Only a merged frame holding more than MAX_MERGED_EVENTS interesting events
+    loses any (its oldest), counted in interesting_lost.
+    """
+
+    def __init__(self, mode, codec, subscription, overflow=DEFAULT_OVERFLOW, maxsize=DEFAULT_QUEUE_SIZE, peer=None):
+        self.id = next(_client_ids)
+        self.mode = mode
+        self.codec = codec
+        self.subscription = subscription
+        self.overflow = overflow
+        self.maxsize = max(1, maxsize)
+        self.peer = peer
+        self.entries = deque()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+        self.connected_at = time.time()
+        self.frames_offered = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_degraded = 0
+        self.frames_coalesced = 0
+        self.interesting_lost = 0
+        self.bytes_sent = 0
+        self.last_lag_ms = 0.0  # Publish -> handed to the socket, for the last frame sent
+        self.max_lag_ms = 0.0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def offer(self, frame):
+        """Queue a published EncodedFrame; returns False if the client must be disconnected"""
+        self.frames_offered += 1
+        if self.overflowed:
+            return False
+        entry = _Entry(frame, self.subscription, time.perf_counter())
+        if len(self.entries) >= self.maxsize and not self._make_room(entry):
+            self.overflowed = True
+            self.ready.set()  # Wake the sender so it can raise ClientOverflow
+            return False
+        self.entries.append(entry)
+        self.ready.set()
+        return True
+
+    def _make_room(self, entry):
+        if self.overflow == "disconnect":
+            return False
+        if self.overflow == "coalesce":
+            self._coalesce(entry)
+            return True
+        # drop_oldest_legit: a frame with nothing interesting in it can go whole
+        for i, queued in enumerate(self.entries):
+            if not _interesting_view(queued)["transactions"]:
+                del self.entries[i]
+                self.frames_dropped += 1
+                return True
+        # Otherwise fold the oldest into the next frame (the incoming one if it's alone),
+        # shedding only legitimate events
+        oldest = self.entries.popleft()
+        following = self.entries[0] if self.entries else entry
+        self._fold([oldest, following], following)
+        self.frames_degraded += 1
+        return True
+
+    def _coalesce(self, entry):
+        """Fold every queued frame into `entry`"""
+        self.frames_coalesced += len(self.entries)
+        self._fold(list(self.entries) + [entry], entry)
+        self.entries.clear()
+
+    def _fold(self, entries, into):
+        into.merged = _merge(entries)
+        into.published = entries[0].published
+        transactions = into.merged["transactions"]
+        if len(transactions) > MAX_MERGED_EVENTS:
+            lost = len(transactions) - MAX_MERGED_EVENTS
+            into.merged["transactions"] = transactions[lost:]
+            into.merged["interesting_lost"] = into.merged.get("interesting_lost", 0) + lost
+            self.interesting_lost += lost
+
+    async def next_payload(self):
+        """Wait for the next frame and encode it in this client's codec"""
+        while not self.entries:
+            if self.overflowed:
+                raise ClientOverflow(f"client {self.id} fell {self.maxsize} frames behind")
+            self.ready.clear()
+            await self.ready.wait()
+        if self.overflowed:
+            raise ClientOverflow(f"client {self.id} fell {self.maxsize} frames behind")
+        entry = self.entries.popleft()
+        lag_ms = (time.perf_counter() - entry.published) * 1000
+        self.last_lag_ms = lag_ms
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        return entry.encode(self.codec)
+
+    def record_sent(self, n_bytes):
+        self.frames_sent += 1
+        self.bytes_sent += n_bytes
+
+    def oldest_age_ms(self):
+        """How long the oldest queued frame has been waiting (current lag)"""
+        if not self.entries:
+            return 0.0
+        return (time.perf_counter() - self.entries[0].published) * 1000
+
+    def snapshot(self):
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "peer": self.peer,
+            "codec": self.codec.name,
+            **self.subscription.describe(),
+            "overflow": self.overflow,
+            "connected_seconds": round(time.time() - self.connected_at, 1),
+            "queued": len(self.entries),
+            "queue_size": self.maxsize,
+            "oldest_queued_ms": round(self.oldest_age_ms(), 2),
+            "last_lag_ms": round(self.last_lag_ms, 2),
+            "max_lag_ms": round(self.max_lag_ms, 2),
+            "frames_offered": self.frames_offered,
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "frames_degraded": self.frames_degraded,
+            "frames_coalesced": self.frames_coalesced,
+            "interesting_lost": self.interesting_lost,
+            "bytes_sent": self.bytes_sent
+        }
@@ -0,0 +1,374 @@
+# data_loader.py - chunked, column-projected IEEE-CIS loader with a memory-mapped columnar cache
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+TRANSACTION_FILE = "train_transaction.csv"
+IDENTITY_FILE = "train_identity.csv"
+CACHE_DIR = "data_cache"
+CACHE_FORMAT = 1
+CHUNK_ROWS = 100_000
+
+# Compact dtypes for the columns we know; the rest are downcast per chunk
+# (float64 -> float32, strings -> category). TransactionAmt stays float64 so
+# the amount features match what the live feature store computes.
+COLUMN_DTYPES = {
+    "TransactionID": "int32",
+    "isFraud": "int8",
+    "TransactionDT": "int32",
+    "TransactionAmt": "float64",
+    "card1": "int32",
+    "card2": "float32",
+    "card3": "float32",
+    "card5": "float32",
+    "addr1": "float32",
+    "addr2": "float32",
+    "dist1": "float32",
+    "dist2": "float32",
+}
+STRING_COLUMNS = ("ProductCD", "card4", "card6", "P_emaildomain", "R_emaildomain", "DeviceType", "DeviceInfo")
+
+
+def _compact(chunk):
+    """Shrink a parsed chunk: known dtypes first, then generic float/string downcasts"""
+    for col in chunk.columns:
+        dtype = chunk[col].dtype
+        if col in COLUMN_DTYPES:
+            continue  # Parsed straight into its dtype
+        if col in STRING_COLUMNS or dtype == object or pd.api.types.is_string_dtype(dtype):
+            chunk[col] = chunk[col].astype("category")
+        elif dtype == np.float64:
+            chunk[col] = chunk[col].astype(np.float32)
+        elif dtype == np.int64:
+            chunk[col] = pd.to_numeric(chunk[col], downcast="integer")
+    return chunk
+
+
+def _concat(frames):
+    """pd.concat that keeps categoricals categorical when chunks saw different categories"""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return None
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = {}
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            columns[col] = pd.Series(union_categoricals([f[col] for f in frames], sort_categories=True))
+        else:
+            columns[col] = pd.Series(np.concatenate([f[col].to_numpy() for f in frames]))
+    return pd.DataFrame(columns, copy=False)
+
+
+def _read_dtypes(path, columns):
+    header = pd.read_csv(path, nrows=0).columns
+    columns = list(header) if columns is None else list(columns)
+    missing = [c for c in columns if c not in header]
+    if missing:
+        raise ValueError(f"{path} has no columns {missing}")
+    dtypes = {c: COLUMN_DTYPES[c] for c in columns if c in COLUMN_DTYPES}
+    dtypes.update({c: "str" for c in columns if c in STRING_COLUMNS})
+    return columns, dtypes
+
+
+# ==================== STREAMING SAMPLERS ====================
+class ReservoirSampler:
+    """Uniform sample of n rows from a stream of chunks, without replacement
+
+    Every row gets a random key and the n smallest keys are kept (a vectorized
+    reservoir), so memory is bounded by n plus one chunk.
+    """
+
+    def __init__(self, n_rows, seed=42):
+        self.n_rows = n_rows
+        self.rng = np.random.default_rng(seed)
+        self.kept = None
+        self.seen = 0
+
+    def add(self, chunk):
+        chunk = chunk.assign(_key=self.rng.random(len(chunk)), _row=np.arange(self.seen, self.seen + len(chunk)))
+        self.seen += len(chunk)
+        self.kept = self._smallest(_concat([self.kept, chunk] if self.kept is not None else [chunk]), self.n_rows)
+
+    @staticmethod
+    def _smallest(frame, n_rows):
+        if frame is None or len(frame) <= n_rows:
+            return frame
+        keep = np.argpartition(frame["_key"].to_numpy(), n_rows - 1)[:n_rows]
+        return frame.iloc[np.sort(keep)].reset_index(drop=True)
+
+    def result(self):
+        """The sample in file order"""
+        if self.kept is None:
+            return None
+        return self.kept.sort_values("_row").drop(columns=["_key", "_row"]).reset_index(drop=True)
+
+
+class StratifiedSampler(ReservoirSampler):
+    """n rows with each class of `column` (e.g. isFraud) in its exact stream proportion
+
+    One reservoir of up to n rows per class; class sizes are only known at the
+    end, when each class contributes its share (largest remainder) of its
+    smallest keys.
+    """
+
+    def __init__(self, n_rows, column, seed=42):
+        super().__init__(n_rows, seed)
+        self.column = column
+        self.reservoirs = {}
+        self.class_counts = {}
+
+    def add(self, chunk):
+        chunk = chunk.assign(_key=self.rng.random(len(chunk)), _row=np.arange(self.seen, self.seen + len(chunk)))
+        self.seen += len(chunk)
+        for value, part in chunk.groupby(self.column, sort=False, observed=True):
+            self.class_counts[value] = self.class_counts.get(value, 0) + len(part)
+            kept = self.reservoirs.get(value)
+            self.reservoirs[value] = self._smallest(_concat([kept, part] if kept is not None else [part]),
+                                                    self.n_rows)
+
+    def result(self):
+        if not self.reservoirs:
+            return None
+        total = sum(self.class_counts.values())
+        n_rows = min(self.n_rows, total)
+        shares = {v: n_rows * count / total for v, count in self.class_counts.items()}
+        quotas = {v: int(share) for v, share in shares.items()}
+        for v in sorted(shares, key=lambda v: shares[v] - quotas[v], reverse=True)[:n_rows - sum(quotas.values())]:
+            quotas[v] += 1
+        parts = [self._smallest(self.reservoirs[v], quotas[v]) for v in self.reservoirs]
+        sample = _concat(parts)
+        return sample.sort_values("_row").drop(columns=["_key", "_row"]).reset_index(drop=True)
+
+
+# ==================== COLUMNAR CACHE ====================
+def _cache_key(sources, params):
+    stamp = [(os.path.abspath(p), os.stat(p).st_size, os.stat(p).st_mtime_ns) for p in sources]
+    payload = json.dumps({"format": CACHE_FORMAT, "sources": stamp, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def save_columnar(frame, cache_path, meta=None):
+    """One .npy per column (categoricals as codes + categories), written atomically"""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    columns = []
+    for i, col in enumerate(frame.columns):
+        values = frame[col]
+        entry = {"name": col, "file": f"{i:04d}.npy"}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            entry["categories"] = values.cat.categories.tolist()
+            data = values.cat.codes.to_numpy()
+        else:
+            data = values.to_numpy()
+        entry["dtype"] = str(data.dtype)
+        np.save(os.path.join(tmp_path, entry["file"]), np.ascontiguousarray(data))
+        columns.append(entry)
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"format": CACHE_FORMAT, "rows": int(len(frame)), "columns": columns, **(meta or {})}, f, indent=2)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp_path, cache_path)
+
+
+def load_columnar(cache_path):
+    """DataFrame over memory-mapped column files (numeric columns aren't copied until written)"""
+    with open(os.path.join(cache_path, "meta.json")) as f:
+        meta = json.load(f)
+    columns = {}
+    for entry in meta["columns"]:
+        data = np.load(os.path.join(cache_path, entry["file"]), mmap_mode="r")
+        if "categories" in entry:
+            columns[entry["name"]] = pd.Categorical.from_codes(np.asarray(data), entry["categories"])
+        else:
+            columns[entry["name"]] = data
+    return pd.DataFrame(columns, copy=False)
+
+
+# ==================== LOADER ====================
+def load_transactions(transaction_columns=None, identity_columns=(), how="left", sample_rows=None,
+                      stratify=None, nrows=None, seed=42, data_dir=".", chunk_rows=CHUNK_ROWS,
+                      cache_dir=None, use_cache=True):
+    """Transactions (+ identity columns) with compact dtypes, streamed in chunks
+
+    Only the requested columns are converted, identity rows are joined chunk by
+    chunk (how="left" keeps every transaction, "inner" only those with identity
+    data), and sample_rows keeps a uniform (or stratified on `stratify`) sample
+    while streaming. The result is cached as memory-mapped column files keyed by
+    the source files' size/mtime and these arguments, so the next run with the
+    same arguments skips the CSVs entirely (cache_dir defaults to data_dir/data_cache).
+    transaction_columns=None loads all.
+    """
+    transaction_path = os.path.join(data_dir, TRANSACTION_FILE)
+    identity_path = os.path.join(data_dir, IDENTITY_FILE)
+    identity_columns = list(identity_columns)
+    if how not in ("left", "inner"):
+        raise ValueError(f"how must be 'left' or 'inner', got {how!r}")
+    sources = [transaction_path] + ([identity_path] if identity_columns or how == "inner" else [])
+
+    params = {"transaction_columns": transaction_columns, "identity_columns": identity_columns, "how": how,
+              "sample_rows": sample_rows, "stratify": stratify, "nrows": nrows, "seed": seed}
+    cache_dir = cache_dir or os.path.join(data_dir, CACHE_DIR)
+    cache_path = os.path.join(cache_dir, _cache_key(sources, params)) if use_cache else None
+    if cache_path and os.path.exists(os.path.join(cache_path, "meta.json")):
+        frame = load_columnar(cache_path)
+        print(f"📦 Loaded {len(frame):,} rows x {len(frame.columns)} columns from cache {cache_path}")
+        return frame
+
+    start = time.perf_counter()
+    if transaction_columns is not None and "TransactionID" not in transaction_columns and len(sources) > 1:
+        transaction_columns = ["TransactionID"] + list(transaction_columns)  # The join key
+    columns, dtypes = _read_dtypes(transaction_path, transaction_columns)
+    identity = None
+    if len(sources) > 1:
+        id_columns, id_dtypes = _read_dtypes(identity_path, ["TransactionID"] + identity_columns)
+        identity = pd.read_csv(identity_path, usecols=id_columns, dtype=id_dtypes).set_index("TransactionID")
+
+    if sample_rows:
+        sampler = StratifiedSampler(sample_rows, stratify, seed) if stratify else ReservoirSampler(sample_rows, seed)
+    else:
+        sampler, parts = None, []
+    rows_read = 0
+    for chunk in pd.read_csv(transaction_path, usecols=columns, dtype=dtypes, chunksize=chunk_rows, nrows=nrows):
+        rows_read += len(chunk)
+        chunk = chunk[columns]
+        if identity is not None:
+            chunk = chunk.join(identity, on="TransactionID", how=how)
+        chunk = _compact(chunk)
+        if sampler is not None:
+            sampler.add(chunk)
+        else:
+            parts.append(chunk)
+    frame = sampler.result() if sampler is not None else _concat(parts)
+    if frame is None:
+        frame = chunk.iloc[:0] if rows_read else pd.DataFrame(columns=columns + identity_columns)
+    elapsed = time.perf_counter() - start
+    print(f"📥 Read {rows_read:,} transactions -> {len(frame):,} rows x {len(frame.columns)} columns "
+          f"({frame.memory_usage(deep=True).sum() / 1e6:,.1f} MB) in {elapsed:.1f}s")
+
+    if cache_path:
+        save_columnar(frame, cache_path, {"params": params, "sources": sources, "load_seconds": round(elapsed, 3)})
+        frame = load_columnar(cache_path)
+    return frame
+
+
+# ==================== BENCHMARK ====================
+def write_synthetic_csvs(data_dir, n_rows, seed=42):
+    """IEEE-CIS-shaped CSVs (394 transaction / 41 identity columns) for checks and benchmarks"""
+    from feature_engineering import make_synthetic_transactions
+
+    os.makedirs(data_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    tx_path = os.path.join(data_dir, TRANSACTION_FILE)
+    id_path = os.path.join(data_dir, IDENTITY_FILE)
+    base = make_synthetic_transactions(n_rows, n_cards=max(1, n_rows // 44), seed=seed)
+    for start in range(0, n_rows, CHUNK_ROWS):
+        part = base.iloc[start:start + CHUNK_ROWS].reset_index(drop=True)
+        n = len(part)
+        tx = {col: part[col] for col in ("TransactionID", "isFraud", "TransactionDT", "TransactionAmt", "ProductCD")}
+        tx["card1"] = part["card1"]
+        for col in ("card2", "card3", "card5", "addr1", "addr2", "dist1", "dist2"):
+            tx[col] = np.where(rng.random(n) < 0.1, np.nan, rng.integers(100, 600, n))
+        tx["card4"] = rng.choice(["visa", "mastercard", "discover", "american express"], n)
+        tx["card6"] = rng.choice(["debit", "credit"], n)
+        tx["P_emaildomain"] = rng.choice(["gmail.com", "yahoo.com", "hotmail.com", ""], n)
+        tx["R_emaildomain"] = rng.choice(["gmail.com", "anonymous.com", ""], n)
+        for i in range(1, 15):
+            tx[f"C{i}"] = rng.integers(0, 5, n).astype(float)
+        for i in range(1, 16):
+            tx[f"D{i}"] = np.where(rng.random(n) < 0.5, np.nan, rng.integers(0, 600, n))
+        for i in range(1, 10):
+            tx[f"M{i}"] = rng.choice(["T", "F", ""], n)
+        v_values = np.round(rng.random((n, 339)), 4)
+        v_values[rng.random((n, 339)) < 0.6] = np.nan  # Most V columns are mostly empty
+        for i in range(339):
+            tx[f"V{i + 1}"] = v_values[:, i]
+        pd.DataFrame(tx).to_csv(tx_path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+        has_identity = rng.random(n) < 0.24
+        ids = {"TransactionID": part["TransactionID"][has_identity].to_numpy()}
+        m = len(ids["TransactionID"])
+        for i in range(1, 39):
+            if i in (12, 15, 16, 23, 27, 28, 29, 30, 31, 33, 34, 35, 36, 37, 38):
+                ids[f"id_{i:02d}"] = rng.choice(["Found", "NotFound", "New", ""], m)
+            else:
+                ids[f"id_{i:02d}"] = np.where(rng.random(m) < 0.3, np.nan, rng.integers(-100, 100, m))
+        ids["DeviceType"] = rng.choice(["mobile", "desktop", ""], m)
+        ids["DeviceInfo"] = rng.choice(["Windows", "iOS Device", "MacOS", ""], m)
+        pd.DataFrame(ids).to_csv(id_path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    return tx_path, id_path
+
+
+TRAINING_TRANSACTION_COLUMNS = ["TransactionID", "isFraud", "TransactionDT", "TransactionAmt", "ProductCD",
+                                "card1", "card2", "card3", "card4", "card5", "addr1", "addr2"]
+TRAINING_IDENTITY_COLUMNS = ["DeviceType"]
+
+
+def _measure(mode, data_dir):
+    """Run one load in this (fresh) process and print its time and peak RSS as JSON"""
+    start = time.perf_counter()
+    if mode == "read_csv":
+        # What train_model.py used to do
+        frame = pd.merge(pd.read_csv(os.path.join(data_dir, TRANSACTION_FILE)),
+                         pd.read_csv(os.path.join(data_dir, IDENTITY_FILE)), on="TransactionID", how="left")
+    else:
+        frame = load_transactions(TRAINING_TRANSACTION_COLUMNS, TRAINING_IDENTITY_COLUMNS, data_dir=data_dir,
+                                  cache_dir=os.path.join(data_dir, CACHE_DIR))
+        frame = frame.copy()  # Touch every column, as training would
+    print(json.dumps({"seconds": time.perf_counter() - start, "rows": len(frame), "columns": len(frame.columns),
+                      "peak_mb": _peak_rss_mb()}))
+
+
+def _peak_rss_mb():
+    # VmHWM is per address space, so unlike ru_maxrss it doesn't inherit the parent's peak
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark(data_dir, n_rows):
+    """Load time and peak RSS: full read_csv + merge vs chunked load vs memory-mapped cache"""
+    import subprocess
+    if not os.path.exists(os.path.join(data_dir, TRANSACTION_FILE)):
+        print(f"✍️  Writing {n_rows:,} synthetic IEEE-shaped rows to {data_dir}/ ...")
+        write_synthetic_csvs(data_dir, n_rows)
+    shutil.rmtree(os.path.join(data_dir, CACHE_DIR), ignore_errors=True)
+    size_mb = sum(os.path.getsize(os.path.join(data_dir, f)) for f in (TRANSACTION_FILE, IDENTITY_FILE)) / 1e6
+    print(f"⚡ {TRANSACTION_FILE} + {IDENTITY_FILE}: {size_mb:,.0f} MB")
+    for label, mode in (("read_csv + merge (all columns)", "read_csv"),
+                        ("chunked, projected (cold)", "loader"),
+                        ("memory-mapped cache (warm)", "loader")):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "_measure", mode, data_dir],
+                             capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"   {label:<32} {result['seconds']:6.2f}s  peak RSS {result['peak_mb']:8,.0f} MB  "
+              f"-> {result['rows']:,} x {result['columns']}")
+
+
+if __name__ == "__main__":
+    # python data_loader.py bench [rows] [data_dir] | cache  (cache: build the training cache from ./*.csv)
+    # Equivalence with read_csv + merge: tests/test_data_loader.py
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command == "bench":
+        rows = int(sys.argv[2]) if len(sys.argv) > 2 else 590_540
+        benchmark(sys.argv[3] if len(sys.argv) > 3 else "synthetic_ieee", rows)
+    elif command == "cache":
+        load_transactions(TRAINING_TRANSACTION_COLUMNS, TRAINING_IDENTITY_COLUMNS)
+    elif command == "_measure":
+        _measure(sys.argv[2], sys.argv[3])
+    else:
+        print("Usage: python data_loader.py bench [rows] [data_dir] | cache")
+        sys.exit(1)
@@ -0,0 +1,126 @@
+# dynamic_batcher.py - coalesce concurrent scoring requests into one predict_proba call
+import asyncio
+from collections import deque
+
+import numpy as np
+
+
+class DynamicBatcher:
+    """Queues feature rows from many requests and scores them together"""
+
+    def __init__(self, predict, max_batch_size=1024, max_wait_us=2000):
+        self.predict = predict  # async callable: feature matrix -> fraud probabilities
+        self.max_batch_size = max_batch_size
+        self.max_wait_us = max_wait_us
+        self.pending = deque()  # (rows, future) per request, in arrival order
+        self.pending_rows = 0
+        self.has_work = asyncio.Event()
+        self.task = None
+
+        # Counters for /health
+        self.requests = 0
+        self.rows_scored = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    async def submit(self, rows):
+        """Score a 2-D feature matrix; resolves once the batch it joined is scored"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((rows, future))
+        self.pending_rows += len(rows)
+        self.requests += 1
+        self.has_work.set()
+        return await future
+
+    async def _collect(self):
+        """Wait until a full batch is queued or max_wait_us has passed since the first request"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_us / 1_000_000
+        while self.pending_rows < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self.has_work.clear()
+            try:
+                await asyncio.wait_for(self.has_work.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        # Take whole requests up to max_batch_size (an oversized request goes alone)
+        taken = []
+        rows = 0
+        while self.pending and (not taken or rows + len(self.pending[0][0]) <= self.max_batch_size):
+            request = self.pending.popleft()
+            taken.append(request)
+            rows += len(request[0])
+        self.pending_rows -= rows
+        return taken, rows
+
+    async def run(self):
+        """Batching loop - one predict call in flight; new requests coalesce meanwhile"""
+        while True:
+            await self.has_work.wait()
+            if not self.pending:
+                self.has_work.clear()
+                continue
+
+            taken, rows = await self._collect()
+            if not self.pending:
+                self.has_work.clear()
+
+            matrix = taken[0][0] if len(taken) == 1 else np.concatenate([r for r, _ in taken])
+            try:
+                probs = await self.predict(matrix)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                for _, future in taken:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            # Hand each request back its own slice of the batch
+            offset = 0
+            for request_rows, future in taken:
+                end = offset + len(request_rows)
+                if not future.done():  # Client may have gone away
+                    future.set_result(probs[offset:end])
+                offset = end
+
+            self.batches += 1
+            self.rows_scored += rows
+            self.largest_batch = max(self.largest_batch, rows)
+
+    def snapshot(self):
+        """Batching counters"""
+        return {
+            "requests": self.requests,
+            "rows_scored": self.rows_scored,
+            "batches": self.batches,
+            "mean_batch_rows": round(self.rows_scored / self.batches, 1) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued_rows": self.pending_rows,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_us": self.max_wait_us
+        }
+
+    def start(self):
+        """Start the batching task"""
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def stop(self):
+        """Cancel the batching task and fail anything still queued"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        for _, future in self.pending:
+            if not future.done():
+                future.cancel()
+        self.pending.clear()
+        self.pending_rows = 0
@@ -0,0 +1,182 @@
+# event_stream.py - columnar scored batches and per-subscription views (all / interesting / sampled)
+import numpy as np
+
+# Event type for each (actual fraud, flagged) pair, indexed by actual_fraud * 2 + flagged
+EVENT_TYPES = np.array(["legitimate", "false_alarm", "missed_fraud", "detected_fraud"], dtype=object)
+
+STREAM_MODES = ("all", "interesting", "sampled")
+DEFAULT_STREAM = "all"
+DEFAULT_SAMPLE_RATE = 0.01
+
+# Fibonacci hashing: id * 2**64/phi (mod 2**64) spreads consecutive ids evenly over
+# [0, 2**64), so "hash < rate * 2**64" keeps exactly that share of ids - the same
+# ids for every client, and a lower rate's sample is a subset of a higher one's
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_HASH_SPACE = 1 << 64
+
+
+def _hash_threshold(rate):
+    return min(int(rate * _HASH_SPACE), _HASH_SPACE - 1)
+
+
+def sample_mask(ids, rate):
+    """Deterministic per-id sample of `rate` (0..1) for an int array of transaction ids"""
+    ids = np.asarray(ids)
+    if rate >= 1:
+        return np.ones(len(ids), dtype=bool)
+    if rate <= 0:
+        return np.zeros(len(ids), dtype=bool)
+    hashed = ids.astype(np.uint64) * np.uint64(_HASH_MULTIPLIER)  # Wraps mod 2**64
+    return hashed < np.uint64(_hash_threshold(rate))
+
+
+def is_sampled(tx_id, rate):
+    """sample_mask() for a single id"""
+    if rate >= 1:
+        return True
+    if rate <= 0:
+        return False
+    return (tx_id * _HASH_MULTIPLIER) % _HASH_SPACE < _hash_threshold(rate)
+
+
+class Subscription:
+    """What one WebSocket client wants: every event, only interesting ones, or those plus a sample"""
+    __slots__ = ("stream", "sample_rate", "key")
+
+    def __init__(self, stream=DEFAULT_STREAM, sample_rate=None):
+        self.stream = stream
+        self.sample_rate = float(sample_rate) if stream == "sampled" else None
+        self.key = (stream, self.sample_rate)
+
+    def describe(self):
+        info = {"stream": self.stream}
+        if self.sample_rate is not None:
+            info["sample_rate"] = self.sample_rate
+        return info
+
+
+def negotiate_subscription(stream=None, sample_rate=None):
+    """The subscription a client asked for; unknown modes fall back to "all" (like codecs)"""
+    stream = (stream or DEFAULT_STREAM).lower()
+    if stream not in STREAM_MODES:
+        stream = DEFAULT_STREAM
+    if stream == "sampled":
+        rate = DEFAULT_SAMPLE_RATE if sample_rate is None else min(max(float(sample_rate), 0.0), 1.0)
+        return Subscription("sampled", rate)
+    return Subscription(stream)
+
+
+ALL_EVENTS = Subscription()
+
+
+class EventBatch:
+    """One scored batch as arrays; event dicts are built only for rows somebody receives
+
+    Rows keep the fields and order of the old per-event dicts. select() slices
+    the arrays; to_events() builds (and memoizes) the dicts for a batch.
+    """
+
+    def __init__(self, ids, amounts, probs, flags, type_codes, timestamp, model, batch, id_prefix="TX-REAL-"):
+        self.ids = ids
+        self.amounts = amounts
+        self.probs = probs
+        self.flags = flags
+        self.type_codes = type_codes
+        self.timestamp = timestamp
+        self.model = model
+        self.batch = batch
+        self.id_prefix = id_prefix
+        self._events = None
+        self._selections = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def select(self, mask):
+        return EventBatch(self.ids[mask], self.amounts[mask], self.probs[mask], self.flags[mask],
+                          self.type_codes[mask], self.timestamp, self.model, self.batch, self.id_prefix)
+
+    def interesting(self):
+        """Flagged or missed rows (memoized: the engine's event buffer and subscribers share them)"""
+        if "interesting" not in self._selections:
+            self._selections["interesting"] = self.select(self.type_codes != 0)
+        return self._selections["interesting"]
+
+    def sampled(self, rate):
+        """Interesting rows plus a deterministic id-hash sample of the legitimate ones"""
+        key = ("sampled", rate)
+        if key not in self._selections:
+            self._selections[key] = self.select((self.type_codes != 0) | sample_mask(self.ids, rate))
+        return self._selections[key]
+
+    def legitimate_count(self):
+        return int(np.count_nonzero(self.type_codes == 0))
+
+    def to_events(self):
+        """Per-event dicts, as the frames have always carried them"""
+        if self._events is None:
+            prefix, timestamp, model, batch = self.id_prefix, self.timestamp, self.model, self.batch
+            self._events = [
+                {
+                    "id": f"{prefix}{tx_id}",
+                    "amount": amount,
+                    "fraud_prob": fraud_prob,
+                    "is_flagged": flagged,
+                    "type": event_type,
+                    "timestamp": timestamp,
+                    "interesting": event_type != "legitimate",
+                    "model": model,
+                    "batch": batch
+                }
+                for tx_id, amount, fraud_prob, flagged, event_type in zip(
+                    self.ids.tolist(),
+                    self.amounts.tolist(),
+                    self.probs.tolist(),
+                    self.flags.tolist(),
+                    EVENT_TYPES[self.type_codes].tolist()
+                )
+            ]
+        return self._events
+
+
+def _select_events(events, subscription):
+    """The same views over an already-built list of event dicts (the simulation's frames)"""
+    legitimate = sum(1 for tx in events if tx["type"] == "legitimate")
+    if subscription.stream == "interesting":
+        selected = [tx for tx in events if tx["type"] != "legitimate"]
+    else:
+        rate = subscription.sample_rate
+        selected = [tx for tx in events
+                    if tx["type"] != "legitimate" or is_sampled(int(tx["id"].rsplit("-", 1)[1]), rate)]
+    return selected, legitimate
+
+
+def frame_view(frame, subscription):
+    """The frame as one subscription receives it
+
+    "all" frames are unchanged. Otherwise "transactions" keeps the interesting
+    rows (plus the sample) and the frame says how many legitimate rows the
+    batch had and how many of them were sent.
+    """
+    if subscription.stream == "all":
+        return frame
+    transactions = frame.get("transactions") or []
+    if isinstance(transactions, EventBatch):
+        if subscription.stream == "interesting":
+            selected = transactions.interesting()
+        else:
+            selected = transactions.sampled(subscription.sample_rate)
+        legitimate = transactions.legitimate_count()
+    else:
+        selected, legitimate = _select_events(transactions, subscription)
+    sent = legitimate - (len(transactions) - len(selected))  # Only legitimate rows are ever left out
+    return {**frame, "transactions": selected, **subscription.describe(),
+            "legitimate_count": legitimate, "legitimate_sent": sent}
+
+
+def plain_frame(frame):
+    """The frame with an EventBatch swapped for its event dicts (what JSON-style codecs send)"""
+    transactions = frame.get("transactions")
+    if isinstance(transactions, EventBatch):
+        return {**frame, "transactions": transactions.to_events()}
+    return frame
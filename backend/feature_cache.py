@@ -0,0 +1,276 @@
+# feature_cache.py - content-addressed cache of the engineered training matrix (X/y)
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+
+import data_loader
+import feature_engineering
+import quantile_sketch
+from data_loader import (IDENTITY_FILE, TRAINING_IDENTITY_COLUMNS, TRAINING_TRANSACTION_COLUMNS,
+                         TRANSACTION_FILE, load_columnar, load_transactions, save_columnar)
+from feature_engineering import TRAINING_FEATURE_COLUMNS
+
+FEATURE_CACHE_DIR = "feature_cache"
+FEATURE_CACHE_FORMAT = 2  # 2: TransactionDT stored alongside X/y
+DIGESTS_FILE = "source_digests.json"
+LABEL_COLUMN = "isFraud"
+TIME_COLUMN = "TransactionDT"  # Kept with each row (not a feature) so demo data can be replayed in time
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # LRU eviction beyond this
+
+# Everything that shapes X/y: change any of these files and old entries are stale
+CODE_MODULES = (feature_engineering, data_loader, quantile_sketch)
+
+_session = {"hits": 0, "misses": 0, "build_seconds": 0.0, "load_seconds": 0.0}
+
+
+def code_version():
+    """Hash of the feature-engineering code (the modules that produce X/y)"""
+    digest = hashlib.sha1(f"format={FEATURE_CACHE_FORMAT}".encode())
+    for module in CODE_MODULES:
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def file_digest(path, cache_dir=FEATURE_CACHE_DIR):
+    """SHA-1 of a file's contents, remembered per (size, mtime) so big CSVs are hashed once"""
+    stat = os.stat(path)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    digests_path = os.path.join(cache_dir, DIGESTS_FILE)
+    digests = _read_json(digests_path) or {}
+    known = digests.get(os.path.abspath(path))
+    if known and known["stamp"] == stamp:
+        return known["sha1"]
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digests[os.path.abspath(path)] = {"stamp": stamp, "sha1": digest.hexdigest()}
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_json(digests_path, digests)
+    return digest.hexdigest()
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_json(path, payload):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _sources(data_dir):
+    return [os.path.join(data_dir, TRANSACTION_FILE), os.path.join(data_dir, IDENTITY_FILE)]
+
+
+def cache_key(source_digests, params, code):
+    payload = json.dumps({"sources": source_digests, "params": params, "code": code}, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:20]
+
+
+def build_feature_matrix_from_csv(sample_rows=None, stratify="isFraud", seed=42, quantile_method="sketch",
+                                  feature_columns=TRAINING_FEATURE_COLUMNS, data_dir=".", with_time=False):
+    """The uncached pipeline: load -> time features -> real-time features -> encoded X/y (and TransactionDT)"""
+    df = load_transactions(TRAINING_TRANSACTION_COLUMNS, TRAINING_IDENTITY_COLUMNS, sample_rows=sample_rows,
+                           stratify=stratify, seed=seed, data_dir=data_dir)
+    print(f"Merged data: {df.shape}")
+
+    # Note from Noel: TransactionDT is TIMEDELTA NOT TIMESTAMP!
+    df['TransactionDT'] = df['TransactionDT'].astype(int)
+    df = feature_engineering.add_time_features(df)
+    print("Time features created!")
+
+    print("Creating real-time features...")
+    df = feature_engineering.create_real_time_features(df, quantile_method=quantile_method)
+    X, y = feature_engineering.build_feature_matrix(df, feature_columns)
+    return (X, y, df[TIME_COLUMN].copy()) if with_time else (X, y)
+
+
+def load_feature_matrix(sample_rows=None, stratify="isFraud", seed=42, quantile_method="sketch",
+                        feature_columns=TRAINING_FEATURE_COLUMNS, data_dir=".", cache_dir=FEATURE_CACHE_DIR,
+                        use_cache=True, max_bytes=DEFAULT_MAX_BYTES, with_time=False):
+    """Training X/y, from the cache when inputs, parameters and feature code are unchanged
+
+    The key hashes the CSV contents, the sampling/feature parameters and
+    code_version(); a miss builds the matrix, stores it and evicts stale or
+    least recently used entries beyond max_bytes. with_time=True also returns
+    each row's TransactionDT (X, y, dt).
+    """
+    if not use_cache:
+        return build_feature_matrix_from_csv(sample_rows, stratify, seed, quantile_method, feature_columns, data_dir,
+                                             with_time)
+
+    start = time.perf_counter()
+    sources = _sources(data_dir)
+    source_digests = {os.path.basename(p): file_digest(p, cache_dir) for p in sources}
+    params = {"sample_rows": sample_rows, "stratify": stratify if sample_rows else None, "seed": seed,
+              "quantile_method": quantile_method, "feature_columns": list(feature_columns)}
+    code = code_version()
+    key = cache_key(source_digests, params, code)
+    entry_path = os.path.join(cache_dir, key)
+
+    meta = _read_json(os.path.join(entry_path, "meta.json"))
+    if meta is not None:
+        frame = load_columnar(entry_path)
+        y = frame.pop(LABEL_COLUMN)
+        dt = frame.pop(TIME_COLUMN)
+        _touch(entry_path, meta)
+        elapsed = time.perf_counter() - start
+        _session["hits"] += 1
+        _session["load_seconds"] += elapsed
+        print(f"📦 Feature cache hit {key}: {len(frame):,} x {len(frame.columns)} in {elapsed:.2f}s "
+              f"(built in {meta['build_seconds']:.1f}s)")
+        return (frame, y, dt) if with_time else (frame, y)
+
+    X, y, dt = build_feature_matrix_from_csv(sample_rows, stratify, seed, quantile_method, feature_columns, data_dir,
+                                             with_time=True)
+    elapsed = time.perf_counter() - start
+    _session["misses"] += 1
+    _session["build_seconds"] += elapsed
+    save_columnar(X.assign(**{LABEL_COLUMN: y, TIME_COLUMN: dt}).reset_index(drop=True), entry_path, {
+        "key": key,
+        "code_version": code,
+        "sources": {p: source_digests[os.path.basename(p)] for p in map(os.path.abspath, sources)},
+        "params": params,
+        "build_seconds": round(elapsed, 3),
+        "created": time.time(),
+        "last_used": time.time(),
+        "hits": 0
+    })
+    print(f"💾 Feature cache miss {key}: built {len(X):,} x {len(X.columns)} in {elapsed:.1f}s, cached")
+    evict(cache_dir, max_bytes=max_bytes, keep=key)
+    return (X, y, dt) if with_time else (X, y)
+
+
+def _touch(entry_path, meta):
+    meta["last_used"] = time.time()
+    meta["hits"] = meta.get("hits", 0) + 1
+    _write_json(os.path.join(entry_path, "meta.json"), meta)
+
+
+# ==================== STATS / EVICTION ====================
+def _entries(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        meta = _read_json(os.path.join(path, "meta.json")) if os.path.isdir(path) else None
+        if meta is None or "code_version" not in meta:
+            continue
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        entries.append({"path": path, "bytes": size, **meta})
+    return entries
+
+
+def _stale_reason(entry, code, cache_dir):
+    """Why an entry can never be hit again (None if it still can)"""
+    if entry["code_version"] != code:
+        return "feature code changed"
+    for path, digest in entry["sources"].items():
+        if not os.path.exists(path):
+            return f"{os.path.basename(path)} is gone"
+        if file_digest(path, cache_dir) != digest:
+            return f"{os.path.basename(path)} changed"
+    return None
+
+
+def cache_stats(cache_dir=FEATURE_CACHE_DIR):
+    """Entries, sizes, hit counts and staleness, plus this process's hits/misses"""
+    code = code_version()
+    entries = []
+    for entry in sorted(_entries(cache_dir), key=lambda e: e["last_used"], reverse=True):
+        entries.append({
+            "key": entry["key"],
+            "rows": entry["rows"],
+            "features": sum(c["name"] not in (LABEL_COLUMN, TIME_COLUMN) for c in entry["columns"]),
+            "bytes": entry["bytes"],
+            "hits": entry.get("hits", 0),
+            "build_seconds": entry["build_seconds"],
+            "created": entry["created"],
+            "last_used": entry["last_used"],
+            "params": entry["params"],
+            "stale": _stale_reason(entry, code, cache_dir)
+        })
+    return {
+        "cache_dir": cache_dir,
+        "code_version": code,
+        "entries": len(entries),
+        "total_bytes": sum(e["bytes"] for e in entries),
+        "stale_entries": sum(1 for e in entries if e["stale"]),
+        "total_hits": sum(e["hits"] for e in entries),
+        "saved_build_seconds": round(sum(e["hits"] * e["build_seconds"] for e in entries), 1),
+        "session": dict(_session),
+        "items": entries
+    }
+
+
+def evict(cache_dir=FEATURE_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_age_days=None, keep=None):
+    """Remove stale entries, entries unused for max_age_days, then LRU down to max_bytes"""
+    code = code_version()
+    now = time.time()
+    removed = []
+    live = []
+    for entry in _entries(cache_dir):
+        reason = None if entry["key"] == keep else _stale_reason(entry, code, cache_dir)
+        if reason is None and max_age_days is not None and entry["key"] != keep \
+                and now - entry["last_used"] > max_age_days * 86400:
+            reason = f"unused for {max_age_days} days"
+        if reason:
+            removed.append((entry, reason))
+        else:
+            live.append(entry)
+
+    total = sum(e["bytes"] for e in live)
+    for entry in sorted(live, key=lambda e: e["last_used"]):
+        if total <= max_bytes:
+            break
+        if entry["key"] == keep:
+            continue
+        removed.append((entry, "over size budget"))
+        total -= entry["bytes"]
+
+    for entry, reason in removed:
+        shutil.rmtree(entry["path"], ignore_errors=True)
+        print(f"🧹 Evicted feature cache {entry['key']} ({entry['bytes'] / 1e6:,.1f} MB): {reason}")
+    return [(entry["key"], reason) for entry, reason in removed]
+
+
+def print_stats(cache_dir=FEATURE_CACHE_DIR):
+    stats = cache_stats(cache_dir)
+    print(f"📦 {stats['cache_dir']}/: {stats['entries']} entries, {stats['total_bytes'] / 1e6:,.1f} MB, "
+          f"{stats['total_hits']} hits saving ~{stats['saved_build_seconds']:,.0f}s of feature building "
+          f"(code {stats['code_version']})")
+    for item in stats["items"]:
+        params = item["params"]
+        print(f"   {'⚠️ ' if item['stale'] else '✅'} {item['key']}  {item['rows']:,} x {item['features']}  "
+              f"{item['bytes'] / 1e6:8,.1f} MB  hits {item['hits']:<3}  "
+              f"sample={params['sample_rows']} quantiles={params['quantile_method']}"
+              + (f"  stale: {item['stale']}" if item["stale"] else ""))
+
+
+if __name__ == "__main__":
+    # python feature_cache.py stats | evict [max_gb] | clear  (hit/miss/invalidation tests: tests/test_feature_cache.py)
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "stats":
+        print_stats()
+    elif command == "evict":
+        max_bytes = float(sys.argv[2]) * 1024 ** 3 if len(sys.argv) > 2 else DEFAULT_MAX_BYTES
+        print(f"🧹 {len(evict(max_bytes=max_bytes))} entries evicted")
+    elif command == "clear":
+        shutil.rmtree(FEATURE_CACHE_DIR, ignore_errors=True)
+        print(f"🧹 Removed {FEATURE_CACHE_DIR}/")
+    else:
+        print("Usage: python feature_cache.py stats | evict [max_gb] | clear")
+        sys.exit(1)
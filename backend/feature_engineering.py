@@ -0,0 +1,264 @@
+# feature_engineering.py - batch feature pipeline shared by training and the feature store checks
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.indexers import BaseIndexer
+from quantile_sketch import grouped_quantile
+
+
+def add_time_features(df):
+    """Hour/day features from TransactionDT (a timedelta in seconds, not a timestamp)"""
+    df['hour_of_day'] = (df['TransactionDT'] // 3600) % 24
+    df['day_of_week'] = (df['TransactionDT'] // (3600 * 24)) % 7
+    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+    df['is_night'] = ((df['hour_of_day'] >= 0) & (df['hour_of_day'] <= 5)).astype(int)
+    return df
+
+
+def create_real_time_features(df, quantile_method="exact"):
+    """Create features that simulate real-time detection
+
+    Vectorized: every per-card statistic comes from sorts and segment operations
+    instead of a Python lambda per card, and the output is identical (bit for bit
+    with quantile_method="exact") to create_real_time_features_reference.
+
+    quantile_method="sketch" computes the per-card median and 95th percentile
+    from the same QuantileSketch buckets the live CardFeatureStore uses (within
+    1% of exact), so training and serving see identical values.
+    """
+
+    # Sort by time for rolling calculations
+    df = df.sort_values('TransactionDT').reset_index(drop=True)
+    by_card = df.groupby('card1')
+
+    # Feature 1: Amount deviation (user-level)
+    user_median_amount = grouped_quantile(df['card1'], df['TransactionAmt'], 0.5, quantile_method)
+    df['amount_deviation_ratio'] = df['TransactionAmt'] / (user_median_amount + 1)
+
+    # Feature 2: User transaction count (simpler and more reliable)
+    df['tx_count_user'] = by_card['TransactionID'].transform('count')
+
+    # Feature 3: New merchant flag - most frequent product, ties to the one seen first
+    df['common_merchant'] = _group_mode(df['card1'], df['ProductCD'], ties="first_seen")
+    df['is_new_merchant'] = (df['ProductCD'] != df['common_merchant']).astype(int)
+
+    # Feature 4: Unusual time for user - most frequent hour, ties to the lowest (like mode())
+    df['user_common_hour'] = _group_mode(df['card1'], df['hour_of_day'], ties="lowest")
+    df['unusual_time'] = (abs(df['hour_of_day'] - df['user_common_hour']) > 4).astype(int)
+
+    # User's normal spending patterns: 95th percentile, or the median for cards with <= 10 tx
+    card_size = by_card['TransactionAmt'].transform('size')
+    user_amount_95th = grouped_quantile(df['card1'], df['TransactionAmt'], 0.95, quantile_method)
+    df['user_amount_95th'] = np.where(card_size > 10, user_amount_95th, user_median_amount)
+
+    df['amount_vs_normal'] = df['TransactionAmt'] / df['user_amount_95th']
+
+    # Better time deviation (NEW - replaces unusual_time)
+    df['hour_deviation'] = abs(df['hour_of_day'] - df['user_common_hour'])
+
+    # Feature 5: High-risk product categories
+    df['high_risk_product'] = df['ProductCD'].isin(['W', 'S']).astype(int)
+
+    # Feature 6: Time since last transaction (HUGE for fraud)
+    df['time_since_last_tx'] = by_card['TransactionDT'].diff()
+
+    # Count-based rolling over each card's last 5 transactions
+    df['tx_frequency_change'] = _grouped_rolling_variation(df['card1'], df['TransactionAmt'], 5)
+
+    # Merchant risk profiling
+    merchant_fraud_rates = df.groupby('ProductCD', observed=True)['isFraud'].mean()
+    df['merchant_risk_score'] = df['ProductCD'].map(merchant_fraud_rates).astype(float)  # ProductCD may be categorical
+
+    return df
+
+
+def _group_mode(keys, values, ties="first_seen"):
+    """Per-row most frequent value within each key group (NaN for missing keys)
+
+    ties="first_seen" breaks ties like value_counts().index[0] (earliest row wins),
+    ties="lowest" like mode()[0] (smallest value wins).
+    """
+    frame = pd.DataFrame({'key': keys, 'value': values, 'row': np.arange(len(keys))})
+    counts = (frame.dropna(subset=['key', 'value'])
+              .groupby(['key', 'value'], sort=False)['row']
+              .agg(['size', 'min'])
+              .reset_index())
+    tie_column = 'min' if ties == "first_seen" else 'value'
+    counts = counts.sort_values(['key', 'size', tie_column], ascending=[True, False, True], kind='stable')
+    modes = counts.drop_duplicates('key').set_index('key')['value']
+    return keys.map(modes)
+
+
+class _SegmentWindow(BaseIndexer):
+    """Precomputed window bounds (pandas calls get_window_bounds once per rolling op)"""
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        return self.starts, self.ends
+
+
+def _grouped_rolling_variation(keys, values, window):
+    """Per-row rolling std / (rolling mean + 1) over each key's last `window` rows
+
+    Same as groupby(keys)[values].transform(lambda x: x.rolling(window, min_periods=1)...)
+    bit for bit: the rows are stably sorted by key and rolled once, with windows
+    that never reach back past the start of their key's segment.
+    """
+    codes, _ = pd.factorize(np.asarray(keys), use_na_sentinel=True)
+    rows = np.flatnonzero(codes >= 0)
+    order = rows[np.argsort(codes[rows], kind='stable')]
+    sorted_codes = codes[order]
+    result = np.full(len(codes), np.nan)
+    if len(order) == 0:
+        return result
+
+    position = np.arange(len(order))
+    segment_start = np.where(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]], position, 0)
+    starts = np.maximum(np.maximum.accumulate(segment_start), position - (window - 1))
+    rolling = pd.Series(np.asarray(values, dtype=float)[order]).rolling(
+        _SegmentWindow(starts=starts.astype(np.int64), ends=position.astype(np.int64) + 1), min_periods=1)
+
+    result[order] = (rolling.std() / (rolling.mean() + 1)).to_numpy()
+    return result
+
+
+def create_real_time_features_reference(df):
+    """The original per-card lambda implementation, kept to check the vectorized one against"""
+
+    df = df.sort_values('TransactionDT').reset_index(drop=True)
+
+    user_median_amount = df.groupby('card1')['TransactionAmt'].transform('median')
+    df['amount_deviation_ratio'] = df['TransactionAmt'] / (user_median_amount + 1)
+
+    df['tx_count_user'] = df.groupby('card1')['TransactionID'].transform('count')
+
+    common_merchants = df.groupby('card1')['ProductCD'].agg(lambda x: x.value_counts().index[0] if len(x) > 0 else 'X')
+    df['common_merchant'] = df['card1'].map(common_merchants)
+    df['is_new_merchant'] = (df['ProductCD'] != df['common_merchant']).astype(int)
+
+    user_common_hour = df.groupby('card1')['hour_of_day'].agg(lambda x: x.mode()[0] if len(x.mode()) > 0 else 12)
+    df['user_common_hour'] = df['card1'].map(user_common_hour)
+    df['unusual_time'] = (abs(df['hour_of_day'] - df['user_common_hour']) > 4).astype(int)
+
+    df['user_amount_95th'] = df.groupby('card1')['TransactionAmt'].transform(
+    lambda x: x.quantile(0.95) if len(x) > 10 else x.median())
+
+    df['amount_vs_normal'] = df['TransactionAmt'] / df['user_amount_95th']
+
+    df['hour_deviation'] = abs(df['hour_of_day'] - df['user_common_hour'])
+
+    df['high_risk_product'] = df['ProductCD'].isin(['W', 'S']).astype(int)
+
+    df['time_since_last_tx'] = df.groupby('card1')['TransactionDT'].diff()
+
+    df['tx_frequency_change'] = df.groupby('card1')['TransactionAmt'].transform(
+    lambda x: x.rolling(5, min_periods=1).std() / (x.rolling(5, min_periods=1).mean() + 1))
+
+    merchant_fraud_rates = df.groupby('ProductCD')['isFraud'].mean()
+    df['merchant_risk_score'] = df['ProductCD'].map(merchant_fraud_rates)
+
+    return df
+
+
+# Features that make sense for real-time detection
+TRAINING_FEATURE_COLUMNS = [
+    # Core transaction features
+    'TransactionAmt',
+
+    # Our engineered real-time features
+    'amount_deviation_ratio',
+    #Note from Noel:'tx_velocity_24h'(The complex velocity feature was mathematically elegant but conceptually flawed for this dataset since TransactionDT is timedelta and not a timestamp.),
+    'tx_count_user',
+    'is_new_merchant',
+    'unusual_time',
+
+    # Time patterns
+    'hour_of_day',
+    'is_weekend',
+    'is_night',
+
+    # Simple card features (available in real-time)
+    'card1', 'card2', 'card3', 'card4', 'card5',
+
+    # Product context
+    'ProductCD',
+
+    # Geographic (simplified)
+    'addr1', 'addr2',
+
+    # Device info (if available)
+    'DeviceType',
+]
+CATEGORICAL_COLUMNS = ['card4', 'ProductCD', 'DeviceType']
+
+
+def build_feature_matrix(df, feature_columns=TRAINING_FEATURE_COLUMNS):
+    """Model inputs X (categoricals label-encoded, NaN -> -999) and labels y"""
+
+    # Filter to available columns
+    available_features = [col for col in feature_columns if col in df.columns]
+    print(f"Using {len(available_features)} features: {available_features}")
+
+    X = df[available_features].copy()
+    y = df['isFraud'].copy()
+
+    # Handle categorical variables
+    for col in CATEGORICAL_COLUMNS:
+        if col in X.columns:
+            X[col] = X[col].astype(object).fillna('Missing')  # Loaded as category
+            X[col] = X[col].astype('category').cat.codes
+        else:
+            print(f"{col} not available, skipping")
+
+    # Fill remaining NaN
+    X = X.fillna(-999)
+    return X, y
+
+
+def make_synthetic_transactions(n_rows, n_cards=None, seed=42):
+    """IEEE-like raw transactions for checks and benchmarks (the real CSVs aren't in the repo)"""
+    rng = np.random.default_rng(seed)
+    n_cards = n_cards or max(1, n_rows // 40)
+    # Heavy-tailed card activity, like card1 in the real data
+    card_weights = 1.0 / np.arange(1, n_cards + 1) ** 0.8
+    cards = rng.choice(np.arange(1000, 1000 + n_cards), size=n_rows, p=card_weights / card_weights.sum())
+    # Each card mostly buys one product
+    products = np.array(['W', 'C', 'R', 'H', 'S'])
+    favourite = rng.integers(0, len(products), size=n_cards)[cards - 1000]
+    product_codes = np.where(rng.random(n_rows) < 0.7, favourite, rng.integers(0, len(products), size=n_rows))
+
+    return pd.DataFrame({
+        'TransactionID': np.arange(2987000, 2987000 + n_rows),
+        'TransactionDT': 86400 + np.cumsum(rng.integers(1, 60, size=n_rows)),
+        'card1': cards,
+        'TransactionAmt': np.round(rng.lognormal(3.8, 1.0, size=n_rows), 2),
+        'ProductCD': products[product_codes],
+        'isFraud': (rng.random(n_rows) < 0.035).astype(int)
+    })
+
+
+IEEE_TRAIN_ROWS = 590_540  # Rows in train_transaction.csv
+
+
+def benchmark(n_rows=IEEE_TRAIN_ROWS, seed=42):
+    """Time reference vs vectorized on an IEEE-sized synthetic train set"""
+    # ~13.5k distinct card1 values, like the real train set
+    raw = add_time_features(make_synthetic_transactions(n_rows, n_cards=n_rows // 44, seed=seed))
+    timings = {}
+    for name, build in (("reference", create_real_time_features_reference),
+                        ("vectorized", create_real_time_features),
+                        ("vectorized+sketch", lambda df: create_real_time_features(df, quantile_method="sketch"))):
+        start = time.perf_counter()
+        build(raw.copy())
+        timings[name] = time.perf_counter() - start
+        print(f"⚡ {name:<18} {n_rows:,} rows, {raw['card1'].nunique():,} cards: {timings[name]:.2f}s")
+    print(f"   vectorized is {timings['reference'] / timings['vectorized']:.1f}x faster")
+
+
+if __name__ == "__main__":
+    # python feature_engineering.py bench [rows]  (equivalence tests: tests/test_feature_engineering.py)
+    if len(sys.argv) > 1 and sys.argv[1] != "bench":
+        print("Usage: python feature_engineering.py bench [rows]")
+        sys.exit(1)
+    benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else IEEE_TRAIN_ROWS)
@@ -0,0 +1,218 @@
+# feature_store.py - incremental per-card aggregates for featurizing raw transactions live
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+from quantile_sketch import DEFAULT_RELATIVE_ACCURACY, make_quantile_state
+
+NAN = float("nan")
+
+# Features produced per transaction (same names as feature_engineering.create_real_time_features)
+STORE_FEATURES = (
+    "hour_of_day", "day_of_week", "is_weekend", "is_night",
+    "amount_deviation_ratio", "tx_count_user", "is_new_merchant",
+    "unusual_time", "time_since_last_tx", "user_amount_95th",
+    "amount_vs_normal", "hour_deviation"
+)
+
+
+def _is_missing(value):
+    return value is None or value != value  # None or NaN
+
+
+class CardState:
+    """Running aggregates for one card"""
+    __slots__ = ("count", "amounts", "last_dt", "product_counts", "product_first",
+                 "product_mode", "hour_counts", "hour_mode")
+
+    def __init__(self, amounts):
+        self.count = 0
+        self.amounts = amounts  # QuantileSketch or ExactQuantiles
+        self.last_dt = None
+        self.product_counts = {}
+        self.product_first = {}  # Order of first appearance, the batch tie-break
+        self.product_mode = None
+        self.hour_counts = [0] * 24
+        self.hour_mode = None
+
+    def add(self, amount, product, hour, dt):
+        self.count += 1
+        self.amounts.add(amount)
+        self.last_dt = dt
+
+        # Modes only change towards the value just counted, so each update is O(1).
+        # Ties resolve like the batch code: value_counts() keeps first appearance
+        # for products, Series.mode() picks the smallest hour.
+        if not _is_missing(product):
+            count = self.product_counts.get(product, 0) + 1
+            self.product_counts[product] = count
+            if product not in self.product_first:
+                self.product_first[product] = len(self.product_first)
+            mode = self.product_mode
+            if mode is None or count > self.product_counts[mode] or (
+                    count == self.product_counts[mode] and self.product_first[product] < self.product_first[mode]):
+                self.product_mode = product
+
+        self.hour_counts[hour] += 1
+        mode = self.hour_mode
+        if mode is None or self.hour_counts[hour] > self.hour_counts[mode] or (
+                self.hour_counts[hour] == self.hour_counts[mode] and hour < mode):
+            self.hour_mode = hour
+
+    def amount_quantiles(self):
+        """(median, "95th") - the batch code uses the median until a card has more than 10 transactions"""
+        median, p95 = self.amounts.quantiles((0.5, 0.95))
+        return median, (p95 if self.count > 10 else median)
+
+
+class CardFeatureStore:
+    """Per-card aggregates updated per transaction, bounded by LRU size and TTL
+
+    update(tx) folds a raw transaction (card1, TransactionAmt, ProductCD,
+    TransactionDT) into its card's state and returns its features as of that
+    transaction. They match create_real_time_features run on the history up to
+    and including it. The batch version sees each card's whole history, future
+    rows included; card_features() gives that view from the current state.
+
+    Counts, modes, last time and the time features are O(1) per update. The
+    median and 95th percentile come from a per-card QuantileSketch (within
+    relative_accuracy of exact, bounded buckets - see quantile_sketch.py) or,
+    with quantile_method="exact", from every amount kept sorted. Pass the
+    quantile_method the model was trained with. Memory is bounded by max_cards
+    (least recently updated card evicted first) and by ttl_seconds of
+    TransactionDT without activity. Categorical encoding (card4/ProductCD/
+    DeviceType codes) is left to the caller.
+    """
+
+    def __init__(self, max_cards=100_000, ttl_seconds=None, quantile_method="sketch",
+                 relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.max_cards = max_cards
+        self.ttl_seconds = ttl_seconds
+        self.quantile_method = quantile_method
+        self.relative_accuracy = relative_accuracy
+        make_quantile_state(quantile_method, relative_accuracy)  # Validate early
+        self.cards = OrderedDict()  # card1 -> CardState, least recently updated first
+        self.updates = 0
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+
+    def update(self, tx):
+        """Add one transaction and return its features"""
+        self.updates += 1
+        dt = tx["TransactionDT"]
+        card = tx["card1"]
+        features = self._time_features(dt)
+        if _is_missing(card):
+            # groupby drops missing keys, so the batch features are NaN too
+            features.update(amount_deviation_ratio=NAN, tx_count_user=NAN,
+                            is_new_merchant=1, unusual_time=0, time_since_last_tx=NAN,
+                            user_amount_95th=NAN, amount_vs_normal=NAN, hour_deviation=NAN)
+            return features
+
+        state = self.cards.get(card)
+        if state is None:
+            state = self.cards[card] = CardState(
+                make_quantile_state(self.quantile_method, self.relative_accuracy))
+        else:
+            self.cards.move_to_end(card)
+        previous_dt = state.last_dt
+        state.add(tx["TransactionAmt"], tx.get("ProductCD"), features["hour_of_day"], dt)
+
+        self._card_features(state, tx, features)
+        features["time_since_last_tx"] = NAN if previous_dt is None else dt - previous_dt
+        self._evict(dt)
+        return features
+
+    def card_features(self, tx):
+        """Features for tx from its card's current state, without updating it"""
+        features = self._time_features(tx["TransactionDT"])
+        state = self.cards.get(tx["card1"])
+        if state is None:
+            return None
+        self._card_features(state, tx, features)
+        return features
+
+    def _time_features(self, dt):
+        hour = int(dt // 3600 % 24)
+        day = int(dt // 86400 % 7)
+        return {
+            "hour_of_day": hour,
+            "day_of_week": day,
+            "is_weekend": int(day >= 5),
+            "is_night": int(hour <= 5)
+        }
+
+    def _card_features(self, state, tx, features):
+        amount = tx["TransactionAmt"]
+        hour_deviation = abs(features["hour_of_day"] - state.hour_mode)
+        median, amount_95th = state.amount_quantiles()
+        features["amount_deviation_ratio"] = amount / (median + 1)
+        features["tx_count_user"] = state.count
+        features["is_new_merchant"] = int(tx.get("ProductCD") != state.product_mode)
+        features["unusual_time"] = int(hour_deviation > 4)
+        features["user_amount_95th"] = amount_95th
+        features["amount_vs_normal"] = amount / amount_95th if amount_95th else (
+            NAN if amount == 0 else float("inf"))
+        features["hour_deviation"] = hour_deviation
+        return features
+
+    def _evict(self, now):
+        cards = self.cards
+        while len(cards) > self.max_cards:
+            cards.popitem(last=False)
+            self.evicted_lru += 1
+        if self.ttl_seconds is not None:
+            cutoff = now - self.ttl_seconds
+            while cards:
+                oldest = next(iter(cards.values()))
+                if oldest.last_dt >= cutoff:
+                    break
+                cards.popitem(last=False)
+                self.evicted_ttl += 1
+
+    def snapshot(self):
+        """Size and eviction counters"""
+        return {
+            "cards": len(self.cards),
+            "max_cards": self.max_cards,
+            "ttl_seconds": self.ttl_seconds,
+            "quantile_method": self.quantile_method,
+            "updates": self.updates,
+            "evicted_lru": self.evicted_lru,
+            "evicted_ttl": self.evicted_ttl
+        }
+
+
+# ==================== BENCHMARK ====================
+def benchmark(n_rows=200_000, max_cards=100_000):
+    """Update throughput and memory per card on synthetic transactions"""
+    import tracemalloc
+    from feature_engineering import make_synthetic_transactions
+
+    transactions = make_synthetic_transactions(n_rows, n_cards=n_rows // 10).to_dict("records")
+    for quantile_method in ("exact", "sketch"):
+        store = CardFeatureStore(max_cards=max_cards, quantile_method=quantile_method)
+        start = time.perf_counter()
+        for tx in transactions:
+            store.update(tx)
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        sized = CardFeatureStore(max_cards=max_cards, quantile_method=quantile_method)
+        for tx in transactions:
+            sized.update(tx)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        busiest = max(sized.cards.values(), key=lambda state: state.count)
+        print(f"⚡ [{quantile_method}] {n_rows:,} updates in {elapsed:.2f}s = {n_rows / elapsed:,.0f} tx/sec "
+              f"({elapsed / n_rows * 1e6:.1f} µs/tx) | {len(sized.cards):,} cards, "
+              f"{memory / len(sized.cards):,.0f} B/card | busiest card: {busiest.count:,} tx")
+
+
+if __name__ == "__main__":
+    # python feature_store.py bench (consistency tests: tests/test_feature_store.py)
+    if len(sys.argv) > 1 and sys.argv[1] != "bench":
+        print("Usage: python feature_store.py bench")
+        sys.exit(1)
+    benchmark()
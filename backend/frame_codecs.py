@@ -0,0 +1,292 @@
+# frame_codecs.py - WebSocket frame encoders negotiated per client
+import json
+import re
+import struct
+import time
+import numpy as np
+from event_stream import ALL_EVENTS, EVENT_TYPES, EventBatch, frame_view, plain_frame
+
+try:
+    import orjson
+except ImportError:  # Optional - falls back to the standard json codec
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional - binary clients can use the columnar codec instead
+    msgpack = None
+
+
+class JsonCodec:
+    """Standard library JSON (what send_json uses) - the default codec"""
+    name = "json"
+    binary = False
+
+    def encode(self, frame):
+        return json.dumps(plain_frame(frame), separators=(",", ":"), ensure_ascii=False)
+
+    def decode(self, payload):
+        return json.loads(payload)
+
+
+class OrjsonCodec:
+    """Same JSON on the wire, produced by orjson's native encoder"""
+    name = "orjson"
+    binary = False
+
+    def encode(self, frame):
+        # Sent as a text frame so browsers can keep using JSON.parse
+        return orjson.dumps(plain_frame(frame)).decode("utf-8")
+
+    def decode(self, payload):
+        return orjson.loads(payload)
+
+
+class MsgpackCodec:
+    """MessagePack binary frames (same structure as the JSON frames)"""
+    name = "msgpack"
+    binary = True
+
+    def encode(self, frame):
+        return msgpack.packb(plain_frame(frame), use_bin_type=True)
+
+    def decode(self, payload):
+        return msgpack.unpackb(payload, raw=False)
+
+
+# ==================== COLUMNAR BATCH FORMAT ====================
+# Layout (all integers little-endian):
+#   4s  magic "FDCB"
+#   B   format version
+#   3x  padding
+#   I   header length in bytes
+#   ... UTF-8 JSON header, zero-padded to an 8-byte boundary
+#   ... one contiguous typed array per transaction field, each 8-byte aligned
+#
+# The header carries every non-transaction frame field plus a "columns" list
+# describing each array: name, dtype, byte offset (from the start of the data
+# section) and encoding. Encodings:
+#   "plain"  - values stored directly (float64/float32/int64/uint8 for bools)
+#   "dict"   - repeated strings, stored as uint8/uint16 codes into the
+#              column's "dictionary"
+#   "prefix" - strings like "TX-REAL-123", stored as int64 suffixes after a
+#              shared "prefix"
+COLUMNAR_MAGIC = b"FDCB"
+COLUMNAR_VERSION = 1
+_PREAMBLE = struct.Struct("<4sB3xI")
+_NUMERIC_SUFFIX = re.compile(r"^(.*?)(\d+)$")
+
+
+def _pad8(n):
+    return (8 - n % 8) % 8
+
+
+def _encode_column(name, values):
+    """Pick the most compact array encoding for one field"""
+    first = values[0]
+
+    if isinstance(first, bool):
+        return {"name": name, "encoding": "plain", "dtype": "|u1"}, np.array(values, dtype=np.uint8)
+
+    if isinstance(first, int):
+        return {"name": name, "encoding": "plain", "dtype": "<i8"}, np.array(values, dtype="<i8")
+
+    if isinstance(first, float):
+        array = np.array(values, dtype="<f8")
+        # Probabilities from the model are float32 at source - keep them that size when lossless
+        narrow = array.astype("<f4")
+        if np.array_equal(narrow, array):
+            return {"name": name, "encoding": "plain", "dtype": "<f4"}, narrow
+        return {"name": name, "encoding": "plain", "dtype": "<f8"}, array
+
+    if isinstance(first, str):
+        # Repeated labels ("legitimate", "XGBoost v5", batch timestamps) -> uint8 codes
+        dictionary = list(dict.fromkeys(values))
+        if len(dictionary) <= 0xFF:
+            lookup = {value: code for code, value in enumerate(dictionary)}
+            codes = np.array([lookup[v] for v in values], dtype="|u1")
+            return {"name": name, "encoding": "dict", "dtype": "|u1", "dictionary": dictionary}, codes
+
+        # Mostly-unique ids ("TX-REAL-123") -> shared prefix + int64 suffix
+        match = _NUMERIC_SUFFIX.match(first)
+        if match:
+            prefix = match.group(1)
+            offset = len(prefix)
+            suffixes = [v[offset:] for v in values]
+            # Leading zeros (e.g. "12:00:01.045") would not survive the round trip
+            if all(v.startswith(prefix) and s.isdigit() and (s[0] != "0" or s == "0")
+                   for v, s in zip(values, suffixes)):
+                suffixes = np.array([int(s) for s in suffixes], dtype="<i8")
+                return {"name": name, "encoding": "prefix", "dtype": "<i8", "prefix": prefix}, suffixes
+
+        if len(dictionary) <= 0xFFFF:
+            lookup = {value: code for code, value in enumerate(dictionary)}
+            codes = np.array([lookup[v] for v in values], dtype="<u2")
+            return {"name": name, "encoding": "dict", "dtype": "<u2", "dictionary": dictionary}, codes
+
+    raise TypeError(f"Column '{name}' cannot be encoded in the columnar format")
+
+
+def _float_column(name, array):
+    """Same float rule as _encode_column, straight from an array"""
+    array = np.asarray(array, dtype="<f8")
+    narrow = array.astype("<f4")
+    if np.array_equal(narrow, array):
+        return {"name": name, "encoding": "plain", "dtype": "<f4"}, narrow
+    return {"name": name, "encoding": "plain", "dtype": "<f8"}, array
+
+
+def _event_batch_columns(batch):
+    """Columns for an EventBatch without building its event dicts (decodes to the same rows)"""
+    rows = len(batch)
+    return [
+        ({"name": "id", "encoding": "prefix", "dtype": "<i8", "prefix": batch.id_prefix},
+         batch.ids.astype("<i8")),
+        _float_column("amount", batch.amounts),
+        _float_column("fraud_prob", batch.probs),
+        ({"name": "is_flagged", "encoding": "plain", "dtype": "|u1"}, batch.flags.astype(np.uint8)),
+        ({"name": "type", "encoding": "dict", "dtype": "|u1", "dictionary": EVENT_TYPES.tolist()},
+         batch.type_codes.astype(np.uint8)),
+        ({"name": "timestamp", "encoding": "dict", "dtype": "|u1", "dictionary": [batch.timestamp]},
+         np.zeros(rows, dtype=np.uint8)),
+        ({"name": "interesting", "encoding": "plain", "dtype": "|u1"}, (batch.type_codes != 0).astype(np.uint8)),
+        ({"name": "model", "encoding": "dict", "dtype": "|u1", "dictionary": [batch.model]},
+         np.zeros(rows, dtype=np.uint8)),
+        ({"name": "batch", "encoding": "plain", "dtype": "<i8"}, np.full(rows, batch.batch, dtype="<i8")),
+    ]
+
+
+class ColumnarCodec:
+    """Binary batch frames with one typed array per transaction field"""
+    name = "columnar"
+    binary = True
+
+    def encode(self, frame):
+        transactions = frame.get("transactions") or []
+        header = {key: value for key, value in frame.items() if key != "transactions"}
+        header["rows"] = len(transactions)
+        header["columns"] = []
+
+        arrays = []
+        offset = 0
+        if isinstance(transactions, EventBatch):
+            columns = _event_batch_columns(transactions) if len(transactions) else []
+        else:
+            columns = (_encode_column(name, [tx[name] for tx in transactions])
+                       for name in (transactions[0] if transactions else ()))
+        for column, array in columns:
+            column["offset"] = offset
+            header["columns"].append(column)
+            arrays.append(array)
+            offset += array.nbytes + _pad8(array.nbytes)
+
+        header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        parts = [
+            _PREAMBLE.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(header_bytes)),
+            header_bytes,
+            b"\0" * _pad8(_PREAMBLE.size + len(header_bytes)),
+        ]
+        for array in arrays:
+            parts.append(array.tobytes())
+            parts.append(b"\0" * _pad8(array.nbytes))
+        return b"".join(parts)
+
+    def decode_columns(self, payload):
+        """Decode to (header, {field: numpy array}) without building per-row dicts"""
+        magic, version, header_len = _PREAMBLE.unpack_from(payload, 0)
+        if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+            raise ValueError("Not a columnar batch frame")
+
+        header_end = _PREAMBLE.size + header_len
+        header = json.loads(bytes(payload[_PREAMBLE.size:header_end]).decode("utf-8"))
+        data_start = header_end + _pad8(header_end)
+
+        columns = {}
+        for column in header["columns"]:
+            columns[column["name"]] = np.frombuffer(
+                payload, dtype=column["dtype"], count=header["rows"],
+                offset=data_start + column["offset"]
+            )
+        return header, columns
+
+    def decode(self, payload):
+        """Decode back to the same frame structure the JSON codecs produce"""
+        header, columns = self.decode_columns(payload)
+        values = {}
+        for column in header.pop("columns"):
+            array = columns[column["name"]]
+            if column["encoding"] == "dict":
+                dictionary = column["dictionary"]
+                values[column["name"]] = [dictionary[code] for code in array.tolist()]
+            elif column["encoding"] == "prefix":
+                values[column["name"]] = [f"{column['prefix']}{n}" for n in array.tolist()]
+            elif column["dtype"] == "|u1":
+                values[column["name"]] = [bool(v) for v in array.tolist()]
+            else:
+                values[column["name"]] = array.tolist()
+
+        rows = header.pop("rows")
+        names = list(values)
+        frame = dict(header)
+        frame["transactions"] = [
+            dict(zip(names, row)) for row in zip(*(values[n] for n in names))
+        ] if rows else []
+        return frame
+
+
+# ==================== NEGOTIATION ====================
+DEFAULT_CODEC = "json"
+
+CODECS = {"json": JsonCodec(), "columnar": ColumnarCodec()}
+if orjson is not None:
+    CODECS["orjson"] = OrjsonCodec()
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+
+def available_codecs():
+    """Names of the codecs usable in this environment"""
+    return list(CODECS)
+
+
+def negotiate_codec(requested):
+    """Return the codec a client asked for, or the default if it's unknown/unavailable"""
+    return CODECS.get((requested or DEFAULT_CODEC).lower(), CODECS[DEFAULT_CODEC])
+
+
+class EncodedFrame:
+    """A published frame with its views and encodings memoized
+
+    Each subscription view (see event_stream.py) is built once per frame and
+    each (view, codec) pair is encoded once, however many clients share it.
+    """
+    __slots__ = ("frame", "_views", "_payloads", "_on_encode", "_on_view")
+
+    def __init__(self, frame, on_encode=None, on_view=None):
+        self.frame = frame
+        self._views = {}
+        self._payloads = {}
+        self._on_encode = on_encode  # Called with (codec name, ns) for each real encode
+        self._on_view = on_view      # Called with (stream, ns) for each view built
+
+    def view(self, subscription=ALL_EVENTS):
+        view = self._views.get(subscription.key)
+        if view is None:
+            started = time.perf_counter_ns()
+            view = frame_view(self.frame, subscription)
+            if self._on_view is not None and subscription.stream != "all":
+                self._on_view(subscription.stream, time.perf_counter_ns() - started)
+            self._views[subscription.key] = view
+        return view
+
+    def encode(self, codec, subscription=ALL_EVENTS):
+        key = (subscription.key, codec.name)
+        payload = self._payloads.get(key)
+        if payload is None:
+            view = self.view(subscription)
+            started = time.perf_counter_ns()
+            payload = codec.encode(view)
+            if self._on_encode is not None:
+                self._on_encode(codec.name, time.perf_counter_ns() - started)
+            self._payloads[key] = payload
+        return payload
@@ -0,0 +1,255 @@
+# hyperparam_search.py - parallel RandomForest/XGBoost search with early stopping and Pareto registration
+import os
+import sys
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score
+
+from feature_cache import load_feature_matrix
+from feature_engineering import CATEGORICAL_COLUMNS
+
+SEARCH_LOG_DIR = "search_runs"
+TEST_FRACTION = 0.2        # Last 20% by time: held out, reported when registering (as in train_model.py)
+VALIDATION_FRACTION = 0.2  # Last 20% of the rest: early stopping and model selection
+EARLY_STOPPING_ROUNDS = 50
+
+# train_model.py's fixed settings are the first candidate of each family
+RF_GRID = [
+    {"n_estimators": 100, "max_depth": 10, "min_samples_leaf": 1},
+    {"n_estimators": 200, "max_depth": 10, "min_samples_leaf": 1},
+    {"n_estimators": 100, "max_depth": 14, "min_samples_leaf": 5},
+    {"n_estimators": 50, "max_depth": 8, "min_samples_leaf": 20},
+]
+XGB_GRID = [
+    {"max_depth": 6, "learning_rate": 0.1, "n_estimators": 200},
+    {"max_depth": 4, "learning_rate": 0.1, "n_estimators": 1000},
+    {"max_depth": 6, "learning_rate": 0.05, "n_estimators": 1000},
+    {"max_depth": 8, "learning_rate": 0.05, "n_estimators": 1000, "min_child_weight": 5},
+    {"max_depth": 6, "learning_rate": 0.05, "n_estimators": 1000, "subsample": 0.8, "colsample_bytree": 0.8},
+    {"max_depth": 3, "learning_rate": 0.2, "n_estimators": 1000},
+]
+QUICK_GRIDS = {"rf": RF_GRID[:1] + RF_GRID[3:], "xg": XGB_GRID[:2]}
+
+
+def make_candidates(families=("rf", "xg"), quick=False):
+    grids = QUICK_GRIDS if quick else {"rf": RF_GRID, "xg": XGB_GRID}
+    return [{"id": f"{family}-{i}", "family": family, "params": params}
+            for family in families for i, params in enumerate(grids[family])]
+
+
+def time_splits(n_rows, test_fraction=TEST_FRACTION, validation_fraction=VALIDATION_FRACTION):
+    """Row ranges (train, validation, test) in time order - X is sorted by TransactionDT"""
+    test_start = int((1 - test_fraction) * n_rows)
+    validation_start = int((1 - validation_fraction) * test_start)
+    return slice(0, validation_start), slice(validation_start, test_start), slice(test_start, n_rows)
+
+
+def inference_cost(model):
+    """Tree steps per row in the compiled engine (n_trees x max_depth), the serving-cost axis"""
+    from tree_engine import export_tree_ensemble
+    meta = json.loads(str(export_tree_ensemble(model)["meta"]))
+    return meta["n_trees"] * meta["max_depth"], meta["n_trees"]
+
+
+def pareto_front(results):
+    """Results not dominated on (validation AUC up, inference cost down)"""
+    front = []
+    for r in results:
+        dominated = any(
+            o["val_auc"] >= r["val_auc"] and o["cost"] <= r["cost"]
+            and (o["val_auc"] > r["val_auc"] or o["cost"] < r["cost"])
+            for o in results
+        )
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: r["cost"])
+
+
+# ==================== WORKERS ====================
+_data = {}
+
+
+def _init_worker(matrix_args):
+    # Feature cache hit: every worker maps the same cached columns
+    X, y = load_feature_matrix(**matrix_args)
+    train, validation, test = time_splits(len(X))
+    _data.update(X=X, y=y, train=train, validation=validation, test=test)
+
+
+def _fit_candidate(candidate, n_jobs):
+    """Fit one configuration; returns metrics, wall-clock timings and the fitted model"""
+    started = time.time()
+    X, y = _data["X"], _data["y"]
+    train, validation = _data["train"], _data["validation"]
+    params = candidate["params"]
+
+    fit_start = time.perf_counter()
+    if candidate["family"] == "rf":
+        from sklearn.ensemble import RandomForestClassifier
+        model = RandomForestClassifier(class_weight='balanced', random_state=42, n_jobs=n_jobs, **params)
+        model.fit(X.iloc[train], y.iloc[train])
+        best_iteration = None
+    else:
+        from xgboost import XGBClassifier
+        model = XGBClassifier(random_state=42, n_jobs=n_jobs, eval_metric="auc",
+                              early_stopping_rounds=EARLY_STOPPING_ROUNDS, **params)
+        model.fit(X.iloc[train], y.iloc[train], eval_set=[(X.iloc[validation], y.iloc[validation])], verbose=False)
+        best_iteration = int(model.best_iteration)
+    fit_seconds = time.perf_counter() - fit_start
+
+    # predict_proba stops at best_iteration, so validation AUC matches what would be served
+    predict_start = time.perf_counter()
+    val_probs = model.predict_proba(X.iloc[validation])[:, 1]
+    predict_us = (time.perf_counter() - predict_start) / max(1, len(val_probs)) * 1e6
+    cost, n_trees = inference_cost(model)
+    return {
+        "id": candidate["id"],
+        "family": candidate["family"],
+        "params": params,
+        "val_auc": float(roc_auc_score(y.iloc[validation], val_probs)),
+        "best_iteration": best_iteration,
+        "n_trees": n_trees,
+        "cost": cost,
+        "fit_seconds": round(fit_seconds, 3),
+        "predict_us_per_row": round(predict_us, 3),
+        "started": started,
+        "finished": time.time(),
+        "n_jobs": n_jobs,
+        "pid": os.getpid(),
+    }, model
+
+
+# ==================== DRIVER ====================
+def run_search(cores=None, families=("rf", "xg"), quick=False, sample_rows=None, quantile_method="sketch",
+               register=True, log_dir=SEARCH_LOG_DIR):
+    """Fit every candidate in a process pool within a core budget, register the Pareto front
+
+    workers x threads-per-fit never exceeds `cores` (default: all of them).
+    Every candidate's wall clock, fit time and validation AUC goes to
+    search_runs/<timestamp>.jsonl as soon as it finishes.
+    """
+    cores = cores or os.cpu_count() or 1
+    candidates = make_candidates(families, quick)
+    workers = max(1, min(cores, len(candidates)))
+    n_jobs = max(1, cores // workers)
+    matrix_args = {"sample_rows": sample_rows, "quantile_method": quantile_method}
+
+    # Build (or hit) the feature cache once here, so workers only map it
+    X, y, transaction_dt = load_feature_matrix(**matrix_args, with_time=True)
+    train, validation, test = time_splits(len(X))
+    print(f"🔍 {len(candidates)} candidates on {len(X):,} rows "
+          f"(train {train.stop - train.start:,} / validation {validation.stop - validation.start:,} / "
+          f"test {test.stop - test.start:,}, time-ordered) | {cores} cores = {workers} workers x {n_jobs} threads")
+
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"search_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+    search_start = time.time()
+    results, models = [], {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matrix_args,)) as pool, \
+            open(log_path, "w") as log:
+        futures = {pool.submit(_fit_candidate, c, n_jobs): c for c in candidates}
+        for future in as_completed(futures):
+            candidate = futures[future]
+            try:
+                result, model = future.result()
+            except Exception as e:
+                print(f"   ❌ {candidate['id']} {candidate['params']}: {e}")
+                log.write(json.dumps({"id": candidate["id"], "params": candidate["params"], "error": str(e)}) + "\n")
+                continue
+            result["wall_start"] = round(result["started"] - search_start, 3)
+            result["wall_seconds"] = round(result["finished"] - result["started"], 3)
+            results.append(result)
+            models[result["id"]] = model
+            log.write(json.dumps(result) + "\n")
+            log.flush()
+            trees = f"{result['n_trees']} trees" + (
+                f" (best iteration {result['best_iteration']})" if result["best_iteration"] is not None else "")
+            print(f"   ⏱️  {result['id']:<5} {result['wall_seconds']:7.1f}s wall "
+                  f"(t+{result['wall_start']:.1f}s, fit {result['fit_seconds']:.1f}s) "
+                  f"val AUC {result['val_auc']:.4f}  cost {result['cost']:,}  {trees}  {result['params']}")
+
+    wall = time.time() - search_start
+    busy = sum(r["wall_seconds"] for r in results)
+    print(f"⚡ Search wall clock {wall:.1f}s for {busy:.1f}s of candidate time ({busy / wall:.1f}x)")
+    if not results:
+        return {"results": [], "pareto": [], "registered": [], "log": log_path}
+
+    front = pareto_front(results)
+    print(f"🏆 Pareto front (validation AUC vs tree steps per row): {[r['id'] for r in front]}")
+    registered = []
+    if register:
+        for result in front:
+            registered.append(_register(result, models[result["id"]], X, y, transaction_dt, test, matrix_args))
+    else:
+        print("   (not registering: dry run)")
+    with open(log_path, "a") as log:
+        log.write(json.dumps({"summary": True, "wall_seconds": round(wall, 3), "cores": cores,
+                              "workers": workers, "n_jobs": n_jobs,
+                              "pareto": [r["id"] for r in front], "registered": registered}) + "\n")
+    print(f"📝 Log: {log_path}")
+    return {"results": results, "pareto": front, "registered": registered, "log": log_path}
+
+
+def _register(result, model, X, y, transaction_dt, test, matrix_args):
+    """Save one Pareto-best model like train_model.py does, scored on the held-out test split"""
+    from model_utils import save_model_version
+
+    X_test, y_test = X.iloc[test], y.iloc[test]
+    probs = model.predict_proba(X_test)[:, 1]
+    preds = (probs > 0.5).astype(int)
+    test_auc = roc_auc_score(y_test, probs)
+    performance = {
+        'roc_auc': test_auc,
+        'classification_report': classification_report(y_test, preds, output_dict=True, zero_division=0),
+        'confusion_matrix': confusion_matrix(y_test, preds).tolist(),
+        'validation_auc': result["val_auc"],
+        'hyperparameters': result["params"],
+        'best_iteration': result["best_iteration"],
+        'inference_cost': result["cost"],
+        'fit_seconds': result["fit_seconds"]
+    }
+    features = {
+        'feature_names': list(X.columns),
+        'categorical_columns': CATEGORICAL_COLUMNS,
+        'quantile_method': matrix_args["quantile_method"],
+        'training_rows': len(X)
+    }
+    # Time-ordered with TransactionDT, so the version can be replayed at its original pacing
+    demo_data = X_test.sample(min(10000, len(X_test)), random_state=42).sort_index().copy()
+    demo_data['isFraud'] = y_test[demo_data.index]
+    demo_data['TransactionDT'] = transaction_dt[demo_data.index]
+    feature_importance = pd.DataFrame({
+        'feature': list(X.columns),
+        'importance': model.feature_importances_
+    }).sort_values('importance', ascending=False)
+
+    name = "RandomForest" if result["family"] == "rf" else "XGBoost"
+    params = " ".join(f"{k}={v}" for k, v in result["params"].items())
+    note = f"{name} (search {result['id']}: {params}) - AUC: {test_auc:.4f}, validation {result['val_auc']:.4f}"
+    return save_model_version(model=model, features=features, performance=performance, demo_data=demo_data,
+                              feature_importance=feature_importance, version_note=note,
+                              model_type=result["family"])
+
+
+def _flag(name, default=None):
+    """Value of --name VALUE (or True for a bare --name) from argv"""
+    if name not in sys.argv:
+        return default
+    i = sys.argv.index(name)
+    if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("--"):
+        return sys.argv[i + 1]
+    return True
+
+
+if __name__ == "__main__":
+    # python hyperparam_search.py [--cores N] [--families rf,xg] [--sample-rows N] [--quick] [--dry-run]
+    cores = _flag("--cores")
+    sample_rows = _flag("--sample-rows")
+    run_search(cores=int(cores) if cores else None,
+               families=tuple(_flag("--families", "rf,xg").split(",")),
+               quick=bool(_flag("--quick", False)),
+               sample_rows=int(sample_rows) if sample_rows else None,
+               register=not _flag("--dry-run", False))
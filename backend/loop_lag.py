@@ -0,0 +1,53 @@
+# loop_lag.py - event loop responsiveness monitor
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+
+
+class EventLoopLagMonitor:
+    """Measures how late the event loop wakes a periodic sleeper (0 = fully responsive)"""
+
+    def __init__(self, interval=0.05, window=200):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self.task = None
+
+    async def run(self):
+        """Sleep for `interval` forever and record how much later than that we woke up"""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def snapshot(self):
+        """Lag summary in milliseconds over the recent window"""
+        if not self.samples:
+            return {"mean_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "samples": 0}
+        lags = np.fromiter(self.samples, dtype=float) * 1000
+        return {
+            "mean_ms": round(float(lags.mean()), 3),
+            "p99_ms": round(float(np.percentile(lags, 99)), 3),
+            "max_ms": round(self.max_lag * 1000, 3),
+            "samples": len(lags)
+        }
+
+    def start(self):
+        """Start the monitoring task"""
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def stop(self):
+        """Cancel the monitoring task"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
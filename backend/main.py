@@ -1,14 +1,29 @@
 # main.py - FIXED VERSION (with correct WebSocket endpoints)
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from collections import deque
 import asyncio
+import os
 import random
 import json
 import time
+from functools import partial
 from datetime import datetime
-from real_model import RealFraudEngine
+from typing import Any, Dict, List, Union
+from real_model import RealFraudEngine, DEFAULT_MODEL_VERSION
+from broadcaster import BatchBroadcaster
+from client_queue import OVERFLOW_POLICIES, ClientOverflow, negotiate_overflow
+from frame_codecs import available_codecs, negotiate_codec
+from event_stream import STREAM_MODES, negotiate_subscription
+from loop_lag import EventLoopLagMonitor
+from dynamic_batcher import DynamicBatcher
+from model_registry import get_registry
+from threshold_analysis import MAX_CURVE_POINTS, ThresholdCurve, check_targets, version_curve
+from metrics_history import MetricsHistory
+from telemetry import get_telemetry
+from replay import REPLAY_DIR, ReplaySchedule, load_csv_source, load_version_source, parse_speed, replay_csv_path
 
 # ==================== FRAUD ENGINE (Simulation) ====================
 class FraudEngine:
@@ -25,6 +40,7 @@ class FraudEngine:
         }
         self.active_connections = []
         self.event_buffer = deque(maxlen=100)
+        self.metrics = MetricsHistory()
         self.is_running = False
         # For dynamic speed calculation
         self.last_calc_time = time.time()
@@ -123,6 +139,71 @@ class FraudEngine:
         
         return event
 
+# ==================== BATCH PRODUCERS ====================
+SIMULATION_BATCH_SIZE = 50
+
+def make_simulation_producer(engine):
+    """Build the frame producer for the simulation engine"""
+    async def produce_frame(max_rows=None):
+        started = time.perf_counter()
+        n_rows = min(SIMULATION_BATCH_SIZE, max_rows or SIMULATION_BATCH_SIZE)
+        batch = [await engine.generate_transaction() for _ in range(n_rows)]
+        types = [tx["type"] for tx in batch]
+        engine.metrics.record(len(batch), types.count("detected_fraud"), types.count("missed_fraud"),
+                              types.count("false_alarm"), busy_ms=(time.perf_counter() - started) * 1000)
+        return {
+            "type": "batch",
+            "transactions": batch,
+            "stats": dict(engine.stats),
+            "mode": "simulation",
+            "batch_size": len(batch),
+            "performance": "39.7% detection @ 8.8% false alarms"
+        }
+    return produce_frame
+
+def make_real_model_producer(engine):
+    """Build the frame producer for the real model engine"""
+    async def produce_frame(max_rows=None):
+        # Batch size is chosen by the engine's latency-SLO controller, capped by the target rate's pacing
+        batch_size = None
+        if max_rows is not None and max_rows < engine.batch_controller.batch_size:
+            batch_size = max_rows
+        batch = await engine.process_batch(batch_size)  # At stats["threshold"], even if it changes mid-batch
+        return {
+            "type": "batch",
+            "transactions": batch,
+            "stats": dict(engine.stats),
+            "mode": "real_model",
+            "batch_size": len(batch),
+            "model": batch.model,
+            "performance": "39.7% detection @ 8.8% false alarms"
+        }
+    return produce_frame
+
+def make_replay_producer(engine, schedule):
+    """Frame producer that scores a replay's rows as its schedule releases them"""
+    batches = 0
+    
+    async def produce_frame(max_rows=None):
+        nonlocal batches
+        # Rows due now, capped by the latency-SLO controller's batch size (the rest go next batch)
+        n_rows = min(max_rows or engine.batch_controller.batch_size, engine.batch_controller.batch_size)
+        features, labels, amounts = schedule.rows_at(n_rows)
+        batch = await engine.score_rows(features, labels, amounts, batches)
+        batches += 1
+        return {
+            "type": "batch",
+            "transactions": batch,
+            "stats": dict(engine.stats),
+            "mode": "real_model",
+            "batch_size": len(batch),
+            "model": batch.model,
+            "replay": {"source": schedule.source.name, "speed": schedule.snapshot()["speed"],
+                       "position": schedule.cursor},
+            "performance": "39.7% detection @ 8.8% false alarms"
+        }
+    return produce_frame
+
 # ==================== LIFESPAN MANAGER ====================
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -131,13 +212,107 @@ async def lifespan(app: FastAPI):
     
     # Initialize both engines
     app.state.simulation_engine = FraudEngine()
-    app.state.real_engine = RealFraudEngine()
+    # Inference executor is configurable: FRAUD_INFERENCE_EXECUTOR=thread|process|inline
+    app.state.real_engine = RealFraudEngine(
+        model_version=os.environ.get("FRAUD_MODEL_VERSION", DEFAULT_MODEL_VERSION),
+        executor=os.environ.get("FRAUD_INFERENCE_EXECUTOR", "thread"),
+        max_workers=int(os.environ.get("FRAUD_INFERENCE_WORKERS", "1")),
+        max_in_flight=int(os.environ.get("FRAUD_MAX_IN_FLIGHT", "2")),
+        latency_target_ms=float(os.environ.get("FRAUD_LATENCY_TARGET_MS", "25")),
+        # native (default) is ~2-3x faster on the batch sizes the controller and /api/score use;
+        # compiled (or auto: compiled if its parity check passed) trades that for a fast, light cold start
+        model_engine=os.environ.get("FRAUD_MODEL_ENGINE", "native"),
+        shadow_version=os.environ.get("FRAUD_SHADOW_VERSION") or None,
+        score_window=int(os.environ.get("FRAUD_SCORE_WINDOW", "2000000"))
+    )
+    app.state.loop_monitor = EventLoopLagMonitor()
+    app.state.loop_monitor.start()
+    
+    # Online scoring: concurrent /api/score requests share predict_proba calls
+    app.state.score_batcher = DynamicBatcher(
+        app.state.real_engine.predict,
+        max_batch_size=int(os.environ.get("FRAUD_SCORE_MAX_BATCH", "1024")),
+        max_wait_us=int(os.environ.get("FRAUD_SCORE_MAX_WAIT_US", "2000"))
+    )
+    app.state.score_batcher.start()
+    
+    # One producer per engine, shared by every connected client; each client gets a
+    # bounded queue (FRAUD_CLIENT_QUEUE frames) and an overflow policy (FRAUD_CLIENT_OVERFLOW)
+    # Optional target rates (tx/sec, unset = unlimited): FRAUD_SIMULATION_RATE, FRAUD_REAL_MODEL_RATE
+    client_queue = int(os.environ.get("FRAUD_CLIENT_QUEUE", "8"))
+    client_overflow = negotiate_overflow(os.environ.get("FRAUD_CLIENT_OVERFLOW"))
+    app.state.simulation_broadcaster = BatchBroadcaster(
+        "simulation", app.state.simulation_engine,
+        make_simulation_producer(app.state.simulation_engine),
+        queue_size=client_queue, overflow=client_overflow,
+        target_rate=float(os.environ.get("FRAUD_SIMULATION_RATE", "0")) or None
+    )
+    app.state.real_broadcaster = BatchBroadcaster(
+        "real_model", app.state.real_engine,
+        make_real_model_producer(app.state.real_engine),
+        queue_size=client_queue, overflow=client_overflow,
+        target_rate=float(os.environ.get("FRAUD_REAL_MODEL_RATE", "0")) or None
+    )
+    app.state.simulation_broadcaster.start()
+    app.state.real_broadcaster.start()
+    app.state.replay = None
+    register_gauges(app)
     
     print("✅ Simulation engine ready")
-    print(f"✅ Real model loaded (AUC: {app.state.real_engine.stats['model_auc']:.3f})")
+    print(f"✅ Real model loaded: {app.state.real_engine.model_label} "
+          f"(AUC: {app.state.real_engine.stats['model_auc']:.3f}, "
+          f"{app.state.real_engine.loaded.served_by} trees, "
+          f"{app.state.real_engine.executor_kind} inference, "
+          f"{app.state.real_engine.inference_threads} model threads)")
     print("✅ Backend ready! Visit http://localhost:8000")
     yield
     print("🛑 Shutting down...")
+    await app.state.simulation_broadcaster.stop()
+    await app.state.real_broadcaster.stop()
+    await app.state.loop_monitor.stop()
+    await app.state.score_batcher.stop()
+    app.state.real_engine.close()
+
+def register_gauges(app):
+    """Counters/gauges read from live state on every /metrics scrape"""
+    telemetry = get_telemetry()
+    real = app.state.real_engine
+    telemetry.describe("frames_sent_total", "Frames sent to WebSocket clients")
+    telemetry.describe("bytes_sent_total", "Encoded frame bytes sent to WebSocket clients")
+    for broadcaster in (app.state.simulation_broadcaster, app.state.real_broadcaster):
+        mode = broadcaster.name
+        telemetry.gauge("connected_clients", lambda b=broadcaster: len(b.subscribers),
+                        "WebSocket subscribers", mode=mode)
+        telemetry.gauge("queued_frames", lambda b=broadcaster: b.queued_frames(),
+                        "Frames waiting in subscriber queues", mode=mode)
+        telemetry.counter("frames_published_total", lambda b=broadcaster: b.frames_published,
+                          "Frames produced", mode=mode)
+        telemetry.counter("frames_dropped_total", lambda b=broadcaster: b.frames_dropped,
+                          "Frames without interesting events dropped for slow subscribers", mode=mode)
+        telemetry.counter("frames_degraded_total", lambda b=broadcaster: b.frames_degraded,
+                          "Queued frames cut to their interesting events for slow subscribers", mode=mode)
+        telemetry.counter("frames_coalesced_total", lambda b=broadcaster: b.frames_coalesced,
+                          "Queued frames merged into one for slow subscribers", mode=mode)
+        telemetry.counter("interesting_events_lost_total", lambda b=broadcaster: b.interesting_lost,
+                          "Flagged/missed events cut from oversized merged frames", mode=mode)
+        telemetry.counter("clients_overflowed_total", lambda b=broadcaster: b.clients_overflowed,
+                          "Subscribers disconnected for falling a full queue behind", mode=mode)
+        telemetry.gauge("client_lag_max_seconds",
+                        lambda b=broadcaster: max((c.oldest_age_ms() for c in b.subscribers), default=0.0) / 1000,
+                        "Age of the oldest frame queued for any subscriber", mode=mode)
+        telemetry.gauge("target_rate", lambda b=broadcaster: b.rate_limiter.rate or 0,
+                        "Target transactions/sec (0 = unlimited)", mode=mode)
+        telemetry.counter("transactions_processed_total", lambda e=broadcaster.engine: e.stats["total_processed"],
+                          "Transactions scored (since the last stats reset)", mode=mode)
+    telemetry.gauge("inference_in_flight", lambda: real.inference_in_flight, "Batches in the inference executor")
+    telemetry.gauge("inference_waiting", lambda: real.inference_waiting, "Batches waiting for an inference slot")
+    telemetry.gauge("batch_size", lambda: real.batch_controller.batch_size, "Adaptive real-model batch size")
+    telemetry.gauge("score_window_rows", lambda: len(real.score_window), "Rows in the threshold ring buffer")
+    telemetry.gauge("threshold", lambda: real.stats["threshold"], "Serving threshold")
+    telemetry.gauge("online_scoring_queued_rows", lambda: app.state.score_batcher.pending_rows,
+                    "Rows waiting in the /api/score batcher")
+    telemetry.gauge("event_loop_lag_p99_seconds", lambda: app.state.loop_monitor.snapshot()["p99_ms"] / 1000,
+                    "Event loop wake-up lag, p99 over the recent window")
 
 # ==================== FASTAPI APP ====================
 app = FastAPI(
@@ -159,130 +334,125 @@ app.add_middleware(
 
 # ==================== WEB SOCKETS ====================
 
+async def send_frames(websocket: WebSocket, client):
+    """Send one client's queued frames in its negotiated codec and stream mode"""
+    telemetry = get_telemetry()
+    codec, mode = client.codec, client.mode
+    send_timer = telemetry.histogram("send", mode=mode, codec=codec.name)
+    while True:
+        payload = await client.next_payload()  # Shared across clients with the same codec and stream
+        with send_timer.time():
+            if codec.binary:
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
+        client.record_sent(len(payload))
+        telemetry.inc("frames_sent_total", mode=mode, codec=codec.name)
+        telemetry.inc("bytes_sent_total", len(payload), mode=mode, codec=codec.name)
+
+async def wait_for_disconnect(websocket: WebSocket):
+    """Raise WebSocketDisconnect once the client closes the connection"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+
+async def forward_frames(websocket: WebSocket, broadcaster: BatchBroadcaster, client):
+    """Forward published frames to one client until it disconnects (or overflows its queue)"""
+    sender = asyncio.create_task(send_frames(websocket, client))
+    receiver = asyncio.create_task(wait_for_disconnect(websocket))
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()  # Re-raise the disconnect, overflow or send error
+    except ClientOverflow as e:
+        print(f"⚠️ {broadcaster.name} {e}, closing")
+        await websocket.close(code=1013, reason="Client too slow, reconnect")  # 1013 = try again later
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        broadcaster.unsubscribe(client)
+
 @app.websocket("/ws/simulation")
-async def websocket_simulation(websocket: WebSocket):
-    """WebSocket for simulation mode"""
+async def websocket_simulation(websocket: WebSocket, codec: str = None, stream: str = None,
+                               sample_rate: float = None, overflow: str = None):
+    """WebSocket for simulation mode (optional ?codec=json|orjson|msgpack|columnar,
+    ?stream=all|interesting|sampled&sample_rate=0.01 and ?overflow=drop_oldest_legit|coalesce|disconnect)"""
     await websocket.accept()
+    frame_codec = negotiate_codec(codec)
+    subscription = negotiate_subscription(stream, sample_rate)
+    peer = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    broadcaster = app.state.simulation_broadcaster
+    overflow_policy = negotiate_overflow(overflow, broadcaster.overflow)
     
     try:
-        # Send initial connection message
+        # Send initial connection message (always JSON, so any client can read it)
         await websocket.send_json({
             "type": "connected",
             "mode": "simulation",
             "message": "Connected to Simulation Mode",
+            "codec": frame_codec.name,
+            "codecs": available_codecs(),
+            **subscription.describe(),
+            "streams": list(STREAM_MODES),
+            "overflow": overflow_policy,
+            "overflows": list(OVERFLOW_POLICIES),
+            "queue_size": broadcaster.queue_size,
             "performance": "39.7% detection @ 8.8% false alarms (matching XGBoost)"
         })
         
-        batch = []
-        batch_size = 50
-        
-        # Keep connection alive while engine is running
-        while True:
-            try:
-                # Check if engine is running
-                if not app.state.simulation_engine.is_running:
-                    await asyncio.sleep(0.001)
-                    continue
-                
-                # Generate transaction
-                transaction = await app.state.simulation_engine.generate_transaction()
-                batch.append(transaction)
-                
-                # Send batch when full
-                if len(batch) >= batch_size:
-                    try:
-                        await websocket.send_json({
-                            "type": "batch",
-                            "transactions": batch,
-                            "stats": app.state.simulation_engine.stats,
-                            "mode": "simulation",
-                            "batch_size": len(batch),
-                            "performance": "39.7% detection @ 8.8% false alarms"
-                        })
-                        batch = []
-                    except Exception as e:
-                        print(f"Error sending batch: {e}")
-                        break
-                
-                # NO DELAY for simulation - let it run as fast as possible!
-                # The bottleneck will be WebSocket/network speed, not our code
-                await asyncio.sleep(0.00001)  # Tiny sleep to prevent CPU hogging
-                
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                print(f"Error in simulation loop: {e}")
-                break
+        # Batches are generated once by the shared producer; we only forward them
+        client = broadcaster.subscribe(frame_codec, subscription, overflow_policy, peer)
+        await forward_frames(websocket, broadcaster, client)
                 
     except WebSocketDisconnect:
         print("Simulation WebSocket client disconnected")
+    except asyncio.CancelledError:
+        pass
     except Exception as e:
         print(f"Simulation WebSocket error: {e}")
     finally:
         print("Simulation WebSocket connection closed")
 
 @app.websocket("/ws/real-model")
-async def websocket_real_model(websocket: WebSocket):
-    """WebSocket for real XGBoost model predictions"""
+async def websocket_real_model(websocket: WebSocket, codec: str = None, stream: str = None,
+                               sample_rate: float = None, overflow: str = None):
+    """WebSocket for real XGBoost model predictions (optional ?codec=json|orjson|msgpack|columnar,
+    ?stream=all|interesting|sampled&sample_rate=0.01 and ?overflow=drop_oldest_legit|coalesce|disconnect)"""
     await websocket.accept()
+    frame_codec = negotiate_codec(codec)
+    subscription = negotiate_subscription(stream, sample_rate)
+    peer = f"{websocket.client.host}:{websocket.client.port}" if websocket.client else None
+    broadcaster = app.state.real_broadcaster
+    overflow_policy = negotiate_overflow(overflow, broadcaster.overflow)
     
     try:
-        # Send initial connection message
+        # Send initial connection message (always JSON, so any client can read it)
         await websocket.send_json({
             "type": "connected",
             "mode": "real_model",
-            "message": "Connected to Real XGBoost Model",
+            "message": f"Connected to Real {app.state.real_engine.model_label} Model",
+            "model": app.state.real_engine.model_label,
             "model_auc": app.state.real_engine.stats["model_auc"],
             "features": len(app.state.real_engine.features['feature_names']),
+            "codec": frame_codec.name,
+            "codecs": available_codecs(),
+            **subscription.describe(),
+            "streams": list(STREAM_MODES),
+            "overflow": overflow_policy,
+            "overflows": list(OVERFLOW_POLICIES),
+            "queue_size": broadcaster.queue_size,
             "performance": "39.7% detection @ 8.8% false alarms"
         })
         
-        batch = []
-        batch_size = 100
-        
-        while True:
-            try:
-                # Check if engine is running
-                if not app.state.real_engine.is_running:
-                    await asyncio.sleep(0.001)
-                    continue
-                
-                # Process real batch
-                transactions = await app.state.real_engine.process_batch(
-                    batch_size=batch_size,
-                    threshold=app.state.real_engine.stats["threshold"]
-                )
-                
-                batch.extend(transactions)
-                
-                # Send batch when full
-                if len(batch) >= batch_size:
-                    try:
-                        await websocket.send_json({
-                            "type": "batch",
-                            "transactions": batch,
-                            "stats": app.state.real_engine.stats,
-                            "mode": "real_model",
-                            "batch_size": len(batch),
-                            "model": "XGBoost v5",
-                            "performance": "39.7% detection @ 8.8% false alarms"
-                        })
-                        batch = []
-                    except Exception as e:
-                        print(f"Error sending real model batch: {e}")
-                        break
-                
-                # Control speed - similar to simulation
-                await asyncio.sleep(0.00001)  
-                
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                print(f"Error in real model loop: {e}")
-                break
+        # Batches are scored once by the shared producer; we only forward them
+        client = broadcaster.subscribe(frame_codec, subscription, overflow_policy, peer)
+        await forward_frames(websocket, broadcaster, client)
                 
     except WebSocketDisconnect:
         print("Real model WebSocket client disconnected")
+    except asyncio.CancelledError:
+        pass
     except Exception as e:
         print(f"Real model WebSocket error: {e}")
     finally:
@@ -300,10 +470,22 @@ async def root():
             "simulation": "ws://localhost:8000/ws/simulation",
             "real_model": "ws://localhost:8000/ws/real-model"
         },
+        "codecs": available_codecs(),
         "rest_api": {
             "modes": "/api/modes",
             "start_mode": "/api/mode/{mode_id}/start",
-            "stats": "/api/stats/{mode_id}"
+            "mode_rate": "PUT /api/mode/{mode_id}/rate {\"rate\": 500}",
+            "score": "POST /api/score",
+            "models": "/api/models",
+            "activate_model": "POST /api/models/{version}/activate",
+            "shadow": "/api/shadow (POST /api/shadow/{version}, DELETE /api/shadow)",
+            "thresholds": "/api/models/{version}/thresholds, /api/thresholds/live (?alert_rate=&recall=)",
+            "set_threshold": "PUT /api/threshold {\"threshold\": 0.1}",
+            "stats": "/api/stats/{mode_id}",
+            "metrics_history": "/api/metrics/history?mode=real_model&resolution=1s|1m&points=300",
+            "clients": "/api/clients",
+            "replay": "POST /api/replay?source=<version|file.csv>&speed=1x|100x|max, GET|DELETE /api/replay",
+            "prometheus": "/metrics"
         }
     }
 
@@ -324,7 +506,7 @@ async def get_available_modes():
             {
                 "id": "real_model", 
                 "name": "Real XGBoost Model",
-                "description": "Actual XGBoost v5 predictions on real data",
+                "description": f"Actual {app.state.real_engine.model_label} predictions on real data",
                 "speed": "~6,000 tx/sec (demo) / 50,000+ tx/sec (batch)",
                 "performance": "39.7% detection @ 8.8% false alarms",
                 "auc": app.state.real_engine.stats["model_auc"],
@@ -338,10 +520,10 @@ async def get_available_modes():
 async def control_simulation_legacy(action: str):
     """Legacy endpoint for backward compatibility"""
     if action == "start":
-        app.state.simulation_engine.is_running = True
+        app.state.simulation_broadcaster.set_running(True)
         return {"status": "started", "message": "Simulation running"}
     elif action == "stop":
-        app.state.simulation_engine.is_running = False
+        app.state.simulation_broadcaster.set_running(False)
         return {"status": "stopped", "message": "Simulation paused"}
     else:
         return {"error": "Invalid action. Use 'start' or 'stop'"}
@@ -350,11 +532,11 @@ async def control_simulation_legacy(action: str):
 async def start_mode(mode_id: str):
     """Start a specific mode"""
     if mode_id == "simulation":
-        app.state.simulation_engine.is_running = True
+        app.state.simulation_broadcaster.set_running(True)
         return {"mode": "simulation", "status": "started"}
     elif mode_id == "real_model":
-        app.state.real_engine.is_running = True
-        return {"mode": "real_model", "status": "started", "model": "XGBoost v5"}
+        app.state.real_broadcaster.set_running(True)
+        return {"mode": "real_model", "status": "started", "model": app.state.real_engine.model_label}
     else:
         return {"error": "Invalid mode"}
 
@@ -362,14 +544,25 @@ async def start_mode(mode_id: str):
 async def stop_mode(mode_id: str):
     """Stop a specific mode"""
     if mode_id == "simulation":
-        app.state.simulation_engine.is_running = False
+        app.state.simulation_broadcaster.set_running(False)
         return {"mode": "simulation", "status": "stopped"}
     elif mode_id == "real_model":
-        app.state.real_engine.is_running = False
+        app.state.real_broadcaster.set_running(False)
         return {"mode": "real_model", "status": "stopped"}
     else:
         return {"error": "Invalid mode"}
 
+@app.put("/api/mode/{mode_id}/rate")
+async def set_mode_rate(mode_id: str, rate: Union[float, None] = Body(None, embed=True)):
+    """Target transactions/sec for a mode, paced a batch at a time (null or 0 = unlimited)"""
+    broadcasters = {"simulation": app.state.simulation_broadcaster, "real_model": app.state.real_broadcaster}
+    if mode_id not in broadcasters:
+        return {"error": "Invalid mode"}
+    if rate is not None and rate < 0:
+        return {"error": "rate must be >= 0 transactions/sec (0 or null = unlimited)"}
+    broadcasters[mode_id].set_rate(rate)
+    return {"mode": mode_id, **broadcasters[mode_id].rate_limiter.snapshot()}
+
 @app.get("/api/stats/{mode_id}")
 async def get_mode_stats(mode_id: str):
     """Get statistics for a specific mode"""
@@ -380,6 +573,250 @@ async def get_mode_stats(mode_id: str):
     else:
         return {"error": "Invalid mode"}
 
+@app.get("/api/metrics/history")
+async def get_metrics_history(mode: str = "real_model", resolution: str = "1s", points: int = 300):
+    """Last 1s/10s/60s windows plus per-bucket history (1s buckets for an hour, 1m for a day)"""
+    engines = {"simulation": app.state.simulation_engine, "real_model": app.state.real_engine}
+    if mode not in engines:
+        return {"error": "Invalid mode"}
+    metrics = engines[mode].metrics
+    try:
+        history = metrics.history(resolution, max(1, points))
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"mode": mode, "windows": metrics.sliding_windows(), "history": history}
+
+@app.post("/api/score")
+async def score_transactions(payload: Union[Dict[str, Any], List[Dict[str, Any]]] = Body(...)):
+    """Score one transaction (object) or several (list) with the real model"""
+    engine = app.state.real_engine
+    transactions = payload if isinstance(payload, list) else [payload]
+    if not transactions:
+        return {"results": [], "count": 0}
+    
+    try:
+        rows = engine.feature_rows(transactions)
+    except (TypeError, ValueError) as e:
+        return {"error": f"Invalid feature values: {e}"}
+    
+    # Joins whatever other requests are in flight; resolves when their shared batch is scored
+    probs = await app.state.score_batcher.submit(rows)
+    
+    threshold = engine.stats["threshold"]
+    model = engine.model_label
+    results = [
+        {
+            "id": tx.get("id", tx.get("TransactionID")),
+            "fraud_prob": prob,
+            "is_flagged": prob > threshold
+        }
+        for tx, prob in zip(transactions, probs.tolist())
+    ]
+    
+    if isinstance(payload, list):
+        return {"results": results, "count": len(results), "threshold": threshold, "model": model}
+    return {**results[0], "threshold": threshold, "model": model}
+
+async def lookup_version(version, servable=True):
+    """Registry entry for a saved version, looked up off the event loop (a rescan can wait on
+    the cross-process registry lock); returns (entry, None) or (None, error message)"""
+    try:
+        entry = await asyncio.get_running_loop().run_in_executor(None, get_registry().get, version)
+    except TimeoutError as e:
+        return None, f"Model registry busy: {e}"
+    if entry is None:
+        return None, f"Unknown model version {version}"
+    if servable and not entry["model_files"]:
+        return None, f"Model version {version} has no saved model file"
+    return entry, None
+
+@app.get("/api/models")
+async def list_models(model_type: str = None, min_auc: float = None, features_count: int = None,
+                      since: str = None, sort: str = "number", limit: int = None):
+    """Saved model versions from the registry index (no directory rescan)"""
+    if sort not in ("number", "auc", "timestamp"):
+        return {"error": "Invalid sort. Use 'number', 'auc' or 'timestamp'"}
+    
+    def query():
+        registry = get_registry()
+        models = registry.versions(model_type=model_type, min_auc=min_auc, features_count=features_count,
+                                   since=since, sort_by=sort, limit=limit)
+        return models, registry.best(model_type), registry.snapshot()
+    
+    try:
+        models, best, snapshot = await asyncio.get_running_loop().run_in_executor(None, query)
+    except TimeoutError as e:
+        return {"error": f"Model registry busy: {e}"}
+    return {
+        "models": models,
+        "count": len(models),
+        "best": best["version"] if best else None,
+        "active": app.state.real_engine.model_version,
+        "registry": snapshot
+    }
+
+@app.post("/api/models/{version}/activate")
+async def activate_model(version: str, warmup_passes: int = 3):
+    """Hot-swap the real model: load + warm up in the background, switch between batches"""
+    engine = app.state.real_engine
+    _, error = await lookup_version(version)
+    if error:
+        return {"error": error}
+    if version == engine.model_version:
+        return {"status": "unchanged", "model": engine.model_label, "model_version": version}
+    if engine.swap_state["state"] != "idle":
+        return {"error": f"Already switching to {engine.swap_state['target']}"}
+    
+    try:
+        swap = await engine.swap_model(version, warmup_passes=max(1, warmup_passes))
+    except (ValueError, OSError) as e:
+        return {"error": f"Could not activate {version}: {e}"}
+    return {"status": "activated", **swap}
+
+@app.get("/api/models/{version}/thresholds")
+async def version_thresholds(version: str, alert_rate: float = None, recall: float = None, points: int = 50):
+    """Precision/recall/alert-rate curve of a saved version on its held-out demo set, plus recommendations
+    (points is capped at MAX_CURVE_POINTS; out-of-range targets are a 400)"""
+    try:
+        check_targets(alert_rate, recall, points)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    _, error = await lookup_version(version)
+    if error:
+        return {"error": error}
+    
+    engine = app.state.real_engine
+    loop = asyncio.get_running_loop()
+    try:
+        # First request per version scores its demo set; later ones are lookups
+        curve = await loop.run_in_executor(None, partial(version_curve, version, engine.model_engine))
+    except (ValueError, OSError) as e:
+        return {"error": f"Could not score {version}: {e}"}
+    report = await loop.run_in_executor(None, partial(
+        curve.report, alert_rate, recall, current=engine.stats["threshold"],
+        max_points=min(points, MAX_CURVE_POINTS)))
+    return {"model_version": version, "source": "demo_set", **report}
+
+@app.get("/api/thresholds/live")
+async def live_thresholds(alert_rate: float = None, recall: float = None, points: int = 50):
+    """The same curve over the real model's recent scored window"""
+    try:
+        check_targets(alert_rate, recall, points)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    engine = app.state.real_engine
+    # Copy the window on the loop (batches keep writing to it), sort it off the loop
+    probs, labels = engine.score_window.snapshot()
+    loop = asyncio.get_running_loop()
+    curve = await loop.run_in_executor(None, ThresholdCurve, probs, labels)
+    report = await loop.run_in_executor(None, partial(
+        curve.report, alert_rate, recall, current=engine.stats["threshold"],
+        max_points=min(points, MAX_CURVE_POINTS)))
+    return {"model_version": engine.model_version, "source": "live_window", **report}
+
+@app.put("/api/threshold")
+async def set_threshold(threshold: float = Body(..., embed=True)):
+    """Change the real model's threshold; counters are recomputed over the score window, nothing is re-scored"""
+    if not 0.0 <= threshold <= 1.0:
+        return {"error": "Threshold must be between 0 and 1"}
+    previous = app.state.real_engine.stats["threshold"]
+    return {"status": "updated", "previous": previous, **app.state.real_engine.set_threshold(threshold)}
+
+@app.get("/api/shadow")
+async def get_shadow_stats():
+    """Champion/challenger comparison on the live batches"""
+    shadow = app.state.real_engine.shadow
+    if shadow is None:
+        return {"enabled": False}
+    return shadow.snapshot()
+
+@app.post("/api/shadow/{version}")
+async def start_shadow(version: str):
+    """Shadow-score live batches with another model version (replaces any current shadow)"""
+    _, error = await lookup_version(version)
+    if error:
+        return {"error": error}
+    
+    try:
+        shadow = await app.state.real_engine.set_shadow(version)
+    except (ValueError, OSError) as e:
+        return {"error": f"Could not shadow {version}: {e}"}
+    return {"status": "shadowing", "primary": app.state.real_engine.model_label, "shadow": shadow.loaded.label}
+
+@app.delete("/api/shadow")
+async def stop_shadow():
+    """Stop shadow scoring"""
+    await app.state.real_engine.set_shadow(None)
+    return {"status": "stopped"}
+
+@app.post("/api/replay")
+async def start_replay(source: str = None, speed: str = "1x"):
+    """Replay a version's demo rows (default: the active version) or a CSV file name from
+    FRAUD_REPLAY_DIR through the real model, paced by TransactionDT at `speed`
+    (uniform pacing if the source has no TransactionDT)"""
+    engine = app.state.real_engine
+    source = source or engine.model_version
+    try:
+        speed_value = parse_speed(speed)
+        if source.endswith(".csv"):
+            loader = partial(load_csv_source, replay_csv_path(source, os.environ.get("FRAUD_REPLAY_DIR", REPLAY_DIR)))
+        else:
+            entry, error = await lookup_version(source, servable=False)
+            if error:
+                return {"error": error}
+            loader = partial(load_version_source, entry["version"])
+    except ValueError as e:
+        return {"error": str(e)}
+    loop = asyncio.get_running_loop()
+    try:
+        replay_source = await loop.run_in_executor(None, partial(loader, engine.features['feature_names']))
+    except (ValueError, OSError) as e:
+        return {"error": str(e)}
+    schedule = ReplaySchedule(replay_source, speed_value)
+    app.state.replay = schedule
+    app.state.real_broadcaster.use_producer(make_replay_producer(engine, schedule), schedule)
+    print(f"⏯️ Replaying {replay_source.name} at {speed} ({replay_source.timing})")
+    return {"status": "replaying", "running": engine.is_running, **schedule.snapshot()}
+
+@app.get("/api/replay")
+async def get_replay():
+    """Replay progress and schedule slip"""
+    if app.state.replay is None:
+        return {"status": "idle"}
+    return {"status": "replaying", **app.state.replay.snapshot()}
+
+@app.delete("/api/replay")
+async def stop_replay():
+    """Back to looping over the active version's demo rows"""
+    schedule, app.state.replay = app.state.replay, None
+    app.state.real_broadcaster.use_producer()
+    if schedule is None:
+        return {"status": "idle"}
+    return {"status": "stopped", **schedule.snapshot()}
+
+@app.get("/api/clients")
+async def get_clients():
+    """Every WebSocket client: codec, stream, overflow policy, queue depth, lag and drop counters"""
+    result = {}
+    for broadcaster in (app.state.simulation_broadcaster, app.state.real_broadcaster):
+        result[broadcaster.name] = {
+            "queue_size": broadcaster.queue_size,
+            "default_overflow": broadcaster.overflow,
+            "frames_published": broadcaster.frames_published,
+            "frames_dropped": broadcaster.frames_dropped,
+            "frames_degraded": broadcaster.frames_degraded,
+            "frames_coalesced": broadcaster.frames_coalesced,
+            "interesting_lost": broadcaster.interesting_lost,
+            "clients_overflowed": broadcaster.clients_overflowed,
+            "clients": broadcaster.clients()
+        }
+    return result
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Per-stage latency histograms, counters and gauges in Prometheus text format"""
+    return PlainTextResponse(get_telemetry().render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -388,6 +825,26 @@ async def health_check():
         "timestamp": datetime.now().isoformat(),
         "simulation_running": app.state.simulation_engine.is_running,
         "real_model_running": app.state.real_engine.is_running,
+        "simulation_clients": len(app.state.simulation_broadcaster.subscribers),
+        "real_model_clients": len(app.state.real_broadcaster.subscribers),
+        "pacing": {
+            "simulation": app.state.simulation_broadcaster.pacer.snapshot(),
+            "real_model": app.state.real_broadcaster.pacer.snapshot()
+        },
+        "inference": {
+            "executor": app.state.real_engine.executor_kind,
+            "in_flight": app.state.real_engine.inference_in_flight,
+            "waiting": app.state.real_engine.inference_waiting
+        },
+        "model": {
+            "active": app.state.real_engine.model_version,
+            "label": app.state.real_engine.model_label,
+            "served_by": app.state.real_engine.loaded.served_by,
+            "swap": app.state.real_engine.swap_state
+        },
+        "event_loop_lag": app.state.loop_monitor.snapshot(),
+        "online_scoring": app.state.score_batcher.snapshot(),
+        "stage_latency": get_telemetry().snapshot(),
         "performance": "39.7% detection @ 8.8% false alarms"
     }
 
@@ -410,6 +867,7 @@ async def reset_mode_stats(mode_id: str):
         app.state.simulation_engine.last_calc_time = time.time()
         app.state.simulation_engine.last_count = 0
         app.state.simulation_engine.event_buffer.clear()
+        app.state.simulation_engine.metrics.clear()
         
         return {"status": "reset", "mode": "simulation", "message": "Simulation stats reset to zero"}
         
@@ -423,9 +881,11 @@ async def reset_mode_stats(mode_id: str):
             "detection_rate": 0.0,
             "processing_speed": 0.0,
             "alert_rate": 0.0,
-            "threshold": 0.063,
+            "threshold": app.state.real_engine.stats["threshold"],  # Keep the chosen threshold
             "model_auc": app.state.real_engine.stats["model_auc"],  # Keep AUC
-            "batch_size": 1000
+            "model": app.state.real_engine.model_label,
+            "model_version": app.state.real_engine.model_version,
+            **app.state.real_engine.batch_controller.snapshot()
         }
         # Reset internal counters
         app.state.real_engine.total_processed = 0
@@ -433,6 +893,9 @@ async def reset_mode_stats(mode_id: str):
         app.state.real_engine.last_calc_time = time.time()
         app.state.real_engine.last_count = 0
         app.state.real_engine.event_buffer.clear()
+        app.state.real_engine.score_window.clear()
+        app.state.real_engine.counted_rows = 0
+        app.state.real_engine.metrics.clear()
         
         return {"status": "reset", "mode": "real_model", "message": "Real model stats reset to zero"}
     else:
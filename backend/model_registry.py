@@ -0,0 +1,314 @@
+# model_registry.py - cached index of model_versions/ with safe concurrent registration
+import os
+import re
+import json
+import time
+
+VERSIONS_DIR = "model_versions"
+REGISTRY_FILE = "model_registry.json"  # Kept outside VERSIONS_DIR so writing it doesn't bump the dir mtime
+LOCK_FILE = "model_registry.lock"
+REGISTRY_FORMAT = 2
+
+# Older versions spelled the model type out
+MODEL_TYPE_ALIASES = {"RandomForest": "rf", "XGBoost": "xg"}
+MODEL_TYPE_NAMES = {"rf": "RandomForest", "xg": "XGBoost"}
+MODEL_FILES = ("model.ubj", "model.joblib", "compiled_trees.npz")
+
+_VERSION_NUMBER = re.compile(r"^v(\d+)_")
+
+
+def _version_number(version_name):
+    match = _VERSION_NUMBER.match(version_name)
+    return int(match.group(1)) if match else 0
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _tree_mtime(root):
+    """Newest mtime of root and each version dir under it
+
+    Adding or removing a version bumps root; adding, replacing or removing a
+    model file (e.g. migrate_model_artifacts writing model.ubj) bumps its
+    version dir.
+    """
+    latest = _mtime(root)
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        latest = max(latest, entry.stat().st_mtime_ns)
+                except FileNotFoundError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return latest
+
+
+def model_label(version_name, model_type=None):
+    """Display name for a version, e.g. XGBoost v5 or RandomForest v4"""
+    if model_type is None:
+        entry = get_registry().get(version_name)
+        if entry is not None:
+            model_type = entry["model_type"]
+        else:
+            parts = version_name.split("_")
+            model_type = parts[1] if len(parts) > 2 else ""
+    model_type = MODEL_TYPE_ALIASES.get(model_type, model_type)
+    name = MODEL_TYPE_NAMES.get(model_type, model_type or "Model")
+    number = _version_number(version_name)
+    return f"{name} v{number}" if number else f"{name} {version_name}"
+
+
+class RegistryLock:
+    """Cross-process lock: an O_EXCL lockfile, broken if its holder died long ago"""
+
+    def __init__(self, path=LOCK_FILE, timeout=30.0, stale_after=120.0):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.stat(self.path).st_mtime > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Could not acquire {self.path} within {self.timeout}s")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ModelRegistry:
+    """Index of saved versions by type, AUC, feature count and timestamp
+
+    The manifest (model_registry.json) records the newest mtime of model_versions/
+    and its version dirs it was built from. Lookups stat those and the manifest: if
+    nothing changed they are served from memory, if only the manifest changed
+    (another process registered a version) it is reloaded, and only a directory
+    change nobody indexed triggers a rescan. Hand edits to an existing
+    version_info.json need refresh(force=True).
+    """
+
+    def __init__(self, root=VERSIONS_DIR, manifest_path=REGISTRY_FILE, lock_path=LOCK_FILE):
+        self.root = root
+        self.manifest_path = manifest_path
+        self.lock_path = lock_path
+        self.root_mtime = None
+        self.manifest_mtime = None
+        self.entries = {}  # version name -> entry
+        self.by_type = {}  # model type -> entries sorted by AUC, best first
+        self.scans = 0
+
+    # ==================== INDEX ====================
+    def refresh(self, force=False):
+        """Bring the index up to date; returns True if anything was reloaded"""
+        root_mtime = _tree_mtime(self.root)
+        manifest_mtime = _mtime(self.manifest_path)
+        if not force and (root_mtime, manifest_mtime) == (self.root_mtime, self.manifest_mtime):
+            return False
+
+        if not force:
+            # Another process may have registered a version and rewritten the manifest
+            manifest = self._read_manifest()
+            if manifest and manifest.get("root_mtime") == root_mtime:
+                self._set_entries(manifest["versions"], root_mtime)
+                self.manifest_mtime = manifest_mtime
+                return True
+
+        with RegistryLock(self.lock_path):
+            root_mtime = _tree_mtime(self.root)
+            self._set_entries(self._scan(), root_mtime)
+            self._write_manifest()
+        return True
+
+    def _scan(self):
+        """Read every version_info.json (only on a cache miss)"""
+        self.scans += 1
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for version in os.listdir(self.root):
+            version_dir = os.path.join(self.root, version)
+            info_path = os.path.join(version_dir, "version_info.json")
+            if not os.path.isfile(info_path):
+                continue
+            try:
+                with open(info_path) as f:
+                    info = json.load(f)
+            except json.JSONDecodeError:
+                continue  # Still being written; its add() will index it
+            entries.append(self._entry(version, info))
+        return entries
+
+    def _entry(self, version, info):
+        version_dir = os.path.join(self.root, version)
+        model_type = info.get("model_type", "")
+        return {
+            "version": version,
+            "number": _version_number(version),
+            "model_type": MODEL_TYPE_ALIASES.get(model_type, model_type),
+            "auc": float(info.get("performance", 0.0)),
+            "features_count": int(info.get("features_count", 0)),
+            "timestamp": info.get("timestamp", ""),
+            "note": info.get("note", ""),
+            "model_files": [name for name in MODEL_FILES
+                            if os.path.exists(os.path.join(version_dir, name))]
+        }
+
+    def _set_entries(self, entries, root_mtime):
+        self.entries = {e["version"]: e for e in entries}
+        self.by_type = {}
+        for entry in sorted(entries, key=lambda e: e["auc"], reverse=True):
+            self.by_type.setdefault(entry["model_type"], []).append(entry)
+        self.root_mtime = root_mtime
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if manifest.get("format") != REGISTRY_FORMAT or manifest.get("root") != self.root:
+            return None
+        return manifest
+
+    def _write_manifest(self):
+        """Atomic write: readers see the old manifest or the new one, never half of it"""
+        manifest = {
+            "format": REGISTRY_FORMAT,
+            "root": self.root,
+            "root_mtime": self.root_mtime,
+            "versions": sorted(self.entries.values(), key=lambda e: (e["number"], e["version"]))
+        }
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        self.manifest_mtime = _mtime(self.manifest_path)
+
+    # ==================== QUERIES ====================
+    def get(self, version):
+        """Index entry for one version (None if unknown)"""
+        self.refresh()
+        return self.entries.get(version)
+
+    def versions(self, model_type=None, min_auc=None, features_count=None,
+                 since=None, until=None, servable=False, sort_by="number", limit=None):
+        """Filtered entries; since/until compare against the YYYYmmdd_HHMMSS timestamp"""
+        self.refresh()
+        if model_type is not None:
+            model_type = MODEL_TYPE_ALIASES.get(model_type, model_type)
+            candidates = self.by_type.get(model_type, [])
+        else:
+            candidates = self.entries.values()
+
+        selected = [
+            e for e in candidates
+            if (min_auc is None or e["auc"] >= min_auc)
+            and (features_count is None or e["features_count"] == features_count)
+            and (since is None or e["timestamp"] >= since)
+            and (until is None or e["timestamp"] <= until)
+            and (not servable or e["model_files"])
+        ]
+        if sort_by == "auc":
+            selected.sort(key=lambda e: e["auc"], reverse=True)
+        elif sort_by == "timestamp":
+            selected.sort(key=lambda e: (e["timestamp"], e["number"]), reverse=True)
+        else:
+            selected.sort(key=lambda e: (e["number"], e["version"]))
+        return selected[:limit] if limit else selected
+
+    def best(self, model_type=None, servable=True):
+        """Highest-AUC version, optionally of one type (servable = has a model file)"""
+        self.refresh()
+        if model_type is not None:
+            model_type = MODEL_TYPE_ALIASES.get(model_type, model_type)
+            groups = [self.by_type.get(model_type, [])]
+        else:
+            groups = self.by_type.values()
+
+        best = None
+        for entries in groups:
+            for entry in entries:  # Already sorted best first
+                if servable and not entry["model_files"]:
+                    continue
+                if best is None or entry["auc"] > best["auc"]:
+                    best = entry
+                break
+        return best
+
+    def latest(self, model_type=None):
+        """Most recently registered version"""
+        matches = self.versions(model_type=model_type)
+        return matches[-1] if matches else None
+
+    # ==================== REGISTRATION ====================
+    def reserve_version(self, model_type="", version_name=None):
+        """Create a fresh version directory and return its name
+
+        Numbering and mkdir happen under the registry lock, so two training runs
+        finishing together get v6 and v7 rather than both writing into v6.
+        """
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        os.makedirs(self.root, exist_ok=True)
+        with RegistryLock(self.lock_path):
+            if version_name:
+                version_name = f"{version_name}_{model_type}_{timestamp}"
+            else:
+                # Count in-progress directories too - they have no version_info.json yet
+                numbers = [_version_number(d) for d in os.listdir(self.root)
+                           if os.path.isdir(os.path.join(self.root, d))]
+                version_name = f"v{max(numbers, default=0) + 1}_{model_type}_{timestamp}"
+            os.makedirs(os.path.join(self.root, version_name))  # Fails rather than overwrite
+        return version_name, timestamp
+
+    def add(self, version_info):
+        """Index a version whose files (including version_info.json) are written"""
+        with RegistryLock(self.lock_path):
+            # Rescan rather than patch our copy - another process may have registered too
+            root_mtime = _tree_mtime(self.root)
+            self._set_entries(self._scan(), root_mtime)
+            self._write_manifest()
+        return self.entries.get(version_info["version"])
+
+    def snapshot(self):
+        """Payload for GET /api/models"""
+        self.refresh()
+        return {
+            "count": len(self.entries),
+            "model_types": sorted(self.by_type),
+            "best": {model_type: (self.best(model_type) or {}).get("version")
+                     for model_type in sorted(self.by_type)}
+        }
+
+
+_registry = None
+
+
+def get_registry():
+    """Process-wide registry instance"""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
@@ -1,30 +1,25 @@
 import os
-import datetime
+import sys
 import joblib
 import json
+import numpy as np
+from model_registry import get_registry
+
+# Fast-loading artifacts written next to the CSV/joblib files
+DEMO_META_FILE = "demo_meta.json"
+DEMO_FEATURES_FILE = "demo_features.npy"
+DEMO_LABELS_FILE = "demo_labels.npy"
+NATIVE_MODEL_FILE = "model.ubj"
+MODEL_ENGINES = ("auto", "native", "compiled")
 
 def save_model_version(model, features, performance, demo_data, feature_importance, 
                       version_note="", version_name=None, model_type=""):
     """Save everything with automatic versioning and model type"""
     
-    # Create versions directory if it doesn't exist
-    os.makedirs('model_versions', exist_ok=True)
-    
-    # Generate version name with timestamp
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    if version_name:
-        # Use custom version name with model type
-        version_name = f"{version_name}_{model_type}_{timestamp}"
-    else:
-        # Auto-generate version name with model type
-        existing_versions = len([d for d in os.listdir('model_versions') 
-                               if os.path.isdir(os.path.join('model_versions', d))])
-        version_name = f"v{existing_versions + 1}_{model_type}_{timestamp}"
-    
-    # Create version directory
+    # Numbering and directory creation are serialized by the registry lock
+    registry = get_registry()
+    version_name, timestamp = registry.reserve_version(model_type, version_name)
     version_dir = f"model_versions/{version_name}"
-    os.makedirs(version_dir, exist_ok=True)
     
     # Save everything in the version directory
     joblib.dump(model, f'{version_dir}/model.joblib')
@@ -32,6 +27,8 @@ def save_model_version(model, features, performance, demo_data, feature_importan
     joblib.dump(performance, f'{version_dir}/performance.joblib')
     demo_data.to_csv(f'{version_dir}/demo_data.csv', index=False)
     feature_importance.to_csv(f'{version_dir}/feature_importance.csv', index=False)
+    save_demo_arrays(version_dir, demo_data, features['feature_names'])
+    save_native_model(version_dir, model, demo_data[features['feature_names']].to_numpy(dtype=np.float64))
     
     # Save version info
     version_info = {
@@ -46,6 +43,7 @@ def save_model_version(model, features, performance, demo_data, feature_importan
     
     with open(f'{version_dir}/version_info.json', 'w') as f:
         json.dump(version_info, f, indent=2)
+    registry.add(version_info)
     
     print(f"✅ Version {version_name} saved!")
     print(f"   📁 Location: {version_dir}/")
@@ -56,15 +54,89 @@ def save_model_version(model, features, performance, demo_data, feature_importan
     
     return version_name
     
-def load_model_version(version_name):
-    """Load a specific model version"""
+def save_demo_arrays(version_dir, demo_data, feature_names, label_column='isFraud'):
+    """Write demo data as contiguous typed arrays that load with mmap instead of CSV parsing"""
+    features = np.ascontiguousarray(demo_data[feature_names].to_numpy(dtype=np.float64))
+    np.save(f'{version_dir}/{DEMO_FEATURES_FILE}', features)
+    
+    if label_column in demo_data.columns:
+        labels = demo_data[label_column].to_numpy(dtype=np.int8)
+    else:
+        labels = np.zeros(len(demo_data), dtype=np.int8)
+    np.save(f'{version_dir}/{DEMO_LABELS_FILE}', labels)
+    
+    # Any other numeric columns (e.g. TransactionDT) get their own array
+    extra_columns = [
+        col for col in demo_data.columns
+        if col not in feature_names and col != label_column
+        and np.issubdtype(demo_data[col].dtype, np.number)
+    ]
+    for col in extra_columns:
+        np.save(f'{version_dir}/demo_{col}.npy', np.ascontiguousarray(demo_data[col].to_numpy()))
+    
+    meta = {
+        'format': 1,
+        'rows': int(len(demo_data)),
+        'feature_names': list(feature_names),
+        'label_column': label_column,
+        'extra_columns': extra_columns
+    }
+    with open(f'{version_dir}/{DEMO_META_FILE}', 'w') as f:
+        json.dump(meta, f, indent=2)
+
+def save_native_model(version_dir, model, demo_features=None):
+    """Write the booster in XGBoost's binary format plus the compiled tree arrays
+    
+    With demo_features the compiled arrays are checked against predict_proba
+    on them, which is what lets model_engine="auto" serve them.
+    """
+    from tree_engine import COMPILED_FILE, export_tree_ensemble, save_compiled, stamp_parity
+    
+    if hasattr(model, 'get_booster'):
+        model.save_model(f'{version_dir}/{NATIVE_MODEL_FILE}')
+    try:
+        arrays = export_tree_ensemble(model)
+        if demo_features is not None:
+            stamp_parity(arrays, model, demo_features)
+        save_compiled(arrays, f'{version_dir}/{COMPILED_FILE}')
+    except (TypeError, ValueError, MemoryError) as e:
+        print(f"⚠️  Skipping compiled trees: {e}")
+
+def load_model_version(version_name, model_engine="native"):
+    """Load a specific model version
+    
+    model_engine="native" prefers the XGBoost binary booster (model.ubj), then the
+    pickled model; "compiled" uses compiled_trees.npz (NumPy only, no xgboost/sklearn);
+    "auto" is compiled when the file's recorded parity check passed, else native.
+    """
     version_dir = f"model_versions/{version_name}"
     
     if not os.path.exists(version_dir):
         print(f"❌ Version {version_name} not found!")
         return None
-    
-    model = joblib.load(f'{version_dir}/model.joblib')
+    if model_engine not in MODEL_ENGINES:
+        raise ValueError(f"model_engine must be one of {MODEL_ENGINES}, got {model_engine!r}")
+    
+    from tree_engine import COMPILED_FILE, CompiledTreeEnsemble, parity_verified
+    native_path = f'{version_dir}/{NATIVE_MODEL_FILE}'
+    pickle_path = f'{version_dir}/model.joblib'
+    compiled_path = f'{version_dir}/{COMPILED_FILE}'
+    if model_engine == "auto":
+        model_engine = "compiled" if parity_verified(compiled_path) else "native"
+    
+    if model_engine == "compiled" and os.path.exists(compiled_path):
+        model = CompiledTreeEnsemble.load(compiled_path)
+    elif os.path.exists(native_path):
+        from xgboost import XGBClassifier
+        model = XGBClassifier()
+        model.load_model(native_path)
+    elif os.path.exists(pickle_path):
+        model = joblib.load(pickle_path)
+    elif os.path.exists(compiled_path):
+        model = CompiledTreeEnsemble.load(compiled_path)
+    else:
+        print(f"❌ Version {version_name} has no model file!")
+        return None
     features = joblib.load(f'{version_dir}/features.joblib')
     performance = joblib.load(f'{version_dir}/performance.joblib')
     
@@ -73,34 +145,104 @@ def load_model_version(version_name):
     
     return model, features, performance
 
+def load_demo_arrays(version_name):
+    """Demo features/labels as memory-mapped arrays (falls back to parsing demo_data.csv)
+    
+    Returns a dict with 'features' (rows x features, in feature_names order),
+    'labels', 'feature_names' and 'extra' (other numeric columns by name).
+    """
+    version_dir = f"model_versions/{version_name}"
+    meta_path = f'{version_dir}/{DEMO_META_FILE}'
+    
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return {
+            'features': np.load(f'{version_dir}/{DEMO_FEATURES_FILE}', mmap_mode='r'),
+            'labels': np.load(f'{version_dir}/{DEMO_LABELS_FILE}', mmap_mode='r'),
+            'feature_names': meta['feature_names'],
+            'extra': {col: np.load(f'{version_dir}/demo_{col}.npy', mmap_mode='r')
+                      for col in meta['extra_columns']}
+        }
+    
+    # Not migrated yet - parse the CSV
+    import pandas as pd
+    features = joblib.load(f'{version_dir}/features.joblib')
+    demo_data = pd.read_csv(f'{version_dir}/demo_data.csv')
+    feature_names = features['feature_names']
+    if 'isFraud' in demo_data.columns:
+        labels = demo_data['isFraud'].to_numpy(dtype=np.int8)
+    else:
+        labels = np.zeros(len(demo_data), dtype=np.int8)
+    return {
+        'features': np.ascontiguousarray(demo_data[feature_names].to_numpy(dtype=np.float64)),
+        'labels': labels,
+        'feature_names': feature_names,
+        'extra': {col: demo_data[col].to_numpy() for col in demo_data.columns
+                  if col not in feature_names and col != 'isFraud'
+                  and np.issubdtype(demo_data[col].dtype, np.number)}
+    }
+
+def load_demo_frame(version_name):
+    """Demo data as a DataFrame (same columns as demo_data.csv), built from the fast arrays"""
+    import pandas as pd
+    demo = load_demo_arrays(version_name)
+    frame = pd.DataFrame(demo['features'], columns=demo['feature_names'], copy=False)
+    for col, values in demo['extra'].items():
+        frame[col] = values
+    frame['isFraud'] = np.asarray(demo['labels'], dtype=int)
+    return frame
+
+def migrate_model_artifacts(version_name):
+    """Add the fast-loading artifacts to an existing version directory"""
+    import pandas as pd
+    version_dir = f"model_versions/{version_name}"
+    features = joblib.load(f'{version_dir}/features.joblib')
+    
+    demo_data = pd.read_csv(f'{version_dir}/demo_data.csv')
+    save_demo_arrays(version_dir, demo_data, features['feature_names'])
+    print(f"✅ {version_name}: {len(demo_data):,} demo rows -> {DEMO_FEATURES_FILE}/{DEMO_LABELS_FILE}")
+    
+    if os.path.exists(f'{version_dir}/model.joblib'):
+        save_native_model(version_dir, joblib.load(f'{version_dir}/model.joblib'),
+                          demo_data[features['feature_names']].to_numpy(dtype=np.float64))
+        print(f"✅ {version_name}: model -> native/compiled formats")
+    else:
+        print(f"⚠️  {version_name}: no model.joblib, only demo data migrated")
+
 def load_current_model():
     """Load the current/latest model"""
     return joblib.load('current_model.joblib'), joblib.load('current_features.joblib')
 
 def list_model_versions():
     """List all saved model versions with model types"""
-    if not os.path.exists('model_versions'):
+    versions = get_registry().versions()
+    if not versions:
         print("No versions saved yet!")
         return
     
-    versions = os.listdir('model_versions')
-    versions.sort()
-    
     print("\n" + "="*60)
     print("📚 MODEL VERSIONS")
     print("="*60)
     
+    for info in versions:
+        model_icon = "🤖" if info['model_type'] == 'xg' else "🌲"
+        
+        print(f"{model_icon} {info['version']}")
+        print(f"   ⏰ {info['timestamp']}")
+        print(f"   📊 ROC-AUC: {info['auc']:.4f}")
+        print(f"   🔢 Features: {info['features_count']}")
+        print(f"   💡 {info['note'] or 'No note'}")
+        print()
+
+if __name__ == "__main__":
+    # python model_utils.py migrate [version ...]  (all versions if none given)
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python model_utils.py migrate [version ...]")
+        sys.exit(1)
+    versions = sys.argv[2:] or sorted(
+        d for d in os.listdir('model_versions')
+        if os.path.exists(f'model_versions/{d}/features.joblib')
+    )
     for version in versions:
-        version_path = f"model_versions/{version}"
-        if os.path.exists(f"{version_path}/version_info.json"):
-            with open(f"{version_path}/version_info.json", 'r') as f:
-                info = json.load(f)
-            
-            model_icon = "🤖" if info.get('model_type') == 'xg' else "🌲"
-            
-            print(f"{model_icon} {version}")
-            print(f"   ⏰ {info['timestamp']}")
-            print(f"   📊 ROC-AUC: {info['performance']:.4f}")
-            print(f"   🔢 Features: {info['features_count']}")
-            print(f"   💡 {info.get('note', 'No note')}")
-            print()
\ No newline at end of file
+        migrate_model_artifacts(version)
@@ -1,14 +1,16 @@
-import pandas as pd
 import matplotlib.pyplot as plt
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # backend/, for data_loader
+from data_loader import load_transactions
 
 # 1. Load your data
-# Using usecols makes loading much faster and saves RAM
-train_trans = pd.read_csv('train_transaction.csv', usecols=['TransactionID', 'isFraud'])
-train_id = pd.read_csv('train_identity.csv', usecols=['TransactionID'])
+# The shared loader only parses these columns and caches them for the next run
+train_trans = load_transactions(['TransactionID', 'isFraud'])
 
 # 2. Prepare the Identity Subset (Intersection)
 # Inner join keeps only TransactionIDs present in BOTH files
-merged_df = pd.merge(train_id, train_trans, on='TransactionID', how='inner')
+merged_df = load_transactions(['TransactionID', 'isFraud'], how='inner')
 
 # 3. Setup Plotting
 fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 7))
@@ -1,10 +1,12 @@
 import pandas as pd
 import matplotlib.pyplot as plt
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # backend/, for data_loader
+from data_loader import load_transactions
 
 # 1. Load and Merge Data
-train_trans = pd.read_csv('train_transaction.csv', usecols=['TransactionID', 'isFraud'])
-train_id = pd.read_csv('train_identity.csv', usecols=['TransactionID', 'id_23'])
-df = pd.merge(train_trans, train_id, on='TransactionID', how='inner')
+df = load_transactions(['TransactionID', 'isFraud'], ['id_23'], how='inner')
 
 # 2. Clean and Filter Proxy Data
 # We only care about the three proxy types mentioned
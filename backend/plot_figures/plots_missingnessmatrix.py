@@ -1,9 +1,12 @@
-import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # backend/, for data_loader
+from data_loader import load_transactions
 
 # 1. Load only a small sample (20,000 rows is plenty)
-df_sample = pd.read_csv('train_transaction.csv', nrows=20000)
+df_sample = load_transactions(nrows=20000)
 
 # 2. Plotting - we use every 2nd or 3rd column to save even more space
 columns_to_show = df_sample.columns[::2] 
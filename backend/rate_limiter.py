@@ -0,0 +1,106 @@
+# rate_limiter.py - token bucket that paces a producer to a target rate, one batch at a time
+import sys
+import time
+
+DEFAULT_BURST_SECONDS = 0.1  # Bucket depth: at most this much of a second's rows in one batch
+
+
+class TokenBucket:
+    """Target rate (rows/sec) with batch-granular pacing; rate=None means unlimited
+
+    The bucket refills at `rate` tokens per second up to `rate * burst_seconds`.
+    A batch may start once the bucket isn't in debt; its rows are then taken
+    all at once (possibly going negative), and the debt is the wait before the
+    next batch. Batch sizes don't need to be known in advance, and the long-run
+    rate is exact however the producer sizes them - max_batch() just keeps a
+    single batch from being a burst far above the target.
+    """
+
+    def __init__(self, rate=None, burst_seconds=DEFAULT_BURST_SECONDS, clock=time.monotonic):
+        self.burst_seconds = burst_seconds
+        self.clock = clock
+        self.rate = None
+        self.tokens = 0.0
+        self.updated = clock()
+        self.rows = 0
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self.set_rate(rate)
+
+    @property
+    def capacity(self):
+        return max(1.0, self.rate * self.burst_seconds) if self.rate else 0.0
+
+    def _refill(self):
+        now = self.clock()
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, rate):
+        """Change the target; None (or 0) removes the limit. Debt carries over, banked tokens are clamped"""
+        self._refill()
+        self.rate = float(rate) if rate else None
+        self.tokens = min(self.tokens, self.capacity) if self.rate else 0.0
+
+    def max_batch(self):
+        """Largest batch that keeps pacing smooth, or None when unlimited"""
+        return max(1, int(self.capacity)) if self.rate else None
+
+    def delay(self):
+        """Seconds to wait before the next batch may start (0.0 if it may start now)"""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def consume(self, rows):
+        """Charge a batch that was just produced"""
+        self.rows += rows
+        if self.rate:
+            self._refill()
+            self.tokens -= rows
+
+    def record_wait(self, seconds):
+        self.waits += 1
+        self.waited_seconds += seconds
+
+    def snapshot(self):
+        return {
+            "target_rate": self.rate,
+            "max_batch": self.max_batch(),
+            "tokens": round(self.tokens, 1),
+            "rows": self.rows,
+            "waits": self.waits,
+            "waited_seconds": round(self.waited_seconds, 3)
+        }
+
+
+def benchmark(rate=20_000, seconds=2.0):
+    """Real clock: pace empty batches with asyncio.sleep and report achieved rate and slip"""
+    import asyncio
+
+    async def run():
+        bucket = TokenBucket(rate)
+        start, rows, late = time.perf_counter(), 0, []
+        while time.perf_counter() - start < seconds:
+            delay = bucket.delay()
+            if delay > 0:
+                wake = time.perf_counter() + delay
+                await asyncio.sleep(delay)
+                late.append(time.perf_counter() - wake)
+            n = bucket.max_batch()
+            bucket.consume(n)
+            rows += n
+        elapsed = time.perf_counter() - start
+        late.sort()
+        p99 = late[int(len(late) * 0.99)] * 1000 if late else 0.0
+        print(f"⚡ target {rate:,} tx/s -> {rows / elapsed:,.0f} tx/s over {elapsed:.1f}s "
+              f"({len(late)} waits, wake-up slip p99 {p99:.2f} ms)")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    # python rate_limiter.py [bench]  (pacing tests: tests/test_rate_limiter.py)
+    benchmark()
@@ -1,20 +1,90 @@
 # real_model.py
-import pandas as pd
 import numpy as np
 import time
 from datetime import datetime
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
 import asyncio
-from model_utils import load_model_version
+import os
+from model_utils import load_model_version, load_demo_arrays
+from model_registry import model_label
+from tree_engine import CompiledTreeEnsemble
+from batch_controller import BatchSizeController
+from score_window import ScoreWindow, DEFAULT_CAPACITY
+from metrics_history import MetricsHistory
+from telemetry import get_telemetry
+from event_stream import EVENT_TYPES, EventBatch
+
+DEFAULT_MODEL_VERSION = "v5_xg_20251109_154848"
+
+INFERENCE_EXECUTORS = ("inline", "thread", "process")
+
+# Timed stages of process_batch, exported by telemetry.py at /metrics
+BATCH_STAGES = ("slice", "predict", "classify", "events")
+
+def inference_threads_per_worker(max_workers):
+    """Split the cores (minus one for the event loop) across inference workers"""
+    return max(1, ((os.cpu_count() or 1) - 1) // max(1, max_workers))
+
+def set_model_threads(model, n_threads):
+    """Pin the model's own thread pool (XGBoost nthread / sklearn n_jobs)"""
+    if hasattr(model, "get_params") and "n_jobs" in model.get_params():
+        model.set_params(n_jobs=n_threads)
+    return model
+
+# Models loaded inside process-pool workers, keyed by version
+_worker_models = {}
+
+def _predict_in_worker(model_version, model_engine, n_threads, batch_features):
+    """predict_proba inside a process-pool worker (loads the version on first use)"""
+    model = _worker_models.get((model_version, model_engine))
+    if model is None:
+        model, _, _ = load_model_version(model_version, model_engine=model_engine)
+        _worker_models.clear()  # Only the active version (after a swap) is kept warm
+        _worker_models[(model_version, model_engine)] = set_model_threads(model, n_threads)
+    return model.predict_proba(batch_features)[:, 1]
+
+def _warm_up(model, rows, passes):
+    """A few scoring passes so the first live batch doesn't pay for lazy initialisation"""
+    for _ in range(passes):
+        probs = model.predict_proba(rows)[:, 1]
+    if not np.all((probs >= 0) & (probs <= 1)):
+        raise ValueError("warm-up produced probabilities outside [0, 1]")
+
+class LoadedModel:
+    """A model version plus its demo data - swapped into the engine as one unit"""
+    
+    def __init__(self, model_version, model_engine="native", n_threads=1):
+        result = load_model_version(model_version, model_engine=model_engine)
+        if result is None:
+            raise ValueError(f"Model version {model_version} has no loadable model")
+        self.version = model_version
+        self.engine = model_engine
+        self.model, self.features, self.performance = result
+        self.served_by = "compiled" if isinstance(self.model, CompiledTreeEnsemble) else "native"
+        set_model_threads(self.model, n_threads)
+        self.label = model_label(model_version)
+        
+        # Demo features/labels as memory-mapped arrays (no CSV parsing at startup)
+        demo = load_demo_arrays(model_version)
+        self.feature_matrix = demo['features']
+        self.labels = demo['labels']
+        self.amounts = self.feature_matrix[:, demo['feature_names'].index('TransactionAmt')]
+        self.demo_rows = len(self.feature_matrix)
 
 class RealFraudEngine:
-    def __init__(self, model_version="v5_xg_20251109_154848"):
-        print(f"🧠 Loading real XGBoost model: {model_version}")
-        self.model, self.features, self.performance = load_model_version(model_version)
-        self.demo_data = pd.read_csv(f"model_versions/{model_version}/demo_data.csv")
+    def __init__(self, model_version=DEFAULT_MODEL_VERSION, executor="thread",
+                 max_workers=1, max_in_flight=2, latency_target_ms=25.0, model_engine="native",
+                 shadow_version=None, score_window=DEFAULT_CAPACITY):
+        print(f"🧠 Loading real model: {model_version}")
+        self.max_workers = max_workers
+        self.inference_threads = inference_threads_per_worker(max_workers)
+        self._install(LoadedModel(model_version, model_engine, self.inference_threads))
         self.is_running = False
         self.current_batch = 0
         self.total_processed = 0
+        self.batch_controller = BatchSizeController(target_p99_ms=latency_target_ms)
         self.stats = {
             "total_processed": 0,
             "fraud_detected": 0,
@@ -24,12 +94,220 @@ class RealFraudEngine:
             "processing_speed": 0.0,
             "alert_rate": 0.0,
             "threshold": 0.063,
-            "model_auc": self.performance['roc_auc'],
-            "batch_size": 1000
+            "model_auc": float(self.performance['roc_auc']),
+            "model": self.model_label,
+            "model_version": self.model_version,
+            **self.batch_controller.snapshot()
         }
         self.event_buffer = deque(maxlen=100)
+        # Last N (prob, label, timestamp) rows: threshold changes recount these, live curves sort them
+        self.score_window = ScoreWindow(score_window)
+        self.counted_rows = 0  # Rows the confusion counters cover (the window, after a threshold change)
+        self.metrics = MetricsHistory()  # 1s/10s/60s windows and 1s/1m history for /api/metrics/history
+        self.stage_timers = {stage: get_telemetry().histogram(stage, mode="real_model") for stage in BATCH_STAGES}
         self.last_calc_time = time.time()
         self.last_count = 0
+        
+        # Inference runs off the event loop: "thread" (default), "process", or "inline"
+        if executor not in INFERENCE_EXECUTORS:
+            raise ValueError(f"executor must be one of {INFERENCE_EXECUTORS}, got {executor!r}")
+        self.executor_kind = executor
+        self.max_in_flight = max_in_flight
+        if executor == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        elif executor == "process":
+            self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self.executor = None
+        self.inference_in_flight = 0
+        self.inference_waiting = 0
+        self._inference_slots = None  # Created lazily so it binds to the running loop
+        self._swap_lock = None
+        self.swap_state = {"state": "idle", "target": None}
+        
+        # Optional challenger scored on the same batches (see shadow.py)
+        self.shadow = None
+        if shadow_version:
+            from shadow import load_shadow
+            self.shadow = load_shadow(shadow_version, self.model_label, self.model_version,
+                                      self.model_engine, self.inference_threads)
+    
+    def _install(self, loaded):
+        """Point the engine at a loaded model (synchronous, so never split by an await)"""
+        self.loaded = loaded
+        self.model_version = loaded.version
+        self.model_engine = loaded.engine
+        self.model_label = loaded.label
+        self.model = loaded.model
+        self.features = loaded.features
+        self.performance = loaded.performance
+        self.feature_matrix = loaded.feature_matrix
+        self.labels = loaded.labels
+        self.amounts = loaded.amounts
+        self.demo_rows = loaded.demo_rows
+    
+    async def swap_model(self, model_version, warmup_passes=3):
+        """Load, warm up and switch to another version without stopping the stream
+        
+        Loading and warm-up run in a background thread while batches keep flowing
+        on the current model. The switch itself is a plain attribute swap between
+        batches: a batch already in flight finishes on the model it started with.
+        """
+        if self._swap_lock is None:
+            self._swap_lock = asyncio.Lock()
+        async with self._swap_lock:
+            loop = asyncio.get_running_loop()
+            previous = self.model_label
+            self.swap_state = {"state": "loading", "target": model_version}
+            try:
+                started = time.perf_counter()
+                loaded = await loop.run_in_executor(
+                    None, partial(LoadedModel, model_version, self.model_engine, self.inference_threads))
+                load_ms = (time.perf_counter() - started) * 1000
+                
+                # /api/score rows are built in the active feature order, so it must not change
+                if loaded.features['feature_names'] != self.features['feature_names']:
+                    raise ValueError(f"{model_version} uses a different feature set; restart to switch to it")
+                
+                self.swap_state["state"] = "warming"
+                started = time.perf_counter()
+                warm_rows = np.ascontiguousarray(loaded.feature_matrix[:self.batch_controller.batch_size])
+                await loop.run_in_executor(None, partial(_warm_up, loaded.model, warm_rows, warmup_passes))
+                if self.executor_kind == "process":
+                    # Have the workers load the new version before live batches need it
+                    await asyncio.gather(*(
+                        loop.run_in_executor(self.executor, partial(
+                            _predict_in_worker, model_version, self.model_engine,
+                            self.inference_threads, warm_rows))
+                        for _ in range(self.max_workers)
+                    ))
+                warmup_ms = (time.perf_counter() - started) * 1000
+            finally:
+                self.swap_state = {"state": "idle", "target": None}
+            
+            # The swap: new model and its demo stream, from the next batch on
+            self._install(loaded)
+            self.current_batch = 0
+            self.stats["model_auc"] = float(loaded.performance['roc_auc'])
+            self.stats["model"] = loaded.label
+            self.stats["model_version"] = loaded.version
+            self.batch_controller.reset_samples()  # Latency at the old model isn't comparable
+            self.score_window.clear()  # Nor are its scores
+            if self.shadow is not None:
+                self.shadow.reset(loaded.label, loaded.version)
+            print(f"🔁 Swapped {previous} -> {loaded.label} (load {load_ms:.0f} ms, warm-up {warmup_ms:.0f} ms)")
+            
+            return {
+                "previous": previous,
+                "model": loaded.label,
+                "model_version": loaded.version,
+                "model_auc": self.stats["model_auc"],
+                "load_ms": round(load_ms, 1),
+                "warmup_ms": round(warmup_ms, 1)
+            }
+    
+    async def set_shadow(self, model_version):
+        """Start shadow-scoring live batches with another version (None stops it)"""
+        from shadow import load_shadow
+        shadow = None
+        if model_version is not None:
+            loop = asyncio.get_running_loop()
+            shadow = await loop.run_in_executor(None, partial(
+                load_shadow, model_version, self.model_label, self.model_version,
+                self.model_engine, self.inference_threads))
+            if shadow.loaded.features['feature_names'] != self.features['feature_names']:
+                shadow.close()
+                raise ValueError(f"{model_version} uses a different feature set than {self.model_version}")
+        
+        previous, self.shadow = self.shadow, shadow
+        if previous is not None:
+            await previous.drain()
+            previous.close()
+        return shadow
+    
+    async def predict(self, batch_features):
+        """Fraud probabilities for a feature matrix, computed in the inference executor"""
+        # Bind the model now: a swap while we wait for a slot mustn't change who scores this batch
+        model = self.model
+        model_version = self.model_version
+        if self.executor is None:
+            return model.predict_proba(batch_features)[:, 1]
+        
+        if self._inference_slots is None:
+            self._inference_slots = asyncio.Semaphore(self.max_in_flight)
+        
+        # Bounded in-flight queue: callers beyond max_in_flight wait here, not in the pool
+        self.inference_waiting += 1
+        try:
+            await self._inference_slots.acquire()
+        finally:
+            self.inference_waiting -= 1
+        
+        self.inference_in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if self.executor_kind == "process":
+                task = partial(_predict_in_worker, model_version, self.model_engine,
+                               self.inference_threads, batch_features)
+            else:
+                task = partial(model.predict_proba, batch_features)
+            result = await loop.run_in_executor(self.executor, task)
+        finally:
+            self.inference_in_flight -= 1
+            self._inference_slots.release()
+        
+        return result if self.executor_kind == "process" else result[:, 1]
+    
+    def set_threshold(self, threshold):
+        """Switch the serving threshold and recount the confusion stats over the score window
+        
+        Counters accumulate at one threshold, so they're rebuilt from the window's
+        stored probabilities rather than carried over; later batches add to them.
+        """
+        started = time.perf_counter()
+        counts = self.score_window.counts(threshold)
+        self.stats["threshold"] = float(threshold)
+        self.stats["fraud_detected"] = counts["fraud_detected"]
+        self.stats["missed_fraud"] = counts["missed_fraud"]
+        self.stats["false_alarms"] = counts["false_alarms"]
+        self.counted_rows = counts["rows"]
+        self._update_rates()
+        return {
+            "threshold": self.stats["threshold"],
+            "window_rows": counts["rows"],
+            "window_seconds": round(self.score_window.span_seconds(), 3),
+            "recompute_ms": round((time.perf_counter() - started) * 1000, 3),
+            **{key: self.stats[key] for key in
+               ("fraud_detected", "missed_fraud", "false_alarms", "detection_rate", "alert_rate")}
+        }
+    
+    def _update_rates(self):
+        total_frauds = self.stats["fraud_detected"] + self.stats["missed_fraud"]
+        self.stats["detection_rate"] = (self.stats["fraud_detected"] / total_frauds) * 100 if total_frauds else 0.0
+        total_alerts = self.stats["fraud_detected"] + self.stats["false_alarms"]
+        self.stats["alert_rate"] = (total_alerts / self.counted_rows) * 100 if self.counted_rows else 0.0
+    
+    def feature_rows(self, transactions):
+        """Feature matrix for raw transaction dicts, in the model's feature order
+        
+        Features are expected already encoded as in demo_data (categorical codes);
+        missing or null features get the -999 fill value used in training.
+        """
+        feature_names = self.features['feature_names']
+        rows = [
+            [-999 if tx.get(name) is None else tx[name] for name in feature_names]
+            for tx in transactions
+        ]
+        return np.array(rows, dtype=float).reshape(len(rows), len(feature_names))
+    
+    def close(self):
+        """Shut down the inference (and shadow) executors"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        if self.shadow is not None:
+            self.shadow.close()
+            self.shadow = None
     
     def calculate_real_speed(self):
         """Calculate actual processing speed"""
@@ -46,82 +324,108 @@ class RealFraudEngine:
         
         return self.stats["processing_speed"]
     
-    async def process_batch(self, batch_size=100, threshold=0.063):
-        """Process a batch of real transactions through the model"""
-        if self.current_batch >= len(self.demo_data):
+    async def process_batch(self, batch_size=None, threshold=None):
+        """Process a batch of real transactions through the model
+        
+        With batch_size=None the size is picked by the latency-SLO controller, and
+        with threshold=None the batch is classified at stats["threshold"] as of
+        when its scores come back (so a threshold change never splits the counters).
+        Returns an EventBatch (see event_stream.py).
+        """
+        started = time.perf_counter()
+        adaptive = batch_size is None
+        if adaptive:
+            batch_size = self.batch_controller.batch_size
+        
+        # The whole batch uses one model version, even if a swap lands mid-batch
+        loaded = self.loaded
+        if self.current_batch >= loaded.demo_rows:
             self.current_batch = 0  # Loop back to start
         
-        batch_end = min(self.current_batch + batch_size, len(self.demo_data))
-        batch_data = self.demo_data.iloc[self.current_batch:batch_end]
+        batch_start = self.current_batch
+        batch_end = min(batch_start + batch_size, loaded.demo_rows)
+        # Claim the slice before awaiting inference so concurrent callers don't overlap
+        self.current_batch = batch_end
         
-        # Prepare features
-        feature_names = self.features['feature_names']
-        batch_features = batch_data[feature_names].values
+        # Slice the pre-extracted arrays (no per-row DataFrame access)
+        with self.stage_timers["slice"].time():
+            batch_features = loaded.feature_matrix[batch_start:batch_end]
+            batch_labels = loaded.labels[batch_start:batch_end]
+            batch_amounts = loaded.amounts[batch_start:batch_end]
         
-        # REAL MODEL PREDICTION
-        batch_probs = self.model.predict_proba(batch_features)[:, 1]
+        batch = await self.score_rows(batch_features, batch_labels, batch_amounts,
+                                      batch_start // batch_size, threshold, loaded, started)
         
-        # Get actual fraud labels
-        if 'isFraud' in batch_data.columns:
-            batch_labels = batch_data['isFraud'].values
-        else:
-            batch_labels = np.zeros(len(batch_data), dtype=int)
+        # Feed the measured scoring latency back to the batch size controller
+        if adaptive:
+            self.batch_controller.record(len(batch), time.perf_counter() - started)
+            self.stats.update(self.batch_controller.snapshot())
+        
+        return batch
+    
+    async def score_rows(self, batch_features, batch_labels, batch_amounts, batch_index,
+                         threshold=None, loaded=None, started=None):
+        """Score and count one batch of rows from any source (the demo loop, or a replay)
+        
+        Rows must be in the active model's feature order. Updates every counter,
+        the score window and the event buffer, and returns an EventBatch.
+        """
+        started = time.perf_counter() if started is None else started
+        loaded = self.loaded if loaded is None else loaded
+        timers = self.stage_timers
         
-        events = []
+        # Shadow model (if any) scores the same view in parallel; we never wait for it
+        shadow = self.shadow
+        shadow_future = shadow.start(batch_features) if shadow is not None else None
         
-        for i, fraud_prob in enumerate(batch_probs):
-            self.stats["total_processed"] += 1
-            self.total_processed += 1
+        # REAL MODEL PREDICTION (off the event loop)
+        with timers["predict"].time():
+            batch_probs = await self.predict(batch_features)
+        if threshold is None:
+            threshold = self.stats["threshold"]
+        if shadow is not None:
+            shadow.finish(shadow_future, batch_probs, batch_labels, threshold)
+        
+        with timers["classify"].time():
+            self.score_window.append(batch_probs, batch_labels)
             
-            is_flagged = fraud_prob > threshold
-            is_actual_fraud = batch_labels[i] == 1
+            # Classify the whole batch at once: code = actual_fraud * 2 + flagged
+            is_flagged = batch_probs > threshold
+            is_actual_fraud = batch_labels == 1
+            type_codes = is_actual_fraud.astype(np.int8) * 2 + is_flagged
+            counts = np.bincount(type_codes, minlength=len(EVENT_TYPES))
             
-            if is_actual_fraud:
-                if is_flagged:
-                    event_type = "detected_fraud"
-                    self.stats["fraud_detected"] += 1
-                else:
-                    event_type = "missed_fraud"
-                    self.stats["missed_fraud"] += 1
-            else:
-                if is_flagged:
-                    event_type = "false_alarm"
-                    self.stats["false_alarms"] += 1
-                else:
-                    event_type = "legitimate"
+            # Update counters once per batch
+            n = len(batch_probs)
+            first_id = self.total_processed + 1
+            self.total_processed += n
+            self.stats["total_processed"] += n
+            self.stats["fraud_detected"] += int(counts[3])
+            self.stats["missed_fraud"] += int(counts[2])
+            self.stats["false_alarms"] += int(counts[1])
+            self.counted_rows += n
+            self.metrics.record(n, int(counts[3]), int(counts[2]), int(counts[1]),
+                                busy_ms=(time.perf_counter() - started) * 1000)
             
             # Update derived stats
-            total_frauds = self.stats["fraud_detected"] + self.stats["missed_fraud"]
-            if total_frauds > 0:
-                self.stats["detection_rate"] = (self.stats["fraud_detected"] / total_frauds) * 100
-            
-            total_alerts = self.stats["fraud_detected"] + self.stats["false_alarms"]
-            if self.stats["total_processed"] > 0:
-                self.stats["alert_rate"] = (total_alerts / self.stats["total_processed"]) * 100
+            self._update_rates()
             
             # Calculate speed
             self.calculate_real_speed()
-            
-            # Create event
-            amount = float(batch_data.iloc[i]['TransactionAmt'])
-            
-            event = {
-                "id": f"TX-REAL-{self.total_processed}",
-                "amount": amount,
-                "fraud_prob": float(fraud_prob),
-                "is_flagged": bool(is_flagged),
-                "type": event_type,
-                "timestamp": datetime.now().strftime("%H:%M:%S.%f")[:-3],
-                "interesting": event_type != "legitimate",
-                "model": "XGBoost v5",
-                "batch": self.current_batch // batch_size
-            }
-            
-            if event["interesting"]:
-                self.event_buffer.append(event)
-            
-            events.append(event)
         
-        self.current_batch = batch_end
+        # Keep the batch as columns; only its interesting rows become dicts here (for the event
+        # buffer) - subscribers that want legitimate rows build those when their frame is encoded
+        with timers["events"].time():
+            batch = EventBatch(
+                ids=np.arange(first_id, first_id + n, dtype=np.int64),
+                amounts=batch_amounts,
+                probs=batch_probs,
+                flags=is_flagged,
+                type_codes=type_codes,
+                timestamp=datetime.now().strftime("%H:%M:%S.%f")[:-3],
+                model=loaded.label,
+                batch=batch_index
+            )
+            self.event_buffer.extend(batch.interesting().to_events())
         
-        return events
\ No newline at end of file
+        return batch
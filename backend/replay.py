@@ -0,0 +1,261 @@
+# replay.py - replays a version's demo data or a CSV at its original TransactionDT pacing (1x, 100x, max)
+import os
+import sys
+import time
+
+import numpy as np
+
+from model_utils import load_demo_arrays
+from telemetry import LatencyHistogram, get_telemetry
+
+TIME_COLUMN = "TransactionDT"
+DEFAULT_UNIFORM_RATE = 100.0  # tx/sec of dataset time when a source has no TransactionDT
+DEFAULT_TICK = 0.001          # Rows due within this many (wall) seconds go out in the same micro-batch
+MAX_LAG_SECONDS = 5.0         # Further behind than this (paused, or can't keep up): rebase the schedule
+REPLAY_DIR = "replay_data"    # External CSVs are only read from here (FRAUD_REPLAY_DIR in the server)
+
+
+def parse_speed(speed):
+    """"1x" / "100x" / "max" / a number -> a float multiplier (inf for max)"""
+    if speed is None:
+        return 1.0
+    text = str(speed).strip().lower()
+    if text in ("max", "inf", "0"):
+        return float("inf")
+    try:
+        value = float(text[:-1] if text.endswith("x") else text)
+    except ValueError:
+        value = -1.0
+    if value <= 0:
+        raise ValueError(f"speed must be 'Nx' (N > 0) or 'max', got {speed!r}")
+    return value
+
+
+def speed_label(speed):
+    return "max" if speed == float("inf") else f"{speed:g}x"
+
+
+class ReplaySource:
+    """Rows to replay, in time order and in the model's feature order, with their time offsets"""
+
+    def __init__(self, features, labels, amounts, dt=None, name="", uniform_rate=DEFAULT_UNIFORM_RATE):
+        n = len(features)
+        if n == 0:
+            raise ValueError(f"{name or 'replay source'} has no rows")
+        if dt is not None:
+            dt = np.asarray(dt, dtype=np.float64)
+            order = np.argsort(dt, kind="stable")
+            features, labels, amounts, dt = features[order], labels[order], amounts[order], dt[order]
+            self.offsets = dt - dt[0]
+            self.timing = TIME_COLUMN
+        else:
+            self.offsets = np.arange(n, dtype=np.float64) / uniform_rate
+            self.timing = f"uniform {uniform_rate:g}/s"
+        self.features = np.ascontiguousarray(features, dtype=np.float64)
+        self.labels = np.asarray(labels, dtype=np.int8)
+        self.amounts = np.asarray(amounts, dtype=np.float64)
+        self.name = name
+
+    def __len__(self):
+        return len(self.features)
+
+    def span_seconds(self):
+        return float(self.offsets[-1])
+
+    def describe(self):
+        gaps = np.diff(self.offsets)
+        return {
+            "source": self.name,
+            "rows": len(self),
+            "timing": self.timing,
+            "span_seconds": round(self.span_seconds(), 1),
+            "mean_gap_seconds": round(float(gaps.mean()), 3) if len(gaps) else 0.0,
+            "max_gap_seconds": round(float(gaps.max()), 3) if len(gaps) else 0.0
+        }
+
+
+def _reorder(matrix, names, feature_names, source):
+    missing = [f for f in feature_names if f not in names]
+    if missing:
+        raise ValueError(f"{source} is missing model features: {missing}")
+    return matrix[:, [names.index(f) for f in feature_names]]
+
+
+def load_version_source(version, feature_names):
+    """A saved version's demo rows (memory-mapped), timed by its TransactionDT if it was saved"""
+    demo = load_demo_arrays(version)
+    features = _reorder(np.asarray(demo['features']), demo['feature_names'], feature_names, version)
+    amounts = features[:, feature_names.index('TransactionAmt')]
+    return ReplaySource(features, np.asarray(demo['labels']), amounts, demo['extra'].get(TIME_COLUMN), version)
+
+
+def replay_csv_path(name, directory=REPLAY_DIR):
+    """Path of a CSV in the replay directory; only a bare *.csv file name is accepted"""
+    if not name or os.path.basename(name) != name or name in (".", "..") or not name.endswith(".csv"):
+        raise ValueError(f"CSV replay sources are file names in {directory}/, got {name!r}")
+    path = os.path.join(directory, name)
+    if not os.path.isfile(path):
+        raise ValueError(f"{name} not found in {directory}/")
+    return path
+
+
+def load_csv_source(path, feature_names):
+    """An external CSV with the model's feature columns (isFraud and TransactionDT optional)"""
+    import pandas as pd
+    if not os.path.exists(path):
+        raise ValueError(f"{path} not found")
+    frame = pd.read_csv(path)
+    missing = [f for f in feature_names if f not in frame.columns]
+    if missing:
+        raise ValueError(f"{path} is missing model features: {missing}")
+    features = frame[feature_names].to_numpy(dtype=np.float64)
+    labels = frame['isFraud'].to_numpy(dtype=np.int8) if 'isFraud' in frame.columns else np.zeros(len(frame), np.int8)
+    dt = frame[TIME_COLUMN].to_numpy() if TIME_COLUMN in frame.columns else None
+    return ReplaySource(features, labels, frame['TransactionAmt'].to_numpy(dtype=np.float64), dt,
+                        os.path.basename(path))
+
+
+class ReplaySchedule:
+    """Monotonic-clock schedule over a source's time offsets, looping; paces a BatchBroadcaster
+
+    Row i of pass p is due at start + (p * period + offset_i) / speed. Same
+    interface as rate_limiter.TokenBucket: delay() is the wait until the next
+    row is due, max_batch() the rows due now plus the next `tick` of them (so
+    micro-batches go out about once a tick, never more than a tick early), and
+    consume(n) advances past them, recording how late the batch's first row
+    went out (schedule slip). A schedule that falls more than max_lag behind -
+    paused, or the speed is more than scoring keeps up with - is rebased to
+    now instead of bursting through the backlog.
+    """
+
+    def __init__(self, source, speed=1.0, tick=DEFAULT_TICK, max_lag=MAX_LAG_SECONDS, clock=time.monotonic):
+        self.source = source
+        self.speed = speed
+        self.tick = tick
+        self.max_lag = max_lag
+        self.clock = clock
+        gaps = np.diff(source.offsets)
+        self.period = source.span_seconds() + (float(gaps.mean()) if len(gaps) and gaps.mean() > 0 else 1.0)
+        self.cursor = 0
+        self.passes = 0
+        self.rows = 0
+        self.rebases = 0
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self.started = None
+        self.batch_started = None
+        self.slip = LatencyHistogram()
+        self.slip_timer = get_telemetry().histogram("replay_slip", mode="real_model")
+
+    def _due(self, i):
+        """Wall-clock seconds after start when row i of the current pass is due"""
+        return (self.passes * self.period + self.source.offsets[i]) / self.speed
+
+    def _now(self):
+        now = self.clock()
+        if self.started is None:
+            self.started = now
+        lag = now - self.started - self._due(self.cursor)
+        if lag > self.max_lag:
+            self.started += lag  # Rebase: the next row is due now
+            self.rebases += 1
+        return now - self.started
+
+    def delay(self):
+        if self.speed == float("inf"):
+            return 0.0
+        wait = self._due(self.cursor) - self._now()
+        return wait if wait > 0 else 0.0
+
+    def max_batch(self):
+        """Rows due by now (at least 1); everything left in the pass at max speed"""
+        remaining = len(self.source) - self.cursor
+        if self.speed == float("inf"):
+            return remaining
+        self.batch_started = self._now()
+        horizon = (self.batch_started + self.tick) * self.speed - self.passes * self.period
+        due = int(np.searchsorted(self.source.offsets, horizon, side="right")) - self.cursor
+        return min(max(1, due), remaining)
+
+    def consume(self, rows):
+        if rows <= 0:
+            return
+        if self.batch_started is not None:
+            slip_ns = int(max(0.0, self.batch_started - self._due(self.cursor)) * 1e9)
+            self.slip.record_ns(slip_ns)
+            self.slip_timer.record_ns(slip_ns)
+            self.batch_started = None
+        self.rows += rows
+        self.cursor += rows
+        if self.cursor >= len(self.source):
+            self.cursor = 0
+            self.passes += 1
+
+    def rows_at(self, n):
+        """The next n rows (features, labels, amounts) - what a producer scores before consume(n)"""
+        end = min(self.cursor + n, len(self.source))
+        source = self.source
+        return source.features[self.cursor:end], source.labels[self.cursor:end], source.amounts[self.cursor:end]
+
+    def record_wait(self, seconds):
+        self.waits += 1
+        self.waited_seconds += seconds
+
+    def snapshot(self):
+        return {
+            **self.source.describe(),
+            "speed": speed_label(self.speed),
+            "position": self.cursor,
+            "passes": self.passes,
+            "replayed": self.rows,
+            "dataset_seconds": round(self.passes * self.period + float(self.source.offsets[self.cursor]), 1),
+            "slip": self.slip.snapshot(),
+            "rebases": self.rebases,
+            "waits": self.waits,
+            "waited_seconds": round(self.waited_seconds, 3)
+        }
+
+
+def dry_run(source_name, speed="100x", seconds=5.0):
+    """Real clock, no scoring: how closely asyncio sleeps follow the schedule"""
+    import asyncio
+    from real_model import DEFAULT_MODEL_VERSION
+    from model_utils import load_model_version
+
+    features = load_model_version(DEFAULT_MODEL_VERSION)[1]['feature_names']
+    if source_name.endswith(".csv"):
+        source = load_csv_source(source_name, features)
+    else:
+        source = load_version_source(source_name, features)
+    schedule = ReplaySchedule(source, parse_speed(speed))
+
+    async def run():
+        start = time.perf_counter()
+        batches = 0
+        while time.perf_counter() - start < seconds:
+            delay = schedule.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            schedule.consume(schedule.max_batch())
+            batches += 1
+            await asyncio.sleep(0)
+        return batches, time.perf_counter() - start
+
+    batches, elapsed = asyncio.run(run())
+    info = schedule.snapshot()
+    print(f"⏱️  {info['source']} ({info['timing']}, {info['rows']:,} rows over {info['span_seconds']:,.0f}s) "
+          f"at {info['speed']}: {schedule.rows:,} rows in {batches:,} micro-batches over {elapsed:.1f}s "
+          f"({schedule.rows / elapsed:,.0f} tx/s)")
+    slip = info["slip"]
+    print(f"🎯 Slip p50 {slip['p50_ms']:.3f} ms | p99 {slip['p99_ms']:.3f} ms | max {slip['max_ms']:.3f} ms "
+          f"| {info['rebases']} rebases")
+
+
+if __name__ == "__main__":
+    # python replay.py <version|file.csv> [1x|100x|max] [seconds]  (schedule tests: tests/test_replay.py)
+    if len(sys.argv) < 2:
+        print("Usage: python replay.py <version|file.csv> [1x|100x|max] [seconds]")
+        sys.exit(1)
+    dry_run(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "100x",
+            float(sys.argv[3]) if len(sys.argv) > 3 else 5.0)
@@ -1,8 +1,7 @@
-import pandas as pd
 import numpy as np
 import time
 from datetime import datetime
-from model_utils import load_model_version, list_model_versions
+from model_utils import load_model_version, list_model_versions, load_demo_frame
 
 def live_fraud_demo(model, features, transaction_data, max_transactions=10000, speed='fast', threshold=0.01):
     """Running a live simulation"""
@@ -115,8 +114,7 @@ def main():
     
     # Load demo data
     try:
-        demo_data_path = f"model_versions/{version_name}/demo_data.csv"
-        demo_data = pd.read_csv(demo_data_path)
+        demo_data = load_demo_frame(version_name)
     except Exception as e:
         print(f"❌ Error loading demo data: {e}")
         return
@@ -0,0 +1,188 @@
+# shadow.py - champion/challenger scoring: a second model on the same live batches
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from real_model import EVENT_TYPES, LoadedModel
+
+AUC_BINS = 10000  # Score histogram resolution; AUC error is bounded by ties within a bin
+
+
+class ModelScorecard:
+    """Running confusion counts and AUC for one model over the compared batches
+
+    AUC is the Mann-Whitney statistic over fixed score histograms per class, so
+    memory stays constant however long the comparison runs.
+    """
+
+    def __init__(self, label, model_version, bins=AUC_BINS):
+        self.label = label
+        self.model_version = model_version
+        self.bins = bins
+        self.counts = np.zeros(len(EVENT_TYPES), dtype=np.int64)
+        self.fraud_hist = np.zeros(bins, dtype=np.int64)
+        self.legit_hist = np.zeros(bins, dtype=np.int64)
+
+    def record(self, probs, is_fraud, threshold):
+        codes = is_fraud.astype(np.int8) * 2 + (probs > threshold)
+        self.counts += np.bincount(codes, minlength=len(EVENT_TYPES))
+        score_bins = np.minimum((probs * self.bins).astype(np.int64), self.bins - 1)
+        self.fraud_hist += np.bincount(score_bins[is_fraud], minlength=self.bins)
+        self.legit_hist += np.bincount(score_bins[~is_fraud], minlength=self.bins)
+
+    def auc(self):
+        frauds = self.fraud_hist.sum()
+        legits = self.legit_hist.sum()
+        if frauds == 0 or legits == 0:
+            return None
+        # Each fraud outranks the legit scores in lower bins, and ties half-count
+        legits_below = np.cumsum(self.legit_hist) - self.legit_hist
+        wins = (self.fraud_hist * (legits_below + 0.5 * self.legit_hist)).sum()
+        return float(wins / (frauds * legits))
+
+    def snapshot(self):
+        legitimate, false_alarm, missed_fraud, detected_fraud = (int(c) for c in self.counts)
+        total = int(self.counts.sum())
+        frauds = detected_fraud + missed_fraud
+        auc = self.auc()
+        return {
+            "model": self.label,
+            "model_version": self.model_version,
+            "transactions": total,
+            "legitimate": legitimate,
+            "false_alarms": false_alarm,
+            "missed_fraud": missed_fraud,
+            "fraud_detected": detected_fraud,
+            "detection_rate": round(detected_fraud / frauds * 100, 2) if frauds else 0.0,
+            "alert_rate": round((detected_fraud + false_alarm) / total * 100, 3) if total else 0.0,
+            "auc": round(auc, 4) if auc is not None else None
+        }
+
+
+class ShadowScorer:
+    """Scores every live batch with a challenger model on its own executor
+
+    The primary path never waits for it: process_batch starts the shadow
+    prediction alongside its own and hands over its probabilities afterwards.
+    If the shadow falls more than max_pending batches behind, batches are
+    skipped (and counted) rather than queued without bound.
+    """
+
+    def __init__(self, loaded, primary_label, primary_version, max_pending=4):
+        self.loaded = loaded
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self.max_pending = max_pending
+        self.pending = 0
+        self.tasks = set()
+        self.generation = 0
+        self.reset(primary_label, primary_version)
+
+    def reset(self, primary_label, primary_version):
+        """Start a fresh comparison (e.g. after the primary model is swapped)"""
+        self.generation += 1  # Results still in flight belong to the old comparison
+        self.started = time.time()
+        self.primary = ModelScorecard(primary_label, primary_version)
+        self.shadow = ModelScorecard(self.loaded.label, self.loaded.version)
+        self.compared = 0
+        self.flag_disagreements = 0
+        self.primary_only_flags = 0
+        self.shadow_only_flags = 0
+        self.abs_diff_sum = 0.0
+        self.batches = 0
+        self.skipped_batches = 0
+        self.shadow_ms = 0.0
+
+    def start(self, batch_features):
+        """Begin scoring a batch (the same feature view the primary scores); None if skipped"""
+        if self.pending >= self.max_pending:
+            self.skipped_batches += 1
+            return None
+        self.pending += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self._predict, batch_features)
+        # Released when the shadow finishes, even if finish() is never reached
+        # (the primary predict raised, or the producer was cancelled mid-batch)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        self.pending -= 1
+        if not future.cancelled():
+            future.exception()  # Retrieved here so an abandoned failure isn't logged as unhandled
+
+    def _predict(self, batch_features):
+        started = time.perf_counter()
+        probs = self.loaded.model.predict_proba(batch_features)[:, 1]
+        return probs, (time.perf_counter() - started) * 1000
+
+    def finish(self, future, primary_probs, labels, threshold):
+        """Compare once the shadow result lands; returns immediately"""
+        if future is None:
+            return
+        task = asyncio.ensure_future(
+            self._compare(future, primary_probs, labels, threshold, self.generation))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _compare(self, future, primary_probs, labels, threshold, generation):
+        try:
+            shadow_probs, shadow_ms = await future
+        except Exception as e:
+            print(f"⚠️  Shadow scoring failed: {e}")
+            return
+        if generation != self.generation:
+            return
+
+        is_fraud = np.asarray(labels) == 1
+        self.primary.record(primary_probs, is_fraud, threshold)
+        self.shadow.record(shadow_probs, is_fraud, threshold)
+
+        primary_flags = primary_probs > threshold
+        shadow_flags = shadow_probs > threshold
+        primary_only = int(np.count_nonzero(primary_flags & ~shadow_flags))
+        shadow_only = int(np.count_nonzero(shadow_flags & ~primary_flags))
+        self.primary_only_flags += primary_only
+        self.shadow_only_flags += shadow_only
+        self.flag_disagreements += primary_only + shadow_only
+        self.abs_diff_sum += float(np.abs(primary_probs - shadow_probs).sum())
+        self.compared += len(primary_probs)
+        self.batches += 1
+        self.shadow_ms += shadow_ms
+
+    def snapshot(self):
+        """Payload for GET /api/shadow"""
+        compared = self.compared
+        return {
+            "enabled": True,
+            "since": self.started,
+            "compared_transactions": compared,
+            "compared_batches": self.batches,
+            "skipped_batches": self.skipped_batches,
+            "pending_batches": self.pending,
+            "shadow_batch_ms": round(self.shadow_ms / self.batches, 3) if self.batches else 0.0,
+            "disagreement": {
+                "flag_disagreements": self.flag_disagreements,
+                "flag_disagreement_rate": round(self.flag_disagreements / compared * 100, 3) if compared else 0.0,
+                "primary_only_flags": self.primary_only_flags,
+                "shadow_only_flags": self.shadow_only_flags,
+                "mean_abs_prob_diff": round(self.abs_diff_sum / compared, 6) if compared else 0.0
+            },
+            "primary": self.primary.snapshot(),
+            "shadow": self.shadow.snapshot()
+        }
+
+    async def drain(self):
+        """Wait for in-flight comparisons"""
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def close(self):
+        """Stop the shadow executor"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def load_shadow(model_version, primary_label, primary_version, model_engine="native", n_threads=1):
+    """Load a challenger version (blocking - run it in a thread)"""
+    return ShadowScorer(LoadedModel(model_version, model_engine, n_threads), primary_label, primary_version)
@@ -1,8 +1,8 @@
-import pandas as pd
 import numpy as np
 import time
 from datetime import datetime
-from model_utils import load_model_version, list_model_versions
+from model_utils import load_model_version, list_model_versions, load_demo_frame
+from batch_controller import BatchSizeController
 from collections import deque
 
 def convert_to_indian_rupees(amount):
@@ -25,9 +25,12 @@ class Colors:
     GRAY = "\033[90m"       # Dimmed text
 
 def live_fraud_demo(model, features, transaction_data, max_transactions=10000, 
-                   show_mode='all', threshold=0.063):
+                   show_mode='all', threshold=0.063, batch_size=1000, latency_target_ms=None):
     """
     OPTIMIZED Live fraud detection demo with batch processing
+    
+    Pass latency_target_ms to let the batch size adapt to a p99 latency target
+    (batch_size is then only the starting size).
     """
     print(f"\n{Colors.CYAN}{'='*70}{Colors.RESET}")
     print(f"{Colors.CYAN}🎯 LIVE FRAUD DETECTION DEMO (OPTIMIZED){Colors.RESET}")
@@ -52,7 +55,10 @@ def live_fraud_demo(model, features, transaction_data, max_transactions=10000,
     
     print(f"{Colors.CYAN}Processing {total_count:,} transactions{Colors.RESET}")
     print(f"{Colors.CYAN}Threshold: {threshold}{Colors.RESET}")
-    print(f"{Colors.CYAN}Batch size: 1000 transactions{Colors.RESET}")
+    if latency_target_ms:
+        print(f"{Colors.CYAN}Batch size: adaptive, starting at {batch_size} (p99 target {latency_target_ms} ms){Colors.RESET}")
+    else:
+        print(f"{Colors.CYAN}Batch size: {batch_size} transactions{Colors.RESET}")
     print(f"{Colors.CYAN}{'-'*70}{Colors.RESET}")
     
     # Legend
@@ -81,13 +87,17 @@ def live_fraud_demo(model, features, transaction_data, max_transactions=10000,
     start_time = time.perf_counter()
     
     # Process in batches for speed
-    batch_size = 1000
+    controller = None
+    if latency_target_ms:
+        controller = BatchSizeController(target_p99_ms=latency_target_ms, initial_size=batch_size)
     processed_count = 0
     
     print(f"{Colors.CYAN}🏃 Starting batch processing...{Colors.RESET}\n")
     
-    for batch_start in range(0, total_count, batch_size):
+    batch_start = 0
+    while batch_start < total_count:
         batch_end = min(batch_start + batch_size, total_count)
+        batch_started = time.perf_counter()
         
         # Get batch data
         batch_features = feature_matrix[batch_start:batch_end]
@@ -163,6 +173,11 @@ def live_fraud_demo(model, features, transaction_data, max_transactions=10000,
                 })
                 whites_shown += 1
         
+        # Let the controller pick the next batch size from this batch's latency
+        if controller:
+            batch_size = controller.record(batch_end - batch_start, time.perf_counter() - batch_started)
+        batch_start = batch_end
+        
         # Display progress and queued transactions
         progress = processed_count / total_count * 100
         bar_length = 40
@@ -234,7 +249,11 @@ def live_fraud_demo(model, features, transaction_data, max_transactions=10000,
     print(f"{Colors.CYAN}Threshold: {threshold}{Colors.RESET}")
     
     # Performance note
-    print(f"{Colors.GRAY}Note: Batch processing with size {batch_size}{Colors.RESET}")
+    if controller:
+        print(f"{Colors.GRAY}Note: Adaptive batch processing, settled at size {batch_size} "
+              f"(p99 {controller.last_p99_ms:.2f} ms vs {latency_target_ms} ms target){Colors.RESET}")
+    else:
+        print(f"{Colors.GRAY}Note: Batch processing with size {batch_size}{Colors.RESET}")
 
 def main():
     """Main function"""
@@ -263,8 +282,7 @@ def main():
     
     # Load demo data
     try:
-        demo_data_path = f"model_versions/{version_name}/demo_data.csv"
-        demo_data = pd.read_csv(demo_data_path)
+        demo_data = load_demo_frame(version_name)
         print(f"{Colors.CYAN}Available transactions: {len(demo_data):,}{Colors.RESET}")
     except Exception as e:
         print(f"{Colors.RED}❌ Error: {e}{Colors.RESET}")
@@ -0,0 +1,226 @@
+# telemetry.py - per-stage latency histograms, counters and gauges, exported in Prometheus text format
+import sys
+import time
+
+import numpy as np
+
+# HDR-style log-linear buckets over integer nanoseconds: exact below 2**SUB_BUCKET_BITS ns,
+# then each power of two is split into 2**SUB_BUCKET_BITS linear sub-buckets (~3% wide)
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HIGHEST_BITS = 37  # Values up to 2**37 ns (~137 s); longer ones land in the last bucket
+N_BUCKETS = (HIGHEST_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+
+def _bucket_bounds():
+    index = np.arange(N_BUCKETS, dtype=np.int64)
+    shift = np.maximum(index // SUB_BUCKETS - 1, 0)
+    sub = np.where(index < SUB_BUCKETS, index, index - shift * SUB_BUCKETS)
+    return sub << shift, (sub + 1) << shift
+
+
+BUCKET_LOWER_NS, BUCKET_UPPER_NS = _bucket_bounds()
+
+# Prometheus `le` boundaries (seconds) summed from the fine buckets at scrape time
+EXPORT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                  0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EXPORT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_index(ns):
+    """Fine bucket for a duration in integer nanoseconds (a few int ops, no logs or floats)"""
+    if ns < SUB_BUCKETS:
+        return ns if ns > 0 else 0
+    shift = ns.bit_length() - SUB_BUCKET_BITS - 1
+    index = (shift << SUB_BUCKET_BITS) + (ns >> shift)
+    return index if index < N_BUCKETS else N_BUCKETS - 1
+
+
+class _StageTimer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record_ns(time.perf_counter_ns() - self.started)
+        return False
+
+
+class LatencyHistogram:
+    """Fixed-size log-linear latency histogram: O(1) record, quantiles within ~3%"""
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS  # A list: += on an int is cheaper than on a numpy element
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+
+    def record_ns(self, ns):
+        self.counts[bucket_index(ns)] += 1
+        self.count += 1
+        self.sum_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def time(self):
+        """Context manager that records the wall time of its block"""
+        return _StageTimer(self)
+
+    def quantiles(self, qs=EXPORT_QUANTILES):
+        """Seconds at each quantile (bucket midpoints), 0.0 while empty"""
+        if self.count == 0:
+            return [0.0 for _ in qs]
+        cumulative = np.cumsum(np.array(self.counts, dtype=np.int64))
+        ranks = np.maximum(np.ceil(np.asarray(qs) * self.count), 1)
+        index = np.searchsorted(cumulative, ranks)
+        midpoints = (BUCKET_LOWER_NS[index] + BUCKET_UPPER_NS[index] - 1) / 2
+        return [min(float(v), self.max_ns) / 1e9 for v in midpoints]
+
+    def cumulative_counts(self, bounds_seconds=EXPORT_BUCKETS):
+        """Counts of observations <= each bound, to the fine bucket's resolution"""
+        cumulative = np.cumsum(np.array(self.counts, dtype=np.int64))
+        limits = np.searchsorted(BUCKET_UPPER_NS, np.asarray(bounds_seconds) * 1e9, side="right")
+        return [int(cumulative[i - 1]) if i > 0 else 0 for i in limits]
+
+    def snapshot(self):
+        p50, p90, p99, p999 = self.quantiles((0.5, 0.9, 0.99, 0.999))
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ns / self.count / 1e6, 4) if self.count else 0.0,
+            "p50_ms": round(p50 * 1000, 4),
+            "p90_ms": round(p90 * 1000, 4),
+            "p99_ms": round(p99 * 1000, 4),
+            "p999_ms": round(p999 * 1000, 4),
+            "max_ms": round(self.max_ns / 1e6, 4)
+        }
+
+
+def _labels(labels):
+    return ",".join(f'{k}="{v}"' for k, v in labels)
+
+
+class Telemetry:
+    """Process-wide metric registry: stage histograms, counters, and gauges read at scrape time"""
+
+    def __init__(self, prefix="fraud"):
+        self.prefix = prefix
+        self.histograms = {}  # (label pairs) -> LatencyHistogram, all under <prefix>_stage_seconds
+        self.counters = {}    # name -> {(label pairs): value}
+        self.gauges = {}      # name -> {(label pairs): callable}
+        self.help = {}
+
+    def histogram(self, stage, **labels):
+        """The histogram for one stage (create once, then hold on to it in hot paths)"""
+        key = tuple(sorted({"stage": stage, **labels}.items()))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        return histogram
+
+    def stage(self, stage, **labels):
+        """with telemetry.stage("predict", mode="real_model"): ..."""
+        return self.histogram(stage, **labels).time()
+
+    def describe(self, name, help_text, kind="counter"):
+        self.help[name] = (help_text, kind)
+
+    def inc(self, name, amount=1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + amount
+
+    def counter(self, name, read, help_text="", **labels):
+        """A counter whose value is read from elsewhere (e.g. an engine's total) at scrape time"""
+        self.gauge(name, read, help_text, **labels)
+        self.help[name] = (help_text, "counter")
+
+    def gauge(self, name, read, help_text="", **labels):
+        """Register a callable evaluated on every scrape"""
+        self.gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = read
+        self.help.setdefault(name, (help_text, "gauge"))
+
+    def snapshot(self):
+        """Per-stage latency summary for JSON endpoints"""
+        return {" ".join(f"{k}={v}" for k, v in key): h.snapshot() for key, h in sorted(self.histograms.items())}
+
+    def render(self):
+        """Everything in Prometheus text exposition format (0.0.4)"""
+        lines = []
+        name = f"{self.prefix}_stage_seconds"
+        if self.histograms:
+            lines += [f"# HELP {name} Wall time per pipeline stage",
+                      f"# TYPE {name} histogram"]
+            for key, histogram in sorted(self.histograms.items()):
+                labels = _labels(key)
+                for bound, count in zip(EXPORT_BUCKETS, histogram.cumulative_counts()):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum_ns / 1e9:.9f}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+            quantile_name = f"{self.prefix}_stage_quantile_seconds"
+            lines += [f"# HELP {quantile_name} Stage latency quantiles from the fine (~3%) buckets",
+                      f"# TYPE {quantile_name} gauge"]
+            for key, histogram in sorted(self.histograms.items()):
+                labels = _labels(key)
+                for q, value in zip(EXPORT_QUANTILES, histogram.quantiles()):
+                    lines.append(f'{quantile_name}{{{labels},quantile="{q}"}} {value:.9f}')
+
+        for metric, series in sorted(self.counters.items()):
+            full = f"{self.prefix}_{metric}"
+            lines += [f"# HELP {full} {self.help.get(metric, ('', ''))[0]}", f"# TYPE {full} counter"]
+            lines += [f"{full}{{{_labels(key)}}} {value}" if key else f"{full} {value}"
+                      for key, value in sorted(series.items())]
+
+        for metric, series in sorted(self.gauges.items()):
+            full = f"{self.prefix}_{metric}"
+            help_text, kind = self.help.get(metric, ("", "gauge"))
+            lines += [f"# HELP {full} {help_text}", f"# TYPE {full} {kind}"]
+            for key, read in sorted(series.items()):
+                try:
+                    value = float(read())
+                except Exception:
+                    continue  # A gauge whose source is gone just drops out of this scrape
+                lines.append(f"{full}{{{_labels(key)}}} {value:g}" if key else f"{full} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+_telemetry = None
+
+
+def get_telemetry():
+    """Process-wide telemetry instance"""
+    global _telemetry
+    if _telemetry is None:
+        _telemetry = Telemetry()
+    return _telemetry
+
+
+def benchmark(n=1_000_000):
+    histogram = LatencyHistogram()
+    start = time.perf_counter()
+    for ns in range(1000, 1000 + n):
+        histogram.record_ns(ns)
+    record_ns = (time.perf_counter() - start) / n * 1e9
+    start = time.perf_counter()
+    for _ in range(n // 10):
+        with histogram.time():
+            pass
+    timer_ns = (time.perf_counter() - start) / (n // 10) * 1e9
+    telemetry = Telemetry()
+    for stage in ("slice", "predict", "events", "encode", "send"):
+        telemetry.histogram(stage, mode="real_model").record_ns(1000)
+    start = time.perf_counter()
+    text = telemetry.render()
+    render_ms = (time.perf_counter() - start) * 1000
+    print(f"⚡ record_ns {record_ns:.0f} ns | timed block {timer_ns:.0f} ns | "
+          f"render 5 stages {render_ms:.2f} ms ({len(text):,} bytes)")
+
+
+if __name__ == "__main__":
+    # python telemetry.py [bench]  (accuracy tests: tests/test_telemetry.py)
+    benchmark()
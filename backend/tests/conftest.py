@@ -0,0 +1,13 @@
+# conftest.py - backend modules are flat and read model_versions/ relative to backend/
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(autouse=True)
+def backend_cwd(monkeypatch):
+    monkeypatch.chdir(BACKEND_DIR)
@@ -0,0 +1,134 @@
+# test_client_queue.py - overflow policies keep every flagged/missed event, count what they shed, honour the cap
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+import client_queue
+from client_queue import ClientOverflow, ClientQueue
+from event_stream import ALL_EVENTS, EventBatch
+from frame_codecs import EncodedFrame, negotiate_codec
+
+BATCH_ROWS = 100
+
+
+def _frame(batch, interesting_every=10):
+    """A published frame of BATCH_ROWS rows; every `interesting_every`-th row is a fraud (flagged or missed)"""
+    ids = np.arange(batch * BATCH_ROWS, (batch + 1) * BATCH_ROWS)
+    type_codes = np.zeros(BATCH_ROWS, dtype=np.int64)
+    if interesting_every:
+        type_codes[::interesting_every] = 3  # detected_fraud
+        type_codes[interesting_every // 2::interesting_every] = 2  # missed_fraud
+    flags = type_codes % 2 == 1
+    events = EventBatch(ids, np.full(BATCH_ROWS, 10.0), np.where(flags, 0.9, 0.01), flags, type_codes,
+                        "12:00:00", "XGBoost v5", batch)
+    return EncodedFrame({"type": "batch", "transactions": events, "stats": {"batch": batch},
+                         "batch_size": BATCH_ROWS})
+
+
+def _interesting_ids(frames):
+    return {f"TX-REAL-{i}" for frame in frames
+            for i in frame.frame["transactions"].interesting().ids.tolist()}
+
+
+def _drain(queue):
+    async def drain():
+        payloads = []
+        while len(queue):
+            payloads.append(json.loads(await queue.next_payload()))
+        return payloads
+    return asyncio.run(drain())
+
+
+def _received_ids(payloads):
+    return [tx["id"] for payload in payloads for tx in payload["transactions"]]
+
+
+@pytest.mark.parametrize("overflow", ["drop_oldest_legit", "coalesce"])
+@pytest.mark.parametrize("maxsize", [1, 4])
+def test_interesting_events_survive_overflow(overflow, maxsize):
+    queue = ClientQueue("real", negotiate_codec("json"), ALL_EVENTS, overflow=overflow, maxsize=maxsize)
+    frames = [_frame(b) for b in range(25)]
+    assert all(queue.offer(frame) for frame in frames)
+    assert len(queue) <= maxsize
+
+    payloads = _drain(queue)
+    received = _received_ids(payloads)
+    assert set(received) >= _interesting_ids(frames)
+    assert len(received) == len(set(received))  # Nothing delivered twice
+    assert received == sorted(received, key=lambda i: int(i.rsplit("-", 1)[1]))  # Oldest first
+    assert queue.interesting_lost == 0
+    # Every row is still accounted for in the counts, even the legitimate ones shed
+    assert sum(p["batch_size"] for p in payloads) == 25 * BATCH_ROWS
+    assert payloads[-1]["stats"] == {"batch": 24}
+
+
+def test_drop_oldest_legit_drops_frames_without_interesting_events_first():
+    queue = ClientQueue("real", negotiate_codec("json"), ALL_EVENTS, maxsize=3)
+    queue.offer(_frame(0))
+    queue.offer(_frame(1, interesting_every=0))
+    queue.offer(_frame(2))
+    queue.offer(_frame(3))
+
+    assert queue.frames_dropped == 1
+    assert queue.frames_degraded == 0
+    assert [p["stats"]["batch"] for p in _drain(queue)] == [0, 2, 3]
+
+
+def test_drop_oldest_legit_folds_when_every_frame_is_interesting():
+    queue = ClientQueue("real", negotiate_codec("json"), ALL_EVENTS, maxsize=2)
+    frames = [_frame(b) for b in range(3)]
+    for frame in frames:
+        queue.offer(frame)
+
+    assert queue.frames_dropped == 0
+    assert queue.frames_degraded == 1
+    folded, newest = _drain(queue)
+    assert folded["coalesced_frames"] == 2
+    assert folded["legitimate_count"] == 2 * 80 and folded["legitimate_sent"] == 0
+    assert set(_received_ids([folded])) == _interesting_ids(frames[:2])
+    assert len(newest["transactions"]) == BATCH_ROWS
+
+
+def test_overflow_counters_and_lag_increase():
+    queue = ClientQueue("real", negotiate_codec("json"), ALL_EVENTS, overflow="coalesce", maxsize=2)
+    for b in range(6):
+        queue.offer(_frame(b))
+    assert queue.frames_offered == 6
+    assert queue.frames_coalesced == 4
+    assert queue.oldest_age_ms() > 0
+
+    _drain(queue)
+    assert queue.max_lag_ms >= queue.last_lag_ms > 0
+    snapshot = queue.snapshot()
+    assert snapshot["frames_coalesced"] == 4 and snapshot["queued"] == 0
+
+
+def test_disconnect_policy_raises_for_the_sender():
+    queue = ClientQueue("real", negotiate_codec("json"), ALL_EVENTS, overflow="disconnect", maxsize=2)
+    assert queue.offer(_frame(0)) and queue.offer(_frame(1))
+    assert not queue.offer(_frame(2))
+    assert not queue.offer(_frame(3))  # Stays overflowed until the client reconnects
+    assert queue.frames_offered == 4
+
+    with pytest.raises(ClientOverflow):
+        asyncio.run(queue.next_payload())
+
+
+@pytest.mark.parametrize("overflow", ["drop_oldest_legit", "coalesce"])
+def test_merged_frames_respect_max_merged_events(monkeypatch, overflow):
+    monkeypatch.setattr(client_queue, "MAX_MERGED_EVENTS", 25)
+    queue = ClientQueue("real", negotiate_codec("json"), ALL_EVENTS, overflow=overflow, maxsize=1)
+    frames = [_frame(b) for b in range(5)]  # 20 interesting events each
+    for frame in frames:
+        queue.offer(frame)
+
+    (payload,) = _drain(queue)
+    received = _received_ids([payload])
+    assert len(received) == 25
+    assert queue.interesting_lost == 5 * 20 - 25
+    assert payload["interesting_lost"] == queue.interesting_lost
+    # The oldest are the ones cut
+    newest = sorted(_interesting_ids(frames), key=lambda i: int(i.rsplit("-", 1)[1]))[-25:]
+    assert received == newest
@@ -0,0 +1,60 @@
+# test_data_loader.py - chunked, column-projected and cached loads equal a plain read_csv + merge
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import (CACHE_DIR, IDENTITY_FILE, TRAINING_IDENTITY_COLUMNS, TRAINING_TRANSACTION_COLUMNS,
+                         TRANSACTION_FILE, load_transactions, write_synthetic_csvs)
+
+N_ROWS = 20_000
+CHUNK_ROWS = 7_000  # Not a divisor of N_ROWS: the last chunk is partial
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("ieee"))
+    write_synthetic_csvs(path, N_ROWS)
+    return path
+
+
+@pytest.fixture(scope="module")
+def expected(data_dir):
+    return pd.merge(pd.read_csv(os.path.join(data_dir, TRANSACTION_FILE), usecols=TRAINING_TRANSACTION_COLUMNS),
+                    pd.read_csv(os.path.join(data_dir, IDENTITY_FILE), usecols=["TransactionID", "DeviceType"]),
+                    on="TransactionID", how="left")[TRAINING_TRANSACTION_COLUMNS + TRAINING_IDENTITY_COLUMNS]
+
+
+def _assert_same_values(frame, expected):
+    assert list(frame.columns) == list(expected.columns)
+    assert len(frame) == len(expected)
+    for col in expected.columns:
+        if pd.api.types.is_numeric_dtype(expected[col]):
+            assert np.array_equal(frame[col].to_numpy(dtype=np.float64), expected[col].to_numpy(dtype=np.float64),
+                                  equal_nan=True), col
+        else:
+            assert np.array_equal(frame[col].astype(object).where(frame[col].notna(), None).to_numpy(),
+                                  expected[col].astype(object).where(expected[col].notna(), None).to_numpy()), col
+
+
+def test_fresh_then_cached_load_equals_read_csv(data_dir, expected):
+    cache_dir = os.path.join(data_dir, CACHE_DIR)
+    fresh = load_transactions(TRAINING_TRANSACTION_COLUMNS, TRAINING_IDENTITY_COLUMNS, data_dir=data_dir,
+                              cache_dir=cache_dir, chunk_rows=CHUNK_ROWS)
+    _assert_same_values(fresh, expected)
+    assert os.listdir(cache_dir)
+
+    cached = load_transactions(TRAINING_TRANSACTION_COLUMNS, TRAINING_IDENTITY_COLUMNS, data_dir=data_dir,
+                               cache_dir=cache_dir, chunk_rows=CHUNK_ROWS)
+    _assert_same_values(cached, expected)
+
+
+@pytest.mark.parametrize("stratify", [None, "isFraud"])
+def test_sample_in_file_order(data_dir, expected, stratify):
+    sample = load_transactions(TRAINING_TRANSACTION_COLUMNS, sample_rows=5_000, stratify=stratify,
+                               data_dir=data_dir, cache_dir=os.path.join(data_dir, CACHE_DIR), chunk_rows=CHUNK_ROWS)
+    assert len(sample) == 5_000
+    assert sample["TransactionID"].is_monotonic_increasing and sample["TransactionID"].is_unique
+    if stratify:
+        assert int(sample["isFraud"].sum()) == round(expected["isFraud"].mean() * 5_000)
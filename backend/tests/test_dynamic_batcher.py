@@ -0,0 +1,113 @@
+# test_dynamic_batcher.py - concurrent requests share predict calls and each gets back its own rows
+import asyncio
+import time
+
+import numpy as np
+
+from dynamic_batcher import DynamicBatcher
+
+
+class StubScorer:
+    """Returns each row's first column as its 'probability', and records every call's size"""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, matrix):
+        self.calls.append(len(matrix))
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("model exploded")
+        return np.asarray(matrix, dtype=float)[:, 0].copy()
+
+
+def _requests(sizes):
+    """Feature matrices whose first column is a globally unique row id"""
+    requests, next_id = [], 0
+    for n in sizes:
+        requests.append(np.column_stack([np.arange(next_id, next_id + n, dtype=float), np.zeros(n)]))
+        next_id += n
+    return requests
+
+
+async def _submit_all(batcher, requests):
+    batcher.start()
+    try:
+        return await asyncio.gather(*(batcher.submit(rows) for rows in requests))
+    finally:
+        await batcher.stop()
+
+
+def test_concurrent_requests_coalesce_into_one_call():
+    scorer = StubScorer()
+    batcher = DynamicBatcher(scorer, max_batch_size=1024, max_wait_us=50_000)
+    requests = _requests([1, 5, 3, 40, 1, 7, 2, 100, 1, 9])
+    results = asyncio.run(_submit_all(batcher, requests))
+
+    assert scorer.calls == [sum(len(r) for r in requests)]
+    for rows, probs in zip(requests, results):
+        np.testing.assert_array_equal(probs, rows[:, 0])  # Exactly its own rows, in order
+    assert batcher.snapshot()["batches"] == 1 and batcher.snapshot()["requests"] == len(requests)
+
+
+def test_batches_split_at_max_batch_size_without_splitting_requests():
+    scorer = StubScorer()
+    batcher = DynamicBatcher(scorer, max_batch_size=64, max_wait_us=50_000)
+    sizes = [30, 30, 30, 10, 200, 5]  # 200 is larger than a batch: it goes alone
+    requests = _requests(sizes)
+    results = asyncio.run(_submit_all(batcher, requests))
+
+    assert sum(scorer.calls) == sum(sizes)
+    assert all(n <= 64 or n == 200 for n in scorer.calls)
+    for rows, probs in zip(requests, results):
+        np.testing.assert_array_equal(probs, rows[:, 0])
+    assert batcher.largest_batch == 200
+
+
+def test_lone_request_flushes_after_max_wait():
+    scorer = StubScorer()
+    batcher = DynamicBatcher(scorer, max_batch_size=1024, max_wait_us=20_000)
+
+    async def run():
+        batcher.start()
+        started = time.perf_counter()
+        probs = await batcher.submit(_requests([3])[0])
+        elapsed = time.perf_counter() - started
+        await batcher.stop()
+        return probs, elapsed
+
+    probs, elapsed = asyncio.run(run())
+    np.testing.assert_array_equal(probs, [0.0, 1.0, 2.0])
+    assert 0.015 <= elapsed < 1.0  # Waited for company, then went alone
+    assert scorer.calls == [3]
+
+
+def test_full_batch_does_not_wait():
+    scorer = StubScorer()
+    batcher = DynamicBatcher(scorer, max_batch_size=8, max_wait_us=5_000_000)
+
+    async def run():
+        batcher.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(batcher.submit(rows) for rows in _requests([4, 4])))
+        elapsed = time.perf_counter() - started
+        await batcher.stop()
+        return elapsed
+
+    assert asyncio.run(run()) < 1.0
+    assert scorer.calls == [8]
+
+
+def test_scoring_error_reaches_every_caller_in_the_batch():
+    batcher = DynamicBatcher(StubScorer(fail=True), max_batch_size=1024, max_wait_us=20_000)
+
+    async def run():
+        batcher.start()
+        results = await asyncio.gather(*(batcher.submit(rows) for rows in _requests([2, 3])),
+                                       return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,85 @@
+# test_event_stream.py - subscription views drop only legitimate rows; the hash sample is stable per id
+import numpy as np
+import pytest
+
+from event_stream import ALL_EVENTS, EventBatch, frame_view, is_sampled, negotiate_subscription, sample_mask
+
+INTERESTING = negotiate_subscription("interesting")
+
+
+def _batch(n=5_000, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1_000_000, 1_000_000 + n)
+    type_codes = rng.choice(4, size=n, p=[0.9, 0.05, 0.02, 0.03])
+    flags = type_codes % 2 == 1
+    return EventBatch(ids, rng.random(n) * 500, np.where(flags, 0.8, 0.02), flags, type_codes,
+                      "12:00:00", "XGBoost v5", 7)
+
+
+def _frames(batch):
+    """The same rows as a columnar frame (real model) and as a list of event dicts (simulation)"""
+    return [{"type": "batch", "transactions": batch, "batch_size": len(batch)},
+            {"type": "batch", "transactions": batch.to_events(), "batch_size": len(batch)}]
+
+
+@pytest.mark.parametrize("columnar", [True, False])
+def test_interesting_view_drops_only_legitimate_unflagged_rows(columnar):
+    batch = _batch()
+    events = batch.to_events()
+    frame = _frames(batch)[0 if columnar else 1]
+    view = frame_view(frame, INTERESTING)
+    kept = view["transactions"].to_events() if columnar else view["transactions"]
+
+    expected = [tx for tx in events if tx["type"] != "legitimate"]
+    assert kept == expected
+    assert all(tx["is_flagged"] or tx["type"] == "missed_fraud" for tx in kept)
+    assert not any(tx["type"] == "legitimate" and tx["is_flagged"] for tx in events)
+    assert view["legitimate_count"] == sum(tx["type"] == "legitimate" for tx in events)
+    assert view["legitimate_sent"] == 0
+    assert view["stream"] == "interesting" and view["batch_size"] == len(batch)
+
+
+def test_all_view_is_the_frame_unchanged():
+    frame = _frames(_batch())[0]
+    assert frame_view(frame, ALL_EVENTS) is frame
+
+
+@pytest.mark.parametrize("columnar", [True, False])
+def test_sampled_view_adds_legitimate_rows_by_id_hash(columnar):
+    batch = _batch()
+    events = batch.to_events()
+    subscription = negotiate_subscription("sampled", 0.1)
+    view = frame_view(_frames(batch)[0 if columnar else 1], subscription)
+    kept = view["transactions"].to_events() if columnar else view["transactions"]
+
+    legit_kept = [tx for tx in kept if tx["type"] == "legitimate"]
+    assert [tx for tx in kept if tx["type"] != "legitimate"] == [tx for tx in events if tx["type"] != "legitimate"]
+    assert all(is_sampled(int(tx["id"].rsplit("-", 1)[1]), 0.1) for tx in legit_kept)
+    assert view["legitimate_sent"] == len(legit_kept)
+    assert view["sample_rate"] == 0.1
+
+
+def test_hash_sample_is_deterministic_and_matches_the_rate():
+    ids = np.arange(10_000_000, 10_200_000)
+    for rate in (0.001, 0.01, 0.1, 0.5):
+        mask = sample_mask(ids, rate)
+        assert np.array_equal(mask, sample_mask(ids.copy(), rate))
+        assert mask.mean() == pytest.approx(rate, rel=0.05)
+    # Nested: a lower rate's sample is a subset of a higher rate's
+    assert not np.any(sample_mask(ids, 0.01) & ~sample_mask(ids, 0.1))
+    # Whatever batch an id arrives in, it gets the same answer
+    assert np.array_equal(sample_mask(ids[::7], 0.1), sample_mask(ids, 0.1)[::7])
+
+
+def test_sample_mask_agrees_with_is_sampled():
+    ids = np.r_[0, 1, np.arange(590_000, 592_000), 2 ** 40 + 12345]
+    for rate in (0.0, 0.01, 0.25, 1.0):
+        assert sample_mask(ids, rate).tolist() == [is_sampled(int(i), rate) for i in ids]
+
+
+def test_negotiate_subscription_clamps_and_falls_back():
+    assert negotiate_subscription("bogus").stream == "all"
+    assert negotiate_subscription("SAMPLED").sample_rate == 0.01
+    assert negotiate_subscription("sampled", 5).sample_rate == 1.0
+    assert negotiate_subscription("sampled", -1).sample_rate == 0.0
+    assert negotiate_subscription("interesting", 0.5).sample_rate is None
@@ -0,0 +1,70 @@
+# test_feature_cache.py - hits return exactly what a fresh build does; keys follow inputs, parameters and code
+import os
+import shutil
+
+import pytest
+
+import feature_cache
+from data_loader import IDENTITY_FILE, write_synthetic_csvs
+from feature_cache import FEATURE_CACHE_DIR, cache_stats, evict, load_feature_matrix
+
+N_ROWS = 8_000
+
+
+@pytest.fixture(scope="module")
+def csvs(tmp_path_factory):
+    return write_synthetic_csvs(str(tmp_path_factory.mktemp("ieee")), N_ROWS)
+
+
+@pytest.fixture
+def data_dir(csvs, tmp_path):
+    """A private copy per test: tests add cache entries and edit the inputs"""
+    for path in csvs:
+        shutil.copy(path, tmp_path)
+    return str(tmp_path)
+
+
+def _cache_dir(data_dir):
+    return os.path.join(data_dir, FEATURE_CACHE_DIR)
+
+
+def test_hit_equals_fresh_build(data_dir):
+    cache_dir = _cache_dir(data_dir)
+    X1, y1 = load_feature_matrix(data_dir=data_dir, cache_dir=cache_dir)
+    X2, y2, dt = load_feature_matrix(data_dir=data_dir, cache_dir=cache_dir, with_time=True)
+    assert X1.equals(X2) and y1.equals(y2)
+    assert list(X1.dtypes) == list(X2.dtypes)
+    # TransactionDT is kept alongside, aligned with X and in time order
+    assert len(dt) == len(X2) and (dt.diff().dropna() >= 0).all()
+
+    stats = cache_stats(cache_dir)
+    assert stats["entries"] == 1 and stats["total_hits"] == 1
+    assert stats["items"][0]["features"] == len(X1.columns)
+
+
+def test_quantile_method_gets_its_own_key(data_dir):
+    cache_dir = _cache_dir(data_dir)
+    load_feature_matrix(data_dir=data_dir, cache_dir=cache_dir, quantile_method="sketch")
+    load_feature_matrix(data_dir=data_dir, cache_dir=cache_dir, quantile_method="exact")
+    stats = cache_stats(cache_dir)
+    assert stats["entries"] == 2 and stats["total_hits"] == 0
+
+
+def test_changed_input_makes_entries_stale(data_dir):
+    cache_dir = _cache_dir(data_dir)
+    load_feature_matrix(data_dir=data_dir, cache_dir=cache_dir)
+    with open(os.path.join(data_dir, IDENTITY_FILE), "a") as f:
+        f.write("\n")
+    assert cache_stats(cache_dir)["stale_entries"] == 1
+    assert [reason for _, reason in evict(cache_dir)] == [f"{IDENTITY_FILE} changed"]
+
+
+def test_code_change_invalidates(data_dir, monkeypatch):
+    cache_dir = _cache_dir(data_dir)
+    load_feature_matrix(data_dir=data_dir, cache_dir=cache_dir)
+    monkeypatch.setattr(feature_cache, "code_version", lambda: "edited-feature-code")
+    load_feature_matrix(data_dir=data_dir, cache_dir=cache_dir)  # Miss: a new key under the new code
+    stats = cache_stats(cache_dir)
+    # The old entry can never be hit again, so the miss evicted it
+    assert stats["entries"] == 1 and stats["total_hits"] == 0
+    assert stats["items"][0]["stale"] is None
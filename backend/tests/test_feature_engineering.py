@@ -0,0 +1,19 @@
+# test_feature_engineering.py - the vectorized features must equal the per-card reference exactly
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_engineering import (add_time_features, create_real_time_features,
+                                 create_real_time_features_reference, make_synthetic_transactions)
+
+SEED = 42
+
+
+# Few, mid-sized and many-tiny cards (mode ties everywhere)
+@pytest.mark.parametrize("n_rows,n_cards", [(20_000, 50), (50_000, 2_000), (30_000, 20_000)])
+def test_vectorized_matches_reference(n_rows, n_cards):
+    raw = add_time_features(make_synthetic_transactions(n_rows, n_cards=n_cards, seed=SEED))
+    raw.loc[raw.sample(50, random_state=SEED).index, 'card1'] = np.nan  # Cards with no card1
+    reference = create_real_time_features_reference(raw.copy())
+    vectorized = create_real_time_features(raw.copy())
+    pd.testing.assert_frame_equal(vectorized, reference, check_exact=True)
@@ -0,0 +1,74 @@
+# test_feature_store.py - CardFeatureStore must match the batch features in feature_engineering.py
+import numpy as np
+import pytest
+
+from feature_engineering import add_time_features, create_real_time_features, make_synthetic_transactions
+from feature_store import STORE_FEATURES, CardFeatureStore
+
+N_ROWS = 5000
+PREFIXES = 20
+SEED = 42
+
+
+def _max_difference(online, batch):
+    """Largest |online - batch| where NaNs must line up"""
+    online = np.asarray(online, dtype=float)
+    batch = np.asarray(batch, dtype=float)
+    if not np.array_equal(np.isnan(online), np.isnan(batch)):
+        return float("inf")
+    both = ~np.isnan(online)
+    return float(np.abs(online[both] - batch[both]).max()) if both.any() else 0.0
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return make_synthetic_transactions(N_ROWS, n_cards=N_ROWS // 10, seed=SEED)  # Few tx per card -> many mode ties
+
+
+def _stream(raw, quantile_method):
+    batch = create_real_time_features(add_time_features(raw.copy()), quantile_method=quantile_method)
+    transactions = batch[["TransactionID", "TransactionDT", "card1", "TransactionAmt", "ProductCD"]].to_dict("records")
+    store = CardFeatureStore(quantile_method=quantile_method)
+    online = [store.update(tx) for tx in transactions]
+    return batch, transactions, store, online
+
+
+@pytest.mark.parametrize("quantile_method", ["exact", "sketch"])
+def test_whole_history_matches_batch(raw, quantile_method):
+    """After streaming every row, card_features() equals the batch features
+    (time_since_last_tx is causal in both, so it is compared online)"""
+    batch, transactions, store, online = _stream(raw, quantile_method)
+    end_of_stream = [store.card_features(tx) for tx in transactions]
+    for name in STORE_FEATURES:
+        source = online if name == "time_since_last_tx" else end_of_stream
+        assert _max_difference([f[name] for f in source], batch[name]) <= 1e-12, name
+
+
+@pytest.mark.parametrize("quantile_method", ["exact", "sketch"])
+def test_online_features_are_causal(raw, quantile_method):
+    """Row k's online features equal the batch features of the last row when the batch only sees rows 0..k"""
+    _, _, _, online = _stream(raw, quantile_method)
+    rng = np.random.default_rng(SEED)
+    for k in sorted(rng.choice(np.arange(1, N_ROWS), size=PREFIXES, replace=False)):
+        prefix = create_real_time_features(add_time_features(raw.iloc[:k + 1].copy()),
+                                           quantile_method=quantile_method).iloc[-1]
+        for name in STORE_FEATURES:
+            assert _max_difference([online[k][name]], [prefix[name]]) <= 1e-12, \
+                f"row {k} {name}: online {online[k][name]} vs batch {prefix[name]}"
+
+
+def test_sketch_error_within_bound():
+    """Sketch median/95th stay within the sketch's relative accuracy of exact, for every card"""
+    transactions = make_synthetic_transactions(100_000, n_cards=2000, seed=SEED).to_dict("records")
+    sketch = CardFeatureStore(quantile_method="sketch")
+    exact = CardFeatureStore(quantile_method="exact")
+    for tx in transactions:
+        sketch.update(tx)
+        exact.update(tx)
+
+    for q in (0.5, 0.95):
+        worst = max(
+            abs(sketch.cards[card].amounts.quantile(q) - state.amounts.quantile(q)) / state.amounts.quantile(q)
+            for card, state in exact.cards.items()
+        )
+        assert worst <= sketch.relative_accuracy + 1e-12, f"q={q}: max relative error {worst:.4%}"
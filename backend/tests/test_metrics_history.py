@@ -0,0 +1,37 @@
+# test_metrics_history.py - rolled-up windows and history equal sums over the raw batch log
+import numpy as np
+import pytest
+
+from metrics_history import RESOLUTIONS, WINDOWS_SECONDS, MetricsHistory
+
+
+@pytest.fixture(scope="module")
+def recorded():
+    """Random batches over ~3 simulated hours"""
+    rng = np.random.default_rng(42)
+    metrics = MetricsHistory()
+    times = np.sort(1_700_000_000.0 + rng.random(20_000) * 3 * 3600)
+    sizes = rng.integers(1, 500, len(times))
+    detected = rng.binomial(sizes, 0.01)
+    for ts, n, d in zip(times, sizes, detected):
+        metrics.record(int(n), int(d), 0, 0, 1.0, timestamp=ts)
+    return metrics, times, sizes, detected, times[-1] + 0.5
+
+
+def test_sliding_windows_match_raw_log(recorded):
+    metrics, times, sizes, detected, now = recorded
+    end = np.floor(now)
+    for seconds, window in zip(WINDOWS_SECONDS, metrics.sliding_windows(now).values()):
+        mask = (times >= end - seconds) & (times < end)
+        assert window["transactions"] == int(sizes[mask].sum()), seconds
+        assert window["fraud_detected"] == int(detected[mask].sum()), seconds
+
+
+@pytest.mark.parametrize("name,bucket_seconds,slots", RESOLUTIONS)
+def test_history_buckets_match_raw_log(recorded, name, bucket_seconds, slots):
+    metrics, times, sizes, _, now = recorded
+    history = metrics.history(name, points=slots, now=now)["columns"]
+    assert len(history["timestamp"]) > 0
+    for bucket_start, total in zip(history["timestamp"], history["transactions"]):
+        mask = (times >= bucket_start) & (times < bucket_start + bucket_seconds)
+        assert total == int(sizes[mask].sum()), bucket_start
@@ -0,0 +1,37 @@
+# test_model_registry.py - the cached index follows changes inside version directories
+import json
+import os
+
+from model_registry import ModelRegistry
+
+
+def _registry(tmp_path):
+    return ModelRegistry(str(tmp_path / "model_versions"), str(tmp_path / "registry.json"), str(tmp_path / "registry.lock"))
+
+
+def _write_version(root, version, model_files=()):
+    os.makedirs(root / version)
+    for name in model_files:
+        (root / version / name).touch()
+    (root / version / "version_info.json").write_text(json.dumps({"model_type": "xg", "performance": 0.9}))
+
+
+def test_lookups_are_cached(tmp_path):
+    _write_version(tmp_path / "model_versions", "v1_xg_1", ["model.joblib"])
+    registry = _registry(tmp_path)
+    assert registry.get("v1_xg_1")["model_files"] == ["model.joblib"]
+    assert registry.get("v1_xg_1") is not None
+    assert registry.scans == 1
+
+
+def test_model_file_added_to_version_dir_is_seen(tmp_path):
+    root = tmp_path / "model_versions"
+    _write_version(root, "v1_xg_1", ["model.joblib"])
+    registry = _registry(tmp_path)
+    assert registry.get("v1_xg_1")["model_files"] == ["model.joblib"]
+
+    (root / "v1_xg_1" / "model.ubj").touch()  # What migrate_model_artifacts does
+    os.utime(root / "v1_xg_1", ns=(0, os.stat(root).st_mtime_ns + 10**9))
+    assert registry.get("v1_xg_1")["model_files"] == ["model.ubj", "model.joblib"]
+    # Another process picks the rescan up from the manifest
+    assert _registry(tmp_path).get("v1_xg_1")["model_files"] == ["model.ubj", "model.joblib"]
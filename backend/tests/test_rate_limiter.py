@@ -0,0 +1,55 @@
+# test_rate_limiter.py - token bucket pacing on a simulated clock
+import random
+
+import pytest
+
+from rate_limiter import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_irregular_batches_average_the_target():
+    """Irregular batch sizes and mid-run rate changes still average each target within 1%"""
+    rng = random.Random(42)
+    clock = FakeClock()
+    bucket = TokenBucket(2000, clock=clock)
+    for rate in (2000, 500, 50_000):
+        bucket.set_rate(rate)
+        start, rows = clock.now, 0
+        while clock.now - start < 30.0:
+            clock.now += bucket.delay()
+            n = rng.randint(1, bucket.max_batch())
+            bucket.consume(n)
+            rows += n
+            clock.now += rng.uniform(0, 0.5) * n / rate  # Producing takes some of the budget
+        assert rows / (clock.now - start) == pytest.approx(rate, rel=0.01)
+
+
+def test_max_batch_is_burst_capacity():
+    bucket = TokenBucket(20_000, burst_seconds=0.1, clock=FakeClock())
+    assert bucket.max_batch() == 2000
+    bucket.set_rate(5)
+    assert bucket.max_batch() == 1  # Never below one row
+
+
+def test_unlimited_never_waits():
+    clock = FakeClock()
+    bucket = TokenBucket(None, clock=clock)
+    bucket.consume(1_000_000)
+    assert bucket.delay() == 0.0 and bucket.max_batch() is None
+    assert bucket.rows == 1_000_000
+
+
+def test_debt_becomes_the_wait():
+    clock = FakeClock()
+    bucket = TokenBucket(100, clock=clock)
+    bucket.consume(50)  # Empty bucket, 50 rows in debt at 100/s
+    assert bucket.delay() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.delay() == 0.0
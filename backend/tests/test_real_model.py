@@ -0,0 +1,114 @@
+# test_real_model.py - vectorized batch scoring and hot swaps against the per-row reference
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from real_model import DEFAULT_MODEL_VERSION, RealFraudEngine
+
+SWAP_VERSION = "v3_xg_20251109_033903"
+THRESHOLD = 0.063
+
+
+def _per_row_reference(engine, batch_size, n_batches, threshold=THRESHOLD):
+    """The original process_batch loop: one row at a time, counters and rates updated per event"""
+    loaded = engine.loaded
+    stats = {"total_processed": 0, "fraud_detected": 0, "missed_fraud": 0, "false_alarms": 0,
+             "detection_rate": 0.0, "alert_rate": 0.0}
+    events, buffer, current = [], [], 0
+    for _ in range(n_batches):
+        if current >= loaded.demo_rows:
+            current = 0
+        end = min(current + batch_size, loaded.demo_rows)
+        probs = loaded.model.predict_proba(loaded.feature_matrix[current:end])[:, 1]
+        for i, fraud_prob in enumerate(probs):
+            stats["total_processed"] += 1
+            is_flagged = fraud_prob > threshold
+            if loaded.labels[current + i] == 1:
+                event_type = "detected_fraud" if is_flagged else "missed_fraud"
+                stats["fraud_detected" if is_flagged else "missed_fraud"] += 1
+            else:
+                event_type = "false_alarm" if is_flagged else "legitimate"
+                if is_flagged:
+                    stats["false_alarms"] += 1
+            total_frauds = stats["fraud_detected"] + stats["missed_fraud"]
+            if total_frauds > 0:
+                stats["detection_rate"] = stats["fraud_detected"] / total_frauds * 100
+            stats["alert_rate"] = (stats["fraud_detected"] + stats["false_alarms"]) / stats["total_processed"] * 100
+            event = {
+                "id": f"TX-REAL-{stats['total_processed']}",
+                "amount": float(loaded.amounts[current + i]),
+                "fraud_prob": float(fraud_prob),
+                "is_flagged": bool(is_flagged),
+                "type": event_type,
+                "interesting": event_type != "legitimate",
+                "model": loaded.label,
+                "batch": current // batch_size
+            }
+            if event["interesting"]:
+                buffer.append(event)
+            events.append(event)
+        current = end
+    return events, buffer[-100:], stats
+
+
+def _without_timestamp(events):
+    return [{k: v for k, v in e.items() if k != "timestamp"} for e in events]
+
+
+@pytest.fixture
+def engine():
+    engine = RealFraudEngine(DEFAULT_MODEL_VERSION, executor="thread")
+    yield engine
+    engine.close()
+
+
+def test_vectorized_batches_match_per_row_loop(engine):
+    batch_size, n_batches = 700, 16  # Wraps past the end of the 10k demo rows
+    expected_events, expected_buffer, expected_stats = _per_row_reference(engine, batch_size, n_batches)
+
+    async def run():
+        return [await engine.process_batch(batch_size, THRESHOLD) for _ in range(n_batches)]
+
+    batches = asyncio.run(run())
+    events = [event for batch in batches for event in batch.to_events()]
+    assert _without_timestamp(events) == expected_events
+    assert _without_timestamp(engine.event_buffer) == expected_buffer
+    for key, value in expected_stats.items():
+        assert engine.stats[key] == pytest.approx(value, rel=1e-12), key
+
+
+def test_swap_between_batches_keeps_in_flight_batch_on_old_model(engine):
+    old = engine.loaded
+    old_probs = old.model.predict_proba(old.feature_matrix[:500])[:, 1]
+    release = threading.Event()
+    predict_proba = old.model.predict_proba
+
+    def held_predict_proba(X):
+        release.wait(30)
+        return predict_proba(X)
+
+    old.model.predict_proba = held_predict_proba
+
+    async def run():
+        in_flight = asyncio.ensure_future(engine.process_batch(500, THRESHOLD))
+        while engine.inference_in_flight == 0:  # The batch is now inside predict on the old model
+            await asyncio.sleep(0.01)
+        swap = await engine.swap_model(SWAP_VERSION, warmup_passes=1)
+        assert engine.model_version == SWAP_VERSION and not in_flight.done()
+        release.set()
+        return swap, await in_flight, await engine.process_batch(500, THRESHOLD)
+
+    swap, before, after = asyncio.run(run())
+    new = engine.loaded
+    assert swap["previous"] == old.label and swap["model"] == new.label
+
+    # The in-flight batch finished on the model (and demo rows) it started with
+    assert before.model == old.label
+    np.testing.assert_array_equal(before.probs, old_probs)
+    # The next batch is the new model from the start of its own demo stream
+    assert after.model == new.label
+    np.testing.assert_array_equal(after.probs, new.model.predict_proba(new.feature_matrix[:500])[:, 1])
+    np.testing.assert_array_equal(after.ids, np.arange(501, 1001))  # Nothing dropped or counted twice
+    assert engine.stats["total_processed"] == 1000
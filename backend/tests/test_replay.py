@@ -0,0 +1,80 @@
+# test_replay.py - TransactionDT schedule on a simulated clock, speed parsing and CSV source validation
+import numpy as np
+import pytest
+
+from replay import DEFAULT_TICK, ReplaySchedule, ReplaySource, parse_speed, replay_csv_path
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(scope="module")
+def bursty_source():
+    rng = np.random.default_rng(42)
+    n = 5_000
+    dt = 86400 + np.cumsum(rng.exponential(30.0, n))  # Bursty: exponential gaps, ~30 s apart
+    return ReplaySource(np.zeros((n, 1)), np.zeros(n), np.zeros(n), rng.permutation(dt), "synthetic")
+
+
+def test_source_is_sorted_by_time(bursty_source):
+    assert np.all(np.diff(bursty_source.offsets) >= 0)
+    assert bursty_source.offsets[0] == 0.0
+
+
+@pytest.mark.parametrize("speed", [1.0, 100.0, 10_000.0])
+def test_every_row_in_order_and_on_time(bursty_source, speed):
+    clock = FakeClock()
+    schedule = ReplaySchedule(bursty_source, speed, clock=clock)
+    sent, late = 0, 0.0
+    while schedule.passes == 0:
+        clock.now += schedule.delay()
+        k = schedule.max_batch()
+        late = max(late, clock.now - schedule.started - schedule._due(schedule.cursor))
+        schedule.consume(k)
+        sent += k
+    assert sent == len(bursty_source)
+    assert late <= DEFAULT_TICK + 1e-9
+    elapsed = clock.now - schedule.started
+    assert elapsed == pytest.approx(bursty_source.span_seconds() / speed, abs=DEFAULT_TICK + 1e-9)
+
+
+def test_falling_behind_rebases_instead_of_bursting():
+    n = 100
+    source = ReplaySource(np.zeros((n, 1)), np.zeros(n), np.zeros(n), np.arange(n, dtype=float), "steady")
+    clock = FakeClock()
+    schedule = ReplaySchedule(source, 1.0, clock=clock)
+    schedule.consume(schedule.max_batch())
+    clock.now += 60.0  # Paused for a minute
+    assert schedule.delay() == 0.0
+    assert schedule.rebases == 1
+    assert schedule.max_batch() == 1  # Only the next row is due, not a minute of backlog
+
+
+def test_uniform_pacing_without_transactiondt():
+    source = ReplaySource(np.zeros((10, 1)), np.zeros(10), np.zeros(10), None, "untimed", uniform_rate=5.0)
+    assert source.timing == "uniform 5/s"
+    assert source.span_seconds() == pytest.approx(9 / 5.0)
+
+
+@pytest.mark.parametrize("text,expected", [("1x", 1.0), ("100x", 100.0), ("2.5", 2.5), ("max", float("inf"))])
+def test_parse_speed(text, expected):
+    assert parse_speed(text) == expected
+
+
+@pytest.mark.parametrize("text", ["fast", "-1x", "0x"])
+def test_parse_speed_rejects(text):
+    with pytest.raises(ValueError):
+        parse_speed(text)
+
+
+def test_csv_sources_are_bare_names_in_the_replay_dir(tmp_path):
+    (tmp_path / "day1.csv").write_text("TransactionAmt\n1.0\n")
+    assert replay_csv_path("day1.csv", str(tmp_path)) == str(tmp_path / "day1.csv")
+    for name in ("../day1.csv", "/etc/passwd.csv", str(tmp_path / "day1.csv"), "missing.csv", "day1.txt", ".."):
+        with pytest.raises(ValueError):
+            replay_csv_path(name, str(tmp_path))
@@ -0,0 +1,30 @@
+# test_score_window.py - recounts over the window agree with live flagging
+import numpy as np
+
+from score_window import ScoreWindow
+
+
+def test_counts_match_serving_near_threshold():
+    threshold = 0.063
+    # Within float32 rounding of the threshold: a float32 window would flag the ones just below it
+    probs = threshold + np.array([-1e-9, -1e-12, 0.0, 1e-12, 1e-9])
+    labels = np.array([1, 0, 1, 0, 1], dtype=np.int8)
+    window = ScoreWindow(capacity=16)
+    window.append(probs, labels)
+
+    flagged = probs > threshold  # What serving does with the float64 probabilities
+    assert window.counts(threshold) == {
+        "rows": 5,
+        "fraud_detected": int((flagged & (labels == 1)).sum()),
+        "missed_fraud": int((~flagged & (labels == 1)).sum()),
+        "false_alarms": int((flagged & (labels == 0)).sum()),
+    }
+
+
+def test_wraps_to_newest_rows():
+    window = ScoreWindow(capacity=4)
+    for start in range(0, 10, 3):
+        window.append(np.arange(start, start + 3) / 10.0, np.zeros(3, dtype=np.int8))
+    probs, _ = window.snapshot()
+    assert sorted(probs) == [0.8, 0.9, 1.0, 1.1]
+    assert window.total == 12
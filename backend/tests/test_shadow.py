@@ -0,0 +1,49 @@
+# test_shadow.py - shadow scoring never stops because primary batches were abandoned
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+
+from shadow import ShadowScorer
+
+
+class _StubModel:
+    def predict_proba(self, X):
+        p = np.asarray(X, dtype=float)[:, 0]
+        return np.column_stack([1 - p, p])
+
+
+def _scorer(max_pending=2):
+    loaded = SimpleNamespace(label="Stub v2", version="v2_stub", model=_StubModel())
+    return ShadowScorer(loaded, "Stub v1", "v1_stub", max_pending=max_pending)
+
+
+def test_pending_released_when_finish_is_never_reached():
+    async def run():
+        shadow = _scorer()
+        for _ in range(5):  # More than max_pending primary batches that raised or were cancelled
+            future = shadow.start(np.full((3, 1), 0.5))
+            assert future is not None
+            await future
+        assert shadow.pending == 0 and shadow.skipped_batches == 0
+
+        X, labels = np.array([[0.2], [0.9]]), np.array([0, 1])
+        shadow.finish(shadow.start(X), np.array([0.3, 0.8]), labels, 0.5)
+        await asyncio.gather(*shadow.tasks)
+        return shadow
+
+    shadow = asyncio.run(run())
+    assert shadow.batches == 1 and shadow.compared == 2 and shadow.flag_disagreements == 0
+    assert shadow.pending == 0
+
+
+def test_skips_while_shadow_is_behind():
+    async def run():
+        shadow = _scorer(max_pending=1)
+        first = shadow.start(np.zeros((1, 1)))
+        assert shadow.start(np.zeros((1, 1))) is None
+        await first
+        return shadow
+
+    shadow = asyncio.run(run())
+    assert shadow.skipped_batches == 1 and shadow.pending == 0
@@ -0,0 +1,42 @@
+# test_telemetry.py - histogram quantiles and Prometheus buckets against exact values
+import numpy as np
+import pytest
+
+from telemetry import EXPORT_BUCKETS, SUB_BUCKETS, LatencyHistogram, Telemetry
+
+N = 200_000
+
+
+@pytest.fixture(scope="module")
+def latencies():
+    rng = np.random.default_rng(42)
+    samples = np.maximum(rng.lognormal(np.log(2e6), 1.0, N).astype(np.int64), 1)  # ~2 ms median, in ns
+    histogram = LatencyHistogram()
+    for ns in samples.tolist():
+        histogram.record_ns(ns)
+    return samples, histogram
+
+
+def test_quantiles_within_bucket_error(latencies):
+    samples, histogram = latencies
+    qs = (0.5, 0.9, 0.99, 0.999)
+    exact = np.quantile(samples, qs, method="inverted_cdf") / 1e9
+    assert histogram.count == N
+    for q, approx, value in zip(qs, histogram.quantiles(qs), exact):
+        assert abs(approx - value) / value < 1 / SUB_BUCKETS, q
+
+
+def test_export_buckets_are_cumulative_counts(latencies):
+    samples, histogram = latencies
+    counts = histogram.cumulative_counts()
+    assert list(counts) == sorted(counts)
+    for bound, count in zip(EXPORT_BUCKETS, counts):
+        assert abs(count - int((samples <= bound * 1e9).sum())) <= 0.04 * N, bound
+
+
+def test_render_prometheus_text():
+    telemetry = Telemetry()
+    telemetry.histogram("predict", mode="real_model").record_ns(2_000_000)
+    text = telemetry.render()
+    assert 'fraud_stage_seconds_bucket{mode="real_model",stage="predict",le="+Inf"} 1' in text
+    assert 'fraud_stage_seconds_count{mode="real_model",stage="predict"} 1' in text
@@ -0,0 +1,46 @@
+# test_threshold_analysis.py - curve/recommendation counts and target validation
+import numpy as np
+import pytest
+
+from threshold_analysis import MAX_CURVE_POINTS, ThresholdCurve
+
+
+@pytest.fixture(scope="module")
+def scored():
+    rng = np.random.default_rng(42)
+    labels = (rng.random(20_000) < 0.035).astype(np.int8)
+    probs = np.round(np.clip(rng.normal(0.05 + 0.2 * labels, 0.08), 0, 1), 4)  # Rounded: plenty of ties
+    return probs, labels, ThresholdCurve(probs, labels)
+
+
+def test_curve_points_match_direct_counts(scored):
+    probs, labels, curve = scored
+    for point in curve.curve(MAX_CURVE_POINTS):
+        flagged = probs > point["threshold"]
+        assert point["fraud_detected"] == int((flagged & (labels == 1)).sum())
+        assert point["false_alarms"] == int((flagged & (labels == 0)).sum())
+
+
+def test_recommendations_meet_their_targets(scored):
+    _, _, curve = scored
+    assert curve.for_alert_rate(5.0)["alert_rate"] <= 5.0
+    assert curve.for_recall(50.0)["detection_rate"] >= 50.0
+    assert curve.for_recall(100.0)["detection_rate"] == 100.0
+
+
+@pytest.mark.parametrize("alert_rate", [-1.0, 100.5, float("nan")])
+def test_alert_rate_out_of_range(scored, alert_rate):
+    with pytest.raises(ValueError):
+        scored[2].for_alert_rate(alert_rate)
+
+
+@pytest.mark.parametrize("recall", [0.0, -5.0, 150.0])
+def test_recall_out_of_range(scored, recall):
+    with pytest.raises(ValueError):
+        scored[2].for_recall(recall)
+
+
+def test_points_must_be_positive(scored):
+    with pytest.raises(ValueError):
+        scored[2].report(max_points=0)
+    assert len(scored[2].curve(10 ** 7)) <= MAX_CURVE_POINTS
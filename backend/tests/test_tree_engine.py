@@ -0,0 +1,80 @@
+# test_tree_engine.py - compiled engine parity against the models' own predict_proba
+import os
+
+import numpy as np
+import pytest
+
+import tree_engine
+from tree_engine import CompiledTreeEnsemble, export_tree_ensemble
+
+XGB_VERSIONS = ["v3_xg_20251109_033903", "v5_xg_20251109_154848"]
+THRESHOLD = 0.063
+
+
+def _saved_model(version):
+    if not os.path.exists(f"model_versions/{version}/model.joblib"):
+        pytest.skip(f"{version} has no model.joblib")
+    import joblib
+    from model_utils import load_demo_arrays
+    return joblib.load(f"model_versions/{version}/model.joblib"), np.asarray(load_demo_arrays(version)["features"])
+
+
+def _assert_parity(model, compiled, X):
+    expected = model.predict_proba(X)[:, 1]
+    actual = compiled.predict_fraud_proba(X)
+    assert np.abs(expected - actual).max() < 1e-5
+    assert ((expected > THRESHOLD) != (actual > THRESHOLD)).sum() == 0
+
+
+@pytest.mark.parametrize("version", XGB_VERSIONS)
+def test_xgboost_demo_parity(version):
+    model, X = _saved_model(version)
+    compiled = CompiledTreeEnsemble(export_tree_ensemble(model))
+    assert compiled.heap
+    _assert_parity(model, compiled, X)
+
+
+@pytest.mark.parametrize("version", XGB_VERSIONS)
+def test_pointer_layout_matches_heap(version, monkeypatch):
+    model, X = _saved_model(version)
+    arrays = export_tree_ensemble(model)
+    heap = CompiledTreeEnsemble(arrays).predict_fraud_proba(X)
+    monkeypatch.setattr(tree_engine, "MAX_HEAP_LEAVES", 0)
+    walked = CompiledTreeEnsemble(arrays)
+    assert not walked.heap
+    np.testing.assert_array_equal(walked.predict_fraud_proba(X), heap)
+
+
+def test_saved_compiled_file_parity():
+    version = XGB_VERSIONS[-1]
+    path = f"model_versions/{version}/{tree_engine.COMPILED_FILE}"
+    if not os.path.exists(path):
+        pytest.skip(f"{version} has no {tree_engine.COMPILED_FILE}")
+    model, X = _saved_model(version)
+    _assert_parity(model, CompiledTreeEnsemble.load(path), X)
+
+
+def test_unbounded_random_forest_uses_pointer_layout():
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(4000, 8))
+    X[rng.random(X.shape) < 0.05] = np.nan
+    y = (rng.random(len(X)) < 0.3).astype(int)  # Noise labels: trees grow to depth 40+
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+
+    compiled = CompiledTreeEnsemble(export_tree_ensemble(model))
+    assert compiled.max_depth > 30
+    assert not compiled.heap
+    _assert_parity(model, compiled, X)
+
+
+def test_parity_stamp_gates_auto_engine(tmp_path):
+    model, X = _saved_model(XGB_VERSIONS[-1])
+    arrays = export_tree_ensemble(model)
+    unchecked = tree_engine.save_compiled(dict(arrays), str(tmp_path / "unchecked.npz"))
+    assert not tree_engine.parity_verified(unchecked)
+
+    parity = tree_engine.stamp_parity(arrays, model, X)
+    assert parity["rows"] == len(X) and parity["max_abs_diff"] < tree_engine.PARITY_TOLERANCE
+    assert tree_engine.parity_verified(tree_engine.save_compiled(arrays, str(tmp_path / "checked.npz")))
@@ -0,0 +1,241 @@
+# threshold_analysis.py - precision/recall/alert-rate curves from one sort, and threshold recommendations
+import sys
+import time
+
+import numpy as np
+
+DEFAULT_CURVE_POINTS = 50
+MAX_CURVE_POINTS = 1000  # Cap for curve() payloads (curve_arrays() has no cap)
+
+
+def check_targets(alert_rate=None, recall=None, points=None):
+    """ValueError unless 0 <= alert_rate <= 100, 0 < recall <= 100 and points >= 1 (None = not given)"""
+    if alert_rate is not None and not 0 <= alert_rate <= 100:
+        raise ValueError(f"alert_rate must be a percentage between 0 and 100, got {alert_rate}")
+    if recall is not None and not 0 < recall <= 100:
+        raise ValueError(f"recall must be a percentage above 0 and at most 100, got {recall}")
+    if points is not None and not points >= 1:
+        raise ValueError(f"points must be at least 1, got {points}")
+
+
+class ThresholdCurve:
+    """Confusion counts at every threshold of a scored set, from a single sort
+
+    Scores are sorted once (O(n log n)); a suffix sum of the labels then gives the
+    frauds above any cut, so counts at a threshold are a binary search (O(log n))
+    and the full curve is one pass. Flagging is `prob > threshold`, as in serving.
+    """
+
+    def __init__(self, probs, labels):
+        probs = np.asarray(probs, dtype=np.float64)
+        labels = np.asarray(labels) == 1
+        order = np.argsort(probs, kind="stable")
+        self.scores = probs[order]  # Ascending
+        # frauds_from[i] = frauds among scores[i:], so frauds above a cut at i
+        self.frauds_from = np.zeros(len(probs) + 1, dtype=np.int64)
+        self.frauds_from[:-1] = np.cumsum(labels[order][::-1])[::-1]
+        self.n = len(probs)
+        self.frauds = int(self.frauds_from[0])
+        self.legits = self.n - self.frauds
+
+    def _cut(self, thresholds):
+        """Index of the first score above each threshold"""
+        return np.searchsorted(self.scores, thresholds, side="right")
+
+    def counts(self, thresholds):
+        """(flagged, fraud_detected, false_alarms) arrays for an array of thresholds"""
+        cut = self._cut(np.asarray(thresholds, dtype=np.float64))
+        flagged = self.n - cut
+        detected = self.frauds_from[cut]
+        return flagged, detected, flagged - detected
+
+    def at(self, threshold):
+        """Stats-style metrics (percentages, like engine.stats) at one threshold"""
+        flagged, detected, false_alarms = (int(v[0]) for v in self.counts([threshold]))
+        return self._metrics(float(threshold), flagged, detected, false_alarms)
+
+    def _metrics(self, threshold, flagged, detected, false_alarms):
+        return {
+            "threshold": threshold,
+            "transactions": self.n,
+            "fraud_detected": detected,
+            "missed_fraud": self.frauds - detected,
+            "false_alarms": false_alarms,
+            "legitimate": self.legits - false_alarms,
+            "detection_rate": round(detected / self.frauds * 100, 3) if self.frauds else 0.0,
+            "alert_rate": round(flagged / self.n * 100, 3) if self.n else 0.0,
+            "precision": round(detected / flagged * 100, 3) if flagged else 0.0,
+            "false_positive_rate": round(false_alarms / self.legits * 100, 3) if self.legits else 0.0
+        }
+
+    def curve_arrays(self, max_points=None):
+        """Columnar curve: (thresholds, flagged, detected, false_alarms) at up to max_points distinct thresholds
+
+        Points are spread evenly over the distinct cut positions. Each threshold
+        is the score just below a group of tied scores, so it flags exactly that
+        many rows. All vectorized: no per-point Python work.
+        """
+        # Distinct cut positions: flagging everything from index i up
+        starts = np.flatnonzero(np.r_[True, self.scores[1:] != self.scores[:-1]]) if self.n else np.zeros(0, int)
+        if max_points is not None and len(starts) > max_points:
+            starts = starts[np.unique(np.linspace(0, len(starts) - 1, max_points).round().astype(int))]
+        # prob > scores[i-1] flags exactly scores[i:] (ties included); below the lowest score for i == 0
+        below_lowest = np.nextafter(self.scores[0], -np.inf) if self.n else 0.0
+        thresholds = np.where(starts == 0, below_lowest, self.scores[np.maximum(starts - 1, 0)])
+        flagged = self.n - starts
+        detected = self.frauds_from[starts]
+        return thresholds, flagged, detected, flagged - detected
+
+    def curve(self, max_points=DEFAULT_CURVE_POINTS):
+        """Metrics (as at()) at up to max_points (capped at MAX_CURVE_POINTS) distinct thresholds"""
+        check_targets(points=max_points)
+        if self.n == 0:
+            return []
+        max_points = min(int(max_points), MAX_CURVE_POINTS)
+        thresholds, flagged, detected, false_alarms = self.curve_arrays(max_points)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            detection = np.round(detected / self.frauds * 100, 3) if self.frauds else np.zeros(len(flagged))
+            alert = np.round(flagged / self.n * 100, 3)
+            precision = np.round(np.where(flagged > 0, detected / np.maximum(flagged, 1) * 100, 0.0), 3)
+            fpr = np.round(false_alarms / self.legits * 100, 3) if self.legits else np.zeros(len(flagged))
+        columns = zip(thresholds.tolist(), flagged.tolist(), detected.tolist(), false_alarms.tolist(),
+                      detection.tolist(), alert.tolist(), precision.tolist(), fpr.tolist())
+        return [{
+            "threshold": t,
+            "transactions": self.n,
+            "fraud_detected": d,
+            "missed_fraud": self.frauds - d,
+            "false_alarms": fa,
+            "legitimate": self.legits - fa,
+            "detection_rate": dr,
+            "alert_rate": ar,
+            "precision": pr,
+            "false_positive_rate": fp
+        } for t, f, d, fa, dr, ar, pr, fp in columns]
+
+    def _threshold_below(self, i):
+        """A threshold that flags scores[i:] and nothing below (scores[i-1] < t < ... )"""
+        if i == 0:
+            return float(np.nextafter(self.scores[0], -np.inf))
+        return float(self.scores[i - 1])  # prob > scores[i-1] flags exactly scores[i:] (ties included)
+
+    # ==================== RECOMMENDATIONS ====================
+    def for_alert_rate(self, alert_rate):
+        """Lowest threshold whose alert rate stays within alert_rate (%) - the most recall for that budget"""
+        check_targets(alert_rate=alert_rate)
+        budget = int(np.floor(alert_rate / 100 * self.n))
+        if budget <= 0 or self.n == 0:
+            return self.at(float(self.scores[-1]) if self.n else 1.0)  # Flags nothing
+        if budget >= self.n:
+            return self.at(self._threshold_below(0))
+        # Cut at n - budget flags `budget` rows unless that splits a tie; then flag fewer
+        i = self.n - budget
+        if self.scores[i] == self.scores[i - 1]:
+            i = int(np.searchsorted(self.scores, self.scores[i], side="right"))
+            if i >= self.n:
+                return self.at(float(self.scores[-1]))
+        return self.at(self._threshold_below(i))
+
+    def for_recall(self, recall):
+        """Highest threshold that still detects recall (%) of the frauds - the fewest alerts for it"""
+        check_targets(recall=recall)
+        if self.frauds == 0:
+            return None
+        needed = int(np.ceil(recall / 100 * self.frauds))
+        if needed <= 0:
+            return self.at(float(self.scores[-1]))
+        # Largest cut i with frauds_from[i] >= needed (frauds_from is non-increasing)
+        i = int(np.searchsorted(-self.frauds_from, -needed, side="right")) - 1
+        # Keep ties together: move the cut to the start of scores[i]'s tie group
+        i = int(np.searchsorted(self.scores, self.scores[i], side="left"))
+        return self.at(self._threshold_below(i))
+
+    def recommend(self, alert_rate=None, recall=None, current=None):
+        """Recommendations for whichever targets are given, plus the current threshold"""
+        result = {}
+        if current is not None:
+            result["current"] = self.at(current)
+        if alert_rate is not None:
+            result["for_alert_rate"] = {"target_alert_rate": alert_rate, **self.for_alert_rate(alert_rate)}
+        if recall is not None:
+            match = self.for_recall(recall)
+            result["for_recall"] = {"target_recall": recall, **match} if match else None
+        return result
+
+    def report(self, alert_rate=None, recall=None, current=None, max_points=DEFAULT_CURVE_POINTS):
+        """Payload for the threshold endpoints"""
+        return {
+            "transactions": self.n,
+            "frauds": self.frauds,
+            "fraud_rate": round(self.frauds / self.n * 100, 3) if self.n else 0.0,
+            "recommendations": self.recommend(alert_rate, recall, current),
+            "curve": self.curve(max_points)
+        }
+
+
+# ==================== SAVED VERSIONS ====================
+_version_curves = {}
+
+
+def version_curve(version_name, model_engine="native"):
+    """Curve over a saved version's demo set (held-out test rows), scored once per process"""
+    key = (version_name, model_engine)
+    if key not in _version_curves:
+        from model_utils import load_demo_arrays, load_model_version
+        loaded = load_model_version(version_name, model_engine)
+        if loaded is None:
+            raise ValueError(f"Version {version_name} has no loadable model")
+        demo = load_demo_arrays(version_name)
+        probs = loaded[0].predict_proba(np.ascontiguousarray(demo["features"]))[:, 1]
+        _version_curves[key] = ThresholdCurve(probs, demo["labels"])
+    return _version_curves[key]
+
+
+def benchmark(n_rows=1_000_000, n_thresholds=6, seed=42):
+    """One sort + lookups vs a full pass per threshold (what train_model.py did)"""
+    rng = np.random.default_rng(seed)
+    labels = (rng.random(n_rows) < 0.035).astype(np.int8)
+    probs = np.clip(rng.normal(0.05 + 0.2 * labels, 0.08), 0, 1)
+    thresholds = np.logspace(-4, np.log10(0.5), n_thresholds)
+
+    start = time.perf_counter()
+    fraud_probs, legit_probs = probs[labels == 1], probs[labels == 0]
+    passes = [((fraud_probs > t).sum(), (legit_probs > t).sum()) for t in thresholds]
+    per_threshold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    curve = ThresholdCurve(probs, labels)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    _, detected, false_alarms = curve.counts(thresholds)
+    lookups = time.perf_counter() - start
+    same = [(int(d), int(f)) for d, f in zip(detected, false_alarms)] == [(int(a), int(b)) for a, b in passes]
+    start = time.perf_counter()
+    curve.curve_arrays()
+    full_curve = time.perf_counter() - start
+    start = time.perf_counter()
+    points = curve.curve(max_points=MAX_CURVE_POINTS)
+    payload = time.perf_counter() - start
+    # The vectorized points must match at() at the same thresholds
+    same &= all(curve.at(p["threshold"]) == p for p in points[::50])
+
+    print(f"⚡ {n_rows:,} scores, {n_thresholds} thresholds: full passes {per_threshold * 1000:.1f} ms | "
+          f"sort once {build * 1000:.1f} ms + lookups {lookups * 1000:.3f} ms "
+          f"{'(same counts)' if same else '(COUNTS DIFFER)'}")
+    print(f"   every distinct threshold ({len(np.unique(probs)):,}) in {full_curve * 1000:.0f} ms; "
+          f"one more threshold costs {lookups / n_thresholds * 1e6:.1f} µs vs a "
+          f"{per_threshold / n_thresholds * 1000:.2f} ms pass; a {len(points)}-point payload {payload * 1000:.1f} ms")
+    return same
+
+
+if __name__ == "__main__":
+    # python threshold_analysis.py bench | <version> [alert_rate%] [recall%]
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if command == "bench":
+        sys.exit(0 if benchmark() else 1)
+    curve = version_curve(command)
+    alert_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    recall = float(sys.argv[3]) if len(sys.argv) > 3 else 50.0
+    for name, rec in curve.recommend(alert_rate, recall, current=0.063).items():
+        print(f"🎯 {name:<15} threshold {rec['threshold']:.6f}: detection {rec['detection_rate']:.1f}%, "
+              f"alert rate {rec['alert_rate']:.2f}%, precision {rec['precision']:.1f}%")
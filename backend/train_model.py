@@ -5,145 +5,32 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score
 import matplotlib.pyplot as plt
 from model_utils import save_model_version
+from feature_engineering import CATEGORICAL_COLUMNS
+from feature_cache import load_feature_matrix
+from threshold_analysis import ThresholdCurve
 
 
-# Load the data
-print("Loading data...")
-train_trans = pd.read_csv('train_transaction.csv')
-train_identity = pd.read_csv('train_identity.csv')
-
-print(f"Transaction data: {train_trans.shape}")
-print(f"Identity data: {train_identity.shape}")
-
-# Merge them
-df = pd.merge(train_trans, train_identity, on='TransactionID', how='left')
-print(f"Merged data: {df.shape}")
-
-# Note from Noel: TransactionDT is TIMEDELTA NOT TIMESTAMP!
-df['TransactionDT'] = df['TransactionDT'].astype(int)
-
-# Create time-based features
-df['hour_of_day'] = (df['TransactionDT'] // 3600) % 24
-df['day_of_week'] = (df['TransactionDT'] // (3600 * 24)) % 7
-df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-df['is_night'] = ((df['hour_of_day'] >= 0) & (df['hour_of_day'] <= 5)).astype(int)
-
-print("Time features created!")
-print(df[['TransactionDT', 'hour_of_day', 'day_of_week', 'is_weekend']].head())
-
-def create_real_time_features(df):
-    """Create features that simulate real-time detection"""
-    
-    # Sort by time for rolling calculations
-    df = df.sort_values('TransactionDT').reset_index(drop=True)
-   
-    # Feature 1: Amount deviation (user-level)
-    user_median_amount = df.groupby('card1')['TransactionAmt'].transform('median')
-    df['amount_deviation_ratio'] = df['TransactionAmt'] / (user_median_amount + 1)
-    
-    # Feature 2: User transaction count (simpler and more reliable)
-    df['tx_count_user'] = df.groupby('card1')['TransactionID'].transform('count')
-    
-    # Feature 3: New merchant flag (simplified)
-    common_merchants = df.groupby('card1')['ProductCD'].agg(lambda x: x.value_counts().index[0] if len(x) > 0 else 'X')
-    df['common_merchant'] = df['card1'].map(common_merchants)
-    df['is_new_merchant'] = (df['ProductCD'] != df['common_merchant']).astype(int)
-    
-    # Feature 4: Unusual time for user
-    user_common_hour = df.groupby('card1')['hour_of_day'].agg(lambda x: x.mode()[0] if len(x.mode()) > 0 else 12)
-    df['user_common_hour'] = df['card1'].map(user_common_hour)
-    df['unusual_time'] = (abs(df['hour_of_day'] - df['user_common_hour']) > 4).astype(int)
-
-     # User's normal spending patterns (NEW - replaces old approach)
-    df['user_amount_95th'] = df.groupby('card1')['TransactionAmt'].transform(
-    lambda x: x.quantile(0.95) if len(x) > 10 else x.median())
-
-    df['amount_vs_normal'] = df['TransactionAmt'] / df['user_amount_95th']
-
-    # Better time deviation (NEW - replaces unusual_time)
-    df['hour_deviation'] = abs(df['hour_of_day'] - df['user_common_hour'])
-    
-    # Feature 5: High-risk product categories
-    df['high_risk_product'] = df['ProductCD'].isin(['W', 'S']).astype(int)
-
-    # Feature 6: Time since last transaction (HUGE for fraud)
-    df['time_since_last_tx'] = df.groupby('card1')['TransactionDT'].diff()
-
-    # Instead of time-based rolling, use count-based rolling
-    df['tx_frequency_change'] = df.groupby('card1')['TransactionAmt'].transform(
-    lambda x: x.rolling(5, min_periods=1).std() / (x.rolling(5, min_periods=1).mean() + 1))
-
-    # Merchant risk profiling
-    merchant_fraud_rates = df.groupby('ProductCD')['isFraud'].mean()
-    df['merchant_risk_score'] = df['ProductCD'].map(merchant_fraud_rates)
-    
-    return df
-
-# Add this BEFORE calling create_real_time_features()
-df = df.sample(100000, random_state=42)  # Use 100K samples for training
-print(f"Sampled data: {df.shape}")
-
-print("Creating real-time features...")
-df = create_real_time_features(df)
-
-# Select features that make sense for real-time detection
-feature_columns = [
-    # Core transaction features
-    'TransactionAmt',
-    
-    # Our engineered real-time features
-    'amount_deviation_ratio',
-    #Note from Noel:'tx_velocity_24h'(The complex velocity feature was mathematically elegant but conceptually flawed for this dataset since TransactionDT is timedelta and not a timestamp.), 
-    'tx_count_user',
-    'is_new_merchant',
-    'unusual_time',
-    
-    # Time patterns
-    'hour_of_day',
-    'is_weekend',
-    'is_night',
-    
-    # Simple card features (available in real-time)
-    'card1', 'card2', 'card3', 'card4', 'card5',
-    
-    # Product context
-    'ProductCD',
-    
-    # Geographic (simplified)
-    'addr1', 'addr2',
-    
-    # Device info (if available)
-    'DeviceType',
-]
-
-# Filter to available columns
-available_features = [col for col in feature_columns if col in df.columns]
-print(f"Using {len(available_features)} features: {available_features}")
-
-# Prepare X and y
-X = df[available_features].copy()
-y = df['isFraud'].copy()
-
-# Handle categorical variables
-categorical_cols = ['card4', 'ProductCD', 'DeviceType']
-for col in categorical_cols:
-    if col in X.columns:
-        X[col] = X[col].fillna('Missing')
-        X[col] = X[col].astype('category').cat.codes
-    else:
-        print(f"{col} not available, skipping")
-
-# Fill remaining NaN
-X = X.fillna(-999)
+# Feature engineering is vectorized, so train on every row (set e.g. 100_000 for a quick run)
+TRAIN_SAMPLE_ROWS = None
+# Per-card median/95th from the same quantile sketch the live feature store uses
+QUANTILE_METHOD = "sketch"
+
+# X/y come straight from the feature cache when the CSVs, these settings and the
+# feature code are unchanged - re-running with new hyperparameters skips to fitting.
+# Otherwise they're rebuilt (load -> time/real-time features -> encoding) and cached.
+print("Loading feature matrix...")
+X, y, transaction_dt = load_feature_matrix(sample_rows=TRAIN_SAMPLE_ROWS, quantile_method=QUANTILE_METHOD,
+                                           with_time=True)
+available_features = list(X.columns)
 
 print(f"Final feature matrix: {X.shape}")
 print(f"Fraud rate: {y.mean():.3f}")
 
 # Split by time to simulate real-world scenario
 # Use first 80% for training, last 20% for testing
-split_point = int(0.8 * len(df))
-train_mask = df.index < split_point
-test_mask = df.index >= split_point
+split_point = int(0.8 * len(X))
+train_mask = X.index < split_point
+test_mask = X.index >= split_point
 
 X_train, X_test = X[train_mask], X[test_mask]
 y_train, y_test = y[train_mask], y[test_mask]
@@ -151,6 +38,7 @@ y_train, y_test = y[train_mask], y[test_mask]
 print(f"Train set: {X_train.shape}, Fraud rate: {y_train.mean():.3f}")
 print(f"Test set: {X_test.shape}, Fraud rate: {y_test.mean():.3f}")
 
+# Fixed hyperparameters; hyperparam_search.py searches both families in parallel
 # Simple Random Forest (good for POC)
 model = RandomForestClassifier(
     n_estimators=100,
@@ -217,12 +105,19 @@ print(f"   Min: {non_fraud_probabilities.min():.6f}")
 print(f"   Max: {non_fraud_probabilities.max():.6f}")
 print(f"   Mean: {non_fraud_probabilities.mean():.6f}")
 
-# 2. Check how many frauds would be caught at different thresholds
+# 2. Check how many frauds would be caught at different thresholds (one sort, then lookups)
+threshold_curve = ThresholdCurve(y_pred_proba_xgb, y_test.to_numpy())
 print(f"\n🎯 Fraud detection at different thresholds:")
-for threshold in [0.0001, 0.001, 0.01, 0.1, 0.2, 0.5]:
-    frauds_caught = (fraud_probabilities > threshold).sum()
-    false_positives = (non_fraud_probabilities > threshold).sum()
-    print(f"   Threshold {threshold:.4f}: {frauds_caught}/{len(fraud_probabilities)} frauds caught, {false_positives} false alarms")
+thresholds = [0.0001, 0.001, 0.01, 0.1, 0.2, 0.5]
+_, frauds_caught, false_positives = threshold_curve.counts(thresholds)
+for threshold, caught, false_alarms in zip(thresholds, frauds_caught, false_positives):
+    print(f"   Threshold {threshold:.4f}: {caught}/{threshold_curve.frauds} frauds caught, {false_alarms} false alarms")
+
+print(f"\n🎯 Recommended thresholds:")
+for name, rec in threshold_curve.recommend(alert_rate=5.0, recall=50.0, current=0.063).items():
+    if rec is not None:
+        print(f"   {name:<15} {rec['threshold']:.6f}: detection {rec['detection_rate']:.1f}%, "
+              f"alert rate {rec['alert_rate']:.2f}%, precision {rec['precision']:.1f}%")
 
 # 3. Check if model is just predicting everything as non-fraud
 print(f"\n🤖 Model prediction distribution:")
@@ -288,7 +183,9 @@ plt.show()
 # Create the feature_info dictionary
 feature_info = {
     'feature_names': available_features,
-    'categorical_columns': categorical_cols
+    'categorical_columns': CATEGORICAL_COLUMNS,
+    'quantile_method': QUANTILE_METHOD,
+    'training_rows': len(X)
 }
 
 # Get XGBoost feature importance
@@ -312,8 +209,10 @@ rf_performance = {
 }
 
 # Create demo data sample - USE PROCESSED FEATURES
-demo_data = X_test.sample(10000, random_state=42).copy()
+# Kept in time order with its TransactionDT so replay.py can reproduce the traffic's timing
+demo_data = X_test.sample(10000, random_state=42).sort_index().copy()
 demo_data['isFraud'] = y_test[demo_data.index]  # Add target for demo tracking
+demo_data['TransactionDT'] = transaction_dt[demo_data.index]
 
 # Save both models
 print("\n" + "="*50)
@@ -0,0 +1,390 @@
+# tree_engine.py - compiled tree-ensemble inference (NumPy only, no xgboost/sklearn at load time)
+import json
+import os
+import sys
+
+import numpy as np
+
+COMPILED_FILE = "compiled_trees.npz"
+PARITY_TOLERANCE = 1e-5   # Max |Δ prob| against predict_proba for a compiled file to be served by default
+MAX_HEAP_LEAVES = 2 ** 22  # n_trees * 2**max_depth above this: walk the packed child arrays instead
+
+
+# ==================== EXPORT ====================
+def _export_xgboost(model):
+    """Flatten an XGBClassifier's booster into per-tree node arrays"""
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw("json"))["learner"]
+
+    objective = learner["objective"]["name"]
+    if objective != "binary:logistic":
+        raise ValueError(f"Only binary:logistic boosters are supported, got {objective}")
+
+    # base_score is stored in probability space, e.g. "[3.60625E-2]"
+    base_score = float(str(learner["learner_model_param"]["base_score"]).strip("[]"))
+    base_margin = float(np.log(base_score / (1 - base_score)))
+
+    booster_model = learner["gradient_booster"]["model"]
+    trees = booster_model["trees"]
+    # Match predict_proba, which stops at best_iteration after early stopping
+    best_iteration = learner.get("attributes", {}).get("best_iteration")
+    if best_iteration is not None:
+        trees = trees[:booster_model["iteration_indptr"][int(best_iteration) + 1]]
+
+    nodes = []
+    for tree in trees:
+        if any(tree["split_type"]):
+            raise ValueError("Categorical splits are not supported")
+        left = np.array(tree["left_children"], dtype=np.int64)
+        is_leaf = left == -1
+        conditions = np.array(tree["split_conditions"], dtype=np.float32)
+        nodes.append({
+            "feature": np.where(is_leaf, 0, tree["split_indices"]),
+            # Thresholds are float32 in XGBoost; stored widened but value-identical
+            "threshold": np.where(is_leaf, 0.0, conditions.astype(np.float64)),
+            "left": left,
+            "right": np.array(tree["right_children"], dtype=np.int64),
+            "default_left": np.array(tree["default_left"], dtype=bool),
+            # For XGBoost leaves, split_conditions holds the leaf weight
+            "value": np.where(is_leaf, conditions.astype(np.float64), 0.0),
+        })
+
+    meta = {
+        "kind": "xgboost",
+        "compare": "lt",            # go left when x < threshold
+        "aggregate": "sum_sigmoid",
+        "base_margin": base_margin,
+        "feature_names": booster.feature_names,
+    }
+    return nodes, meta
+
+
+def _export_random_forest(model):
+    """Flatten a RandomForestClassifier's trees into per-tree node arrays"""
+    classes = list(model.classes_)
+    positive = classes.index(1) if 1 in classes else len(classes) - 1
+
+    nodes = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        left = tree.children_left.astype(np.int64)
+        is_leaf = left == -1
+        counts = tree.value[:, 0, :]
+        proba = counts[:, positive] / np.maximum(counts.sum(axis=1), 1e-300)
+        missing_left = getattr(tree, "missing_go_to_left", None)
+        nodes.append({
+            "feature": np.where(is_leaf, 0, tree.feature),
+            "threshold": np.where(is_leaf, 0.0, tree.threshold),
+            "left": left,
+            "right": tree.children_right.astype(np.int64),
+            "default_left": (np.zeros(len(left), dtype=bool) if missing_left is None
+                             else np.asarray(missing_left, dtype=bool)),
+            "value": np.where(is_leaf, proba, 0.0),
+        })
+
+    feature_names = getattr(model, "feature_names_in_", None)
+    meta = {
+        "kind": "random_forest",
+        "compare": "le",            # go left when x <= threshold
+        "aggregate": "mean",
+        "base_margin": 0.0,
+        "feature_names": None if feature_names is None else [str(f) for f in feature_names],
+    }
+    return nodes, meta
+
+
+def _tree_depth(left, right):
+    """Depth of one tree from its child arrays (root = node 0)"""
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):  # Children always have larger ids than their parent
+        if left[node] != -1:
+            depth[left[node]] = depth[node] + 1
+            depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def export_tree_ensemble(model):
+    """Pack any saved XGBoost or RandomForest model into flat arrays
+
+    Returns a dict of arrays: feature, threshold, left, right, default_left and
+    value per node (all trees concatenated, child ids global, leaves pointing to
+    themselves), roots per tree, plus a JSON "meta" string.
+    """
+    if hasattr(model, "get_booster"):
+        trees, meta = _export_xgboost(model)
+    elif hasattr(model, "estimators_"):
+        trees, meta = _export_random_forest(model)
+    else:
+        raise TypeError(f"Unsupported model type: {type(model).__name__}")
+
+    roots, packed = [], {k: [] for k in ("feature", "threshold", "left", "right", "default_left", "value")}
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        n_nodes = len(tree["left"])
+        is_leaf = tree["left"] == -1
+        own_ids = np.arange(offset, offset + n_nodes)
+        # Leaves loop back to themselves, so traversal can run a fixed number of steps
+        packed["left"].append(np.where(is_leaf, own_ids, tree["left"] + offset))
+        packed["right"].append(np.where(is_leaf, own_ids, tree["right"] + offset))
+        for key in ("feature", "threshold", "default_left", "value"):
+            packed[key].append(tree[key])
+        max_depth = max(max_depth, _tree_depth(tree["left"], tree["right"]))
+        roots.append(offset)
+        offset += n_nodes
+
+    meta.update({"n_trees": len(roots), "n_nodes": offset, "max_depth": max_depth})
+    return {
+        "feature": np.concatenate(packed["feature"]).astype(np.int32),
+        "threshold": np.concatenate(packed["threshold"]).astype(np.float64),
+        "left": np.concatenate(packed["left"]).astype(np.int32),
+        "right": np.concatenate(packed["right"]).astype(np.int32),
+        "default_left": np.concatenate(packed["default_left"]).astype(bool),
+        "value": np.concatenate(packed["value"]).astype(np.float64),
+        "roots": np.array(roots, dtype=np.int32),
+        "meta": np.array(json.dumps(meta)),
+    }
+
+
+def stamp_parity(arrays, model, X):
+    """Record in the meta how closely the packed arrays reproduce model.predict_proba on X"""
+    X = np.asarray(X)
+    expected = model.predict_proba(X)[:, 1]
+    actual = CompiledTreeEnsemble(arrays).predict_fraud_proba(X)
+    meta = json.loads(str(arrays["meta"]))
+    meta["parity"] = {"rows": len(X), "max_abs_diff": float(np.abs(expected - actual).max()) if len(X) else None}
+    arrays["meta"] = np.array(json.dumps(meta))
+    return meta["parity"]
+
+
+def parity_verified(path):
+    """True if a compiled file was checked against its model and matched (reads only the meta)"""
+    if not os.path.exists(path):
+        return False
+    with np.load(path) as data:
+        parity = json.loads(str(data["meta"])).get("parity") or {}
+    return parity.get("rows", 0) > 0 and parity["max_abs_diff"] <= PARITY_TOLERANCE
+
+
+def save_compiled(arrays, path):
+    """Write packed arrays to an .npz file"""
+    np.savez(path, **arrays)
+    return path
+
+
+# ==================== INFERENCE ====================
+class CompiledTreeEnsemble:
+    """Vectorised batch traversal over packed tree arrays - a predict_proba drop-in
+
+    At load time every tree is re-laid out as a perfect binary tree of the
+    ensemble's max depth (heap order: children of i are 2i+1 and 2i+2). Leaves
+    shallower than that are repeated down to the bottom level, so traversal is
+    a fixed number of steps with no child-pointer lookups. Deep ensembles (an
+    unbounded RandomForest, lossguide XGBoost) would need n_trees * 2**depth
+    nodes, so past MAX_HEAP_LEAVES they keep the packed arrays and follow the
+    left/right pointers for the same number of steps instead.
+    """
+
+    def __init__(self, arrays, chunk_rows=512):
+        self.meta = json.loads(str(arrays["meta"]))
+        self.max_depth = self.meta["max_depth"]
+        self.chunk_rows = chunk_rows
+
+        feature = np.asarray(arrays["feature"])
+        threshold = np.asarray(arrays["threshold"], dtype=np.float64)
+        left = np.asarray(arrays["left"], dtype=np.intp)
+        right = np.asarray(arrays["right"], dtype=np.intp)
+        default_left = np.asarray(arrays["default_left"], dtype=bool)
+        value = np.asarray(arrays["value"], dtype=np.float64)
+        roots = np.asarray(arrays["roots"], dtype=np.intp)
+
+        # Features are compared as float32; make float32 thresholds give identical decisions
+        threshold32 = threshold.astype(np.float32)
+        if self.meta["compare"] == "le":
+            # x <= t  <=>  x <= (largest float32 not above t), for any float32 x
+            above = threshold32.astype(np.float64) > threshold
+            threshold32[above] = np.nextafter(threshold32[above], np.float32(-np.inf))
+        else:
+            # x < t  <=>  x < (smallest float32 not below t)
+            below = threshold32.astype(np.float64) < threshold
+            threshold32[below] = np.nextafter(threshold32[below], np.float32(np.inf))
+
+        n_trees = len(roots)
+        self.heap = n_trees * 2.0 ** self.max_depth <= MAX_HEAP_LEAVES
+        if not self.heap:
+            self.roots = roots
+            self.feature = feature.astype(np.intp)
+            self.threshold = threshold32
+            self.left, self.right = left, right
+            self.default_left = default_left
+            self.value = value
+            return
+
+        # Expand level by level across all trees at once; leaves point to themselves,
+        # so a leaf's "children" are the leaf again and it is copied down unchanged
+        levels_feature, levels_threshold, levels_default_left = [], [], []
+        nodes = roots[:, None]
+        for _ in range(self.max_depth):
+            levels_feature.append(feature[nodes])
+            levels_threshold.append(threshold32[nodes])
+            levels_default_left.append(default_left[nodes])
+            nodes = np.stack([left[nodes], right[nodes]], axis=-1).reshape(len(roots), -1)
+
+        self.n_internal = 2 ** self.max_depth - 1
+        self.heap_feature = (np.concatenate(levels_feature, axis=1).astype(np.intp).ravel()
+                             if levels_feature else np.zeros(0, dtype=np.intp))
+        self.heap_threshold = (np.concatenate(levels_threshold, axis=1).ravel()
+                               if levels_threshold else np.zeros(0, dtype=np.float32))
+        self.heap_default_left = (np.concatenate(levels_default_left, axis=1).ravel()
+                                  if levels_default_left else np.zeros(0, dtype=bool))
+        self.leaf_value = value[nodes].ravel()
+        self.tree_base = np.arange(n_trees, dtype=np.intp) * self.n_internal
+        self.leaf_base = np.arange(n_trees, dtype=np.intp) * (2 ** self.max_depth)
+
+    @classmethod
+    def load(cls, path):
+        """Load packed arrays written by save_compiled"""
+        with np.load(path) as data:
+            return cls({key: data[key] for key in data.files})
+
+    @property
+    def kind(self):
+        return self.meta["kind"]
+
+    def _leaf_values(self, X, has_missing=True):
+        """(rows, trees) leaf values for a float32 feature matrix"""
+        if not self.heap:
+            return self._walk_leaf_values(X, has_missing)
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        node = np.zeros((n_rows, len(self.tree_base)), dtype=np.intp)
+        less_equal = self.meta["compare"] == "le"
+
+        for _ in range(self.max_depth):
+            index = self.tree_base + node
+            x = flat[row_offset + self.heap_feature[index]]
+            threshold = self.heap_threshold[index]
+            go_left = x <= threshold if less_equal else x < threshold
+            if has_missing:
+                missing = np.isnan(x)
+                if missing.any():
+                    go_left = np.where(missing, self.heap_default_left[index], go_left)
+            # Heap children: left = 2i + 1, right = 2i + 2
+            node *= 2
+            node += 2
+            node -= go_left
+
+        node += self.leaf_base - self.n_internal
+        return self.leaf_value[node]
+
+    def _walk_leaf_values(self, X, has_missing=True):
+        """Pointer-chasing traversal for ensembles too deep for the heap layout"""
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        node = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        less_equal = self.meta["compare"] == "le"
+
+        for _ in range(self.max_depth):  # Leaves point to themselves, so finished trees stay put
+            x = flat[row_offset + self.feature[node]]
+            threshold = self.threshold[node]
+            go_left = x <= threshold if less_equal else x < threshold
+            if has_missing:
+                missing = np.isnan(x)
+                if missing.any():
+                    go_left = np.where(missing, self.default_left[node], go_left)
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        return self.value[node]
+
+    def predict_fraud_proba(self, X):
+        """Probability of the positive (fraud) class for each row"""
+        # Both libraries compare float32 features against their thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        has_missing = bool(np.isnan(X).any())
+        out = np.empty(len(X), dtype=np.float64)
+        # Small chunks keep the (rows, trees) working arrays in cache
+        for start in range(0, len(X), self.chunk_rows):
+            leaves = self._leaf_values(X[start:start + self.chunk_rows], has_missing)
+            if self.meta["aggregate"] == "sum_sigmoid":
+                margin = leaves.sum(axis=1) + self.meta["base_margin"]
+                out[start:start + len(leaves)] = 1.0 / (1.0 + np.exp(-margin))
+            else:
+                out[start:start + len(leaves)] = leaves.mean(axis=1)
+        return out
+
+    def predict_proba(self, X):
+        """sklearn-style (n, 2) probabilities"""
+        p = self.predict_fraud_proba(X)
+        return np.column_stack([1.0 - p, p])
+
+
+# ==================== COMMAND LINE ====================
+def compile_version(version_name):
+    """Export a saved version's model.joblib to model_versions/<version>/compiled_trees.npz"""
+    from model_utils import load_model_version, load_demo_arrays
+
+    result = load_model_version(version_name)
+    if result is None:
+        return None
+    model, features, performance = result
+    arrays = export_tree_ensemble(model)
+    parity = stamp_parity(arrays, model, load_demo_arrays(version_name)['features'])
+    path = save_compiled(arrays, f"model_versions/{version_name}/{COMPILED_FILE}")
+    print(f"✅ Compiled {version_name} -> {path} (max |Δ prob| {parity['max_abs_diff']:.2e} on {parity['rows']:,} demo rows)")
+    return path
+
+
+def verify_version(version_name, threshold=0.063, repeats=5):
+    """Parity and throughput of the compiled engine against the model's own predict_proba"""
+    import time
+    from model_utils import load_model_version, load_demo_arrays
+
+    model, features, _ = load_model_version(version_name)
+    X = np.asarray(load_demo_arrays(version_name)['features'])
+
+    path = f"model_versions/{version_name}/{COMPILED_FILE}"
+    if not os.path.exists(path):
+        compile_version(version_name)
+    compiled = CompiledTreeEnsemble.load(path)
+
+    expected = model.predict_proba(X)[:, 1]
+    actual = compiled.predict_fraud_proba(X)
+    max_diff = float(np.abs(expected - actual).max())
+    flag_mismatches = int(((expected > threshold) != (actual > threshold)).sum())
+
+    print(f"\n🔬 PARITY: {version_name} ({compiled.kind}, {compiled.meta['n_trees']} trees, "
+          f"depth {compiled.max_depth}, {'heap' if compiled.heap else 'pointer'} layout) on {len(X):,} demo rows")
+    print(f"   Max |Δ prob|: {max_diff:.2e}")
+    print(f"   Flag mismatches @ {threshold}: {flag_mismatches}")
+
+    print(f"\n🏁 THROUGHPUT (best of {repeats})")
+    single_rows = X[:200]
+    for label, predict in (("predict_proba", model.predict_proba), ("compiled", compiled.predict_proba)):
+        batch_best = single_best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            predict(X)
+            batch_best = min(batch_best, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for i in range(len(single_rows)):
+                predict(single_rows[i:i + 1])
+            single_best = min(single_best, time.perf_counter() - start)
+        print(f"   {label:<14} batch: {len(X) / batch_best:>10,.0f} tx/sec | "
+              f"single call: {len(single_rows) / single_best:>8,.0f} tx/sec")
+
+    ok = max_diff < 1e-5 and flag_mismatches == 0
+    print(f"\n{'✅ Parity OK' if ok else '❌ Parity FAILED'}")
+    return ok
+
+
+if __name__ == "__main__":
+    # python tree_engine.py compile|verify <version_name>
+    if len(sys.argv) != 3 or sys.argv[1] not in ("compile", "verify"):
+        print("Usage: python tree_engine.py compile|verify <version_name>")
+        sys.exit(1)
+    if sys.argv[1] == "compile":
+        sys.exit(0 if compile_version(sys.argv[2]) else 1)
+    sys.exit(0 if verify_version(sys.argv[2]) else 1)